@@ -0,0 +1,974 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+قياس أداء قاعدة البيانات - Database Benchmarks
+Runs against a temporary database, never against student_management.db
+
+Usage:
+    python benchmark_db.py              # all benchmarks
+    python benchmark_db.py indexes      # one benchmark
+    python benchmark_db.py plans        # EXPLAIN QUERY PLAN over every registered query
+"""
+
+import os
+import re
+import csv
+import sys
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from student_manager import (StudentManagementDB, StudentManagementApp, VirtualTreeview,
+                             LabelSearchIndex, EntityCache, NotificationSettings, BulkImporter,
+                             LedgerExporter, XlsxLedgerWriter, ReportCache, DatabaseWorker,
+                             iter_import_rows, SQL)
+
+
+def timed(func, repeat=1):
+    """تنفيذ دالة وإرجاع الزمن بالمللي ثانية"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000
+
+
+class WidgetStub:
+    """بديل بسيط لعناصر Tkinter لتشغيل دوال التطبيق بدون واجهة"""
+
+    def __init__(self):
+        self.rows = {}
+        self.options = {}
+        self._next_iid = 0
+
+    def __setitem__(self, key, value):
+        self.options[key] = value
+
+    def __getitem__(self, key):
+        return self.options.get(key)
+
+    def get_children(self, item=""):
+        return tuple(self.rows)
+
+    def delete(self, *items):
+        for item in items:
+            self.rows.pop(item, None)
+
+    def insert(self, parent, index, iid=None, **kw):
+        if iid is None:
+            self._next_iid += 1
+            iid = f"I{self._next_iid:05d}"
+        self.rows[iid] = kw
+        if index != "end" and index < len(self.rows) - 1:
+            self.move(iid, parent, index)
+        return iid
+
+    def move(self, iid, parent, index):
+        order = [item for item in self.rows if item != iid]
+        order.insert(index, iid)
+        self.rows = {item: self.rows[item] for item in order}
+
+    def item(self, iid, option=None, **kw):
+        if kw:
+            self.rows[iid].update(kw)
+        return self.rows[iid] if option is None else self.rows[iid].get(option)
+
+    def config(self, **kw):
+        self.options.update(kw)
+
+    configure = config
+
+    def bind(self, sequence, func=None, add=None):
+        pass
+
+    def set(self, first, last):
+        self.options['view'] = (first, last)
+
+
+class TextStub:
+    """بديل لـ ScrolledText: يحفظ النص المعروض فقط"""
+
+    def __init__(self):
+        self.text = ""
+
+    def delete(self, first, last=None):
+        self.text = ""
+
+    def insert(self, index, text):
+        self.text += text
+
+
+def make_headless_app(db):
+    """إنشاء StudentManagementApp بدون نافذة Tk - للقياس فقط"""
+    app = StudentManagementApp.__new__(StudentManagementApp)
+    app.db = db
+    app.icons = {'info': 'i', 'groups': 'g'}
+    app.row_syncs = {}
+    app.entities = EntityCache(db)
+    app.entities.listeners.append(app.on_entities_changed)
+    app.entity_combos = {}
+    app.settings = NotificationSettings(db)
+    app.report_cache = ReportCache(db.versions)
+    app._load_tokens = {}
+    app._load_futures = {}
+    app.report_text = TextStub()
+    app.teachers_tree = WidgetStub()
+    app.group_teacher = WidgetStub()
+    return app
+
+
+def trace_statements(db, func):
+    """أوامر SQL التي تنفذها دالة"""
+    statements = []
+    db.conn.set_trace_callback(statements.append)
+    try:
+        func()
+    finally:
+        db.conn.set_trace_callback(None)
+    return statements
+
+
+def count_statements(db, func):
+    """عدد أوامر SQL التي تنفذها دالة"""
+    return len(trace_statements(db, func))
+
+
+def build_sample_db(path, students=2000, groups=50, teachers=20,
+                    groups_per_student=2, sessions=25, seed=42):
+    """إنشاء قاعدة بيانات تجريبية
+
+    الحضور = students * groups_per_student * sessions
+    (القيم الافتراضية = 100,000 سجل حضور)
+    """
+    rng = random.Random(seed)
+    db = StudentManagementDB(path)
+    cur = db.cursor
+
+    cur.executemany(
+        "INSERT INTO teachers (name, phone) VALUES (?, ?)",
+        [(f"معلم {t}", f"010{t:08d}") for t in range(1, teachers + 1)]
+    )
+    cur.executemany(
+        "INSERT INTO groups (name, subject, teacher, fee) VALUES (?, ?, ?, ?)",
+        [(f"مجموعة {g}", "رياضيات", f"معلم {rng.randint(1, teachers)}", 200)
+         for g in range(1, groups + 1)]
+    )
+    cur.executemany(
+        "INSERT INTO students (name, phone) VALUES (?, ?)",
+        [(f"طالب {s}", f"011{s:08d}") for s in range(1, students + 1)]
+    )
+
+    start_day = date.today() - timedelta(days=sessions * 7)
+    session_dates = [(start_day + timedelta(days=7 * i)).strftime("%Y-%m-%d")
+                     for i in range(sessions)]
+
+    enrollments = []
+    for student_id in range(1, students + 1):
+        for group_id in rng.sample(range(1, groups + 1), groups_per_student):
+            enrollments.append((student_id, group_id))
+    cur.executemany("INSERT INTO student_groups (student_id, group_id) VALUES (?, ?)", enrollments)
+
+    statuses = ['حاضر'] * 8 + ['غائب', 'غياب بعذر']
+    cur.executemany(
+        "INSERT INTO attendance (student_id, group_id, attendance_date, status) VALUES (?, ?, ?, ?)",
+        ((s, g, d, rng.choice(statuses)) for s, g in enrollments for d in session_dates)
+    )
+    cur.executemany(
+        "INSERT INTO payments (student_id, group_id, amount, payment_date) VALUES (?, ?, ?, ?)",
+        ((s, g, 200, d) for s, g in enrollments for d in session_dates[::4])
+    )
+    db.conn.commit()
+    return db
+
+
+def bench_indexes():
+    """استعلامات المسارات الساخنة قبل وبعد ترحيل الفهارس (100k سجل حضور)"""
+    print("=" * 60)
+    print("Secondary indexes - before/after migration")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db = build_sample_db(path)
+        attendance_rows = db.fetch_one("SELECT COUNT(*) FROM attendance")[0]
+        print(f"attendance rows: {attendance_rows}")
+
+        # إرجاع الملف لحالة ما قبل الترحيل (كما في قواعد البيانات القديمة)
+        for (name,) in db.fetch_all(
+                "SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'idx_%'"):
+            db.cursor.execute(f"DROP INDEX {name}")
+        db.cursor.execute("DROP TABLE IF EXISTS sqlite_stat1")
+        db.cursor.execute("PRAGMA user_version = 0")
+        db.conn.commit()
+
+        rng = random.Random(7)
+        pairs = db.fetch_all("SELECT student_id, group_id FROM student_groups")
+        sample_pairs = rng.sample(pairs, 200)
+        teachers = [t[0] for t in db.fetch_all("SELECT name FROM teachers")]
+        cutoff = (date.today() - timedelta(days=7)).strftime("%Y-%m-%d")
+
+        def milestone():
+            for student_id, group_id in sample_pairs:
+                last = db.fetch_one(
+                    "SELECT MAX(payment_date) FROM payments WHERE student_id=? AND group_id=?",
+                    (student_id, group_id))[0]
+                db.fetch_one(
+                    "SELECT COUNT(*) FROM attendance WHERE student_id=? AND group_id=? "
+                    "AND status='حاضر' AND attendance_date > ?",
+                    (student_id, group_id, last or ''))
+
+        def student_group_stats():
+            for student_id, group_id in sample_pairs:
+                db.fetch_one(
+                    "SELECT COUNT(*) FROM attendance WHERE student_id=? AND group_id=? "
+                    "AND status IN ('غائب', 'غياب بعذر')",
+                    (student_id, group_id))
+
+        def payment_notifications():
+            overdue = db.fetch_all("""
+                SELECT DISTINCT s.id, g.id
+                FROM student_groups sg
+                JOIN students s ON sg.student_id = s.id
+                JOIN groups g ON sg.group_id = g.id
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM payments p
+                    WHERE p.student_id = s.id AND p.group_id = g.id
+                    AND p.payment_date >= ?
+                )
+            """, (cutoff,))
+            for student_id, group_id in overdue[:500]:
+                db.fetch_one(
+                    "SELECT id FROM notifications WHERE student_id=? AND group_id=? "
+                    "AND type='payment' AND is_read=0",
+                    (student_id, group_id))
+
+        def teacher_counts():
+            for name in teachers:
+                db.fetch_one("SELECT COUNT(*) FROM groups WHERE teacher = ?", (name,))
+                db.fetch_one("""
+                    SELECT COUNT(DISTINCT sg.student_id)
+                    FROM student_groups sg
+                    INNER JOIN groups g ON sg.group_id = g.id
+                    WHERE g.teacher = ?
+                """, (name,))
+
+        cases = [
+            ("check_attendance_milestone x200", milestone),
+            ("student group stats x200", student_group_stats),
+            ("generate_payment_notifications", payment_notifications),
+            ("load_teachers counts", teacher_counts),
+        ]
+
+        before = {name: timed(func) for name, func in cases}
+        migrate_ms = timed(db.migrate)
+        after = {name: timed(func) for name, func in cases}
+
+        print(f"migration to v{db.get_schema_version()}: {migrate_ms:.1f} ms")
+        print(f"{'query':<40}{'before ms':>10}{'after ms':>10}")
+        for name, _ in cases:
+            print(f"{name:<40}{before[name]:>10.1f}{after[name]:>10.1f}")
+        db.close()
+
+
+def bench_load_teachers():
+    """عدد استعلامات load_teachers يجب ألا يتغير بزيادة عدد المعلمين"""
+    print("=" * 60)
+    print("load_teachers - statement count vs teacher count")
+    print("=" * 60)
+
+    counts = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for teachers in (10, 100, 500):
+            path = os.path.join(tmp, f"teachers_{teachers}.db")
+            db = build_sample_db(path, students=500, groups=teachers * 2,
+                                 teachers=teachers, sessions=1)
+            app = make_headless_app(db)
+            statements = count_statements(db, app.load_teachers)
+            elapsed = timed(app.load_teachers)
+            counts.append(statements)
+            print(f"teachers={teachers:<6}statements={statements:<6}time={elapsed:.1f} ms")
+            db.close()
+
+    assert len(set(counts)) == 1, f"load_teachers statement count grows with teachers: {counts}"
+    print("OK: constant statement count")
+
+
+def bench_batch_writes():
+    """إدخال 10,000 سجل حضور: commit لكل صف مقابل execute_many داخل معاملة"""
+    print("=" * 60)
+    print("Attendance inserts - per-row commit vs batched transaction")
+    print("=" * 60)
+
+    rows = 10000
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for mode in ('per-row commit', 'execute_many + transaction'):
+            path = os.path.join(tmp, f"{mode.split()[0]}.db")
+            db = build_sample_db(path, students=rows // 10, groups=10,
+                                 groups_per_student=1, sessions=0)
+            enrollments = db.fetch_all("SELECT student_id, group_id FROM student_groups")
+            session_day = date.today()
+            records = [(s, g, (session_day - timedelta(days=i)).strftime("%Y-%m-%d"), 'حاضر')
+                       for i in range(10) for s, g in enrollments][:rows]
+            query = ("INSERT INTO attendance (student_id, group_id, attendance_date, status) "
+                     "VALUES (?, ?, ?, ?)")
+
+            if mode == 'per-row commit':
+                def run():
+                    for record in records:
+                        db.execute_query(query, record)
+            else:
+                def run():
+                    with db.transaction():
+                        db.execute_many(query, records)
+
+            results[mode] = timed(run)
+            inserted = db.fetch_one("SELECT COUNT(*) FROM attendance")[0]
+            assert inserted == rows, inserted
+            print(f"{mode:<32}{results[mode]:>10.1f} ms")
+            db.close()
+
+        speedup = results['per-row commit'] / results['execute_many + transaction']
+        print(f"speedup: {speedup:.1f}x")
+
+
+def bench_virtual_tree():
+    """سجل الحضور (100k): إدراج كل الصفوف مقابل VirtualTreeview"""
+    print("=" * 60)
+    print("Attendance ledger - full reload vs virtual tree window")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = build_sample_db(os.path.join(tmp, "virtual.db"))
+        query = """
+            SELECT a.id, s.name, g.name, a.status, a.attendance_date, a.notes
+            FROM attendance a
+            JOIN students s ON a.student_id = s.id
+            JOIN groups g ON a.group_id = g.id
+        """
+
+        full_tree = WidgetStub()
+
+        def full_reload():
+            for item in full_tree.get_children():
+                full_tree.delete(item)
+            for row in db.fetch_all(query + " ORDER BY a.attendance_date DESC"):
+                full_tree.insert("", "end", values=row)
+
+        tree, scrollbar = WidgetStub(), WidgetStub()
+        tree['height'] = 20
+        view = VirtualTreeview(tree, scrollbar, db, query,
+                               "SELECT COUNT(*) FROM attendance",
+                               "a.attendance_date", "a.id", (4, 0), lambda r: r)
+
+        full_ms = timed(full_reload)
+        reset_ms = timed(lambda: view.reset(view.fetch_snapshot(db, 0)))
+        scroll_ms = timed(lambda: view.scroll(1), repeat=1000) / 1000
+        jump_ms = timed(lambda: view.yview('moveto', '0.75'))
+        keyset_ms = timed(lambda: view.scroll(view.PAGE_SIZE))
+
+        # النافذة بعد القفز والتمرير تطابق الترتيب الكامل
+        expected = db.fetch_all(query + " ORDER BY a.attendance_date DESC, a.id DESC LIMIT 20 OFFSET ?",
+                                (view.offset,))
+        assert [tree.rows[i]['values'] for i in tree.get_children()] == expected
+
+        print(f"{'full reload (' + str(len(full_tree.rows)) + ' items)':<40}{full_ms:>10.1f} ms")
+        print(f"{'virtual reset (' + str(len(tree.rows)) + ' items)':<40}{reset_ms:>10.1f} ms")
+        print(f"{'scroll one row':<40}{scroll_ms:>10.3f} ms")
+        print(f"{'jump to 75% (OFFSET)':<40}{jump_ms:>10.1f} ms")
+        print(f"{'next page (keyset)':<40}{keyset_ms:>10.1f} ms")
+        db.close()
+
+
+def bench_keyset_pages():
+    """سجل الدفعات والحضور صفحة بصفحة: keyset مقابل OFFSET مقابل fetch_all"""
+    print("=" * 60)
+    print("Keyset pagination - 100k attendance rows, pages of 500")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = build_sample_db(os.path.join(tmp, "keyset.db"))
+        query = """
+            SELECT a.id, s.name, g.name, a.status, a.attendance_date, a.notes
+            FROM attendance a
+            JOIN students s ON a.student_id = s.id
+            JOIN groups g ON a.group_id = g.id
+        """
+        order = " ORDER BY a.attendance_date DESC, a.id DESC"
+        pages = lambda **kw: db.iter_pages(query, 'a.attendance_date', 'a.id', (4, 0), **kw)
+
+        expected = db.fetch_all(query + order)
+        streamed = [row for page in pages() for row in page]
+
+        # صفحات بفلتر مجموعة، وبترتيب تصاعدي، وبالمعرف فقط
+        group_rows = [row for page in pages(where="a.group_id = ?", params=(7,), descending=False)
+                      for row in page]
+        group_expected = db.fetch_all(query + " WHERE a.group_id = 7 ORDER BY a.attendance_date, a.id")
+        student_ids = [row[0] for page in db.iter_pages(SQL['reports.students'], None, 's.id', (0,),
+                                                         size=333, descending=False) for row in page]
+
+        last_key = (expected[-db.PAGE_SIZE - 1][4], expected[-db.PAGE_SIZE - 1][0])
+        first_ms = timed(lambda: db.fetch_page(query, 'a.attendance_date', 'a.id', (4, 0)), repeat=20) / 20
+        last_ms = timed(lambda: db.fetch_page(query, 'a.attendance_date', 'a.id', (4, 0), last_key),
+                        repeat=20) / 20
+        offset_ms = timed(lambda: db.fetch_all(query + order + " LIMIT ? OFFSET ?",
+                                               (db.PAGE_SIZE, len(expected) - db.PAGE_SIZE)), repeat=20) / 20
+        all_ms = timed(lambda: sum(1 for _ in pages()))
+
+        tracemalloc.start()
+        sum(len(page) for page in pages())
+        pages_peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.reset_peak()
+        len(db.fetch_all(query + order))
+        all_peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+        print(f"{'first page (keyset)':<40}{first_ms:>10.2f} ms")
+        print(f"{'last page (keyset)':<40}{last_ms:>10.2f} ms")
+        print(f"{'last page (OFFSET)':<40}{offset_ms:>10.2f} ms")
+        print(f"{'all pages (' + str(len(streamed)) + ' rows)':<40}{all_ms:>10.1f} ms")
+        print(f"{'peak memory: pages / fetch_all':<40}{pages_peak:>6.1f} / {all_peak:.1f} MB")
+        total_students = db.fetch_one("SELECT COUNT(*) FROM students")[0]
+        db.close()
+
+    assert streamed == expected
+    assert group_rows == group_expected
+    assert student_ids == list(range(1, total_students + 1))
+    assert pages_peak * 10 < all_peak, (pages_peak, all_peak)
+    print("OK: keyset pages match the full ordered result")
+
+
+def bench_combo_search():
+    """تصفية قائمة 100,000 طالب: المرور على كل العناصر مقابل LabelSearchIndex"""
+    print("=" * 60)
+    print("Combo filtering - linear scan vs shared label index")
+    print("=" * 60)
+
+    rng = random.Random(3)
+    first = ["أحمد", "محمد", "فاطمة", "مريم", "عمر", "يوسف", "خديجة", "علي", "سارة", "إبراهيم"]
+    last = ["السيد", "حسن", "عبد الله", "إسماعيل", "مصطفى", "الشريف", "منصور", "رمضان"]
+    labels = [f"{i} - {rng.choice(first)} {rng.choice(first)} {rng.choice(last)}"
+              for i in range(1, 100001)]
+    limit = StudentManagementApp.COMBO_MAX_RESULTS
+
+    build_ms = timed(lambda: LabelSearchIndex(labels))
+    index = LabelSearchIndex(labels)
+
+    print(f"index build: {build_ms:.1f} ms (once per entity list)")
+    print(f"{'query':<20}{'scan ms':>10}{'index ms':>10}{'results':>10}")
+    for query in ("م", "محم", "احمد مص", "فاطمه", "12345"):
+        scan_ms = timed(lambda: [l for l in labels if query in l.lower()][:limit], repeat=5) / 5
+        index_ms = timed(lambda: index.search(query, limit), repeat=20) / 20
+        results = len(index.search(query, limit))
+        print(f"{query:<20}{scan_ms:>10.2f}{index_ms:>10.3f}{results:>10}")
+
+    # تعديلات في المكان: نفس نتائج فهرس مبني من الصفر بعد التعديل
+    current = list(labels)
+    slots = list(range(len(labels)))
+    start = time.perf_counter()
+    for i in range(300):
+        if i % 3 == 0:
+            label = f"{100001 + i} - {rng.choice(first)} {rng.choice(last)}"
+            slots.append(index.add(label))
+            current.append(label)
+        elif i % 3 == 1:
+            position = rng.randrange(len(current))
+            current[position] = f"{position + 1} - {rng.choice(first)} مُعدَّل"
+            index.replace(slots[position], current[position])
+        else:
+            position = rng.randrange(len(current))
+            index.remove(slots.pop(position))
+            del current[position]
+    update_ms = (time.perf_counter() - start) * 1000 / 300
+    fresh = LabelSearchIndex(current)
+    for query in ("م", "معدل", "احمد", "1000", "السيد"):
+        assert index.search(query, limit) == fresh.search(query, limit), query
+    print(f"in-place add/replace/remove: {update_ms:.3f} ms per change (rebuild {build_ms:.0f} ms)")
+    assert update_ms * 50 < build_ms
+
+    # EntityCache: نفس الفهرس يتحدث مع كل تعديل طالب
+    with tempfile.TemporaryDirectory() as tmp:
+        db = build_sample_db(os.path.join(tmp, "combo.db"), sessions=1)
+        entities = EntityCache(db)
+        index = entities.index('students')
+        entities.update('students', 99999, "طالب جديد")
+        entities.update('students', 1, "اسم معدل")
+        entities.update('students', 2)
+        assert entities.index('students') is index
+        for query in ("طالب", "معدل", "1", "2 -"):
+            assert index.search(query, limit) == LabelSearchIndex(entities.get('students')).search(query, limit)
+        db.close()
+    print("OK: one index per entity list, updated in place")
+
+
+def bench_student_groups():
+    """نافذة مجموعات الطالب: 3 استعلامات لكل مجموعة مقابل استعلام مجمّع واحد"""
+    print("=" * 60)
+    print("Student groups dialog - per-group queries vs one aggregate")
+    print("=" * 60)
+
+    def per_group(db, student_id):
+        """الطريقة السابقة: آخر دفعة ثم الحضور ثم الغياب لكل مجموعة"""
+        stats = {}
+        for (group_id,) in db.fetch_all(
+                "SELECT group_id FROM student_groups WHERE student_id=?", (student_id,)):
+            last = db.fetch_one("SELECT MAX(payment_date) FROM payments "
+                                "WHERE student_id=? AND group_id=?", (student_id, group_id))[0]
+            counts = [db.fetch_one(
+                "SELECT COUNT(*) FROM attendance WHERE student_id=? AND group_id=? "
+                f"AND status IN ({statuses}) AND attendance_date > ?",
+                (student_id, group_id, last or ''))[0]
+                for statuses in ("'حاضر'", "'غائب', 'غياب بعذر'")]
+            stats[group_id] = (last, *counts)
+        return stats
+
+    counts = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for groups_per_student in (2, 6):
+            db = build_sample_db(os.path.join(tmp, f"groups_{groups_per_student}.db"), students=300,
+                                 groups_per_student=groups_per_student)
+            app = make_headless_app(db)
+            student_ids = range(1, 101)
+
+            for student_id in student_ids:
+                aggregated = {group[0]: (stats['last_payment_date'], stats['present'], stats['absent'])
+                              for group, stats in app.student_group_stats(student_id)}
+                assert aggregated == per_group(db, student_id), student_id
+
+            statements = count_statements(db, lambda: app.student_group_stats(1))
+            counts.append(statements)
+            old_ms = timed(lambda: [per_group(db, s) for s in student_ids]) / len(student_ids)
+            new_ms = timed(lambda: [app.student_group_stats(s) for s in student_ids]) / len(student_ids)
+            print(f"groups/student={groups_per_student:<4}statements={statements:<4}"
+                  f"per-group={old_ms:.3f} ms  aggregate={new_ms:.3f} ms")
+            db.close()
+
+    assert counts == [1, 1], counts
+    print("OK: one statement per dialog, same results")
+
+
+def bench_attendance_report():
+    """تقرير الحضور على 500,000 سجل: أربع عمليات عدّ + تجميع الطلبة مقابل تجميع واحد"""
+    print("=" * 60)
+    print("Attendance report - separate counts vs grouped pass (500k rows)")
+    print("=" * 60)
+
+    def separate_counts(db):
+        """الطريقة السابقة في show_attendance_report"""
+        totals = [db.fetch_one("SELECT COUNT(*) FROM attendance" + where)[0]
+                  for where in ("", " WHERE status='حاضر'", " WHERE status='غائب'",
+                                " WHERE status='غياب بعذر'")]
+        students = db.fetch_all("""
+            SELECT s.name,
+                   SUM(CASE WHEN a.status='حاضر' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN a.status='غائب' THEN 1 ELSE 0 END),
+                   COUNT(*)
+            FROM students s
+            JOIN attendance a ON s.id = a.student_id
+            GROUP BY s.id
+        """)
+        return totals, students
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build_ms = timed(lambda: build_sample_db(os.path.join(tmp, "report.db"), students=5000,
+                                                 groups=100, sessions=50).close())
+        db = StudentManagementDB(os.path.join(tmp, "report.db"))
+        rows = db.fetch_one("SELECT COUNT(*) FROM attendance")[0]
+        print(f"attendance rows: {rows} (built in {build_ms / 1000:.1f} s)")
+
+        old_ms = timed(lambda: separate_counts(db))
+        new_ms = timed(lambda: StudentManagementApp.fetch_attendance_report(db))
+        totals, students = separate_counts(db)
+        report = StudentManagementApp.fetch_attendance_report(db)
+
+        counts = report['totals']
+        assert totals == [sum(counts.values()), counts['حاضر'], counts['غائب'], counts['غياب بعذر']]
+        assert students == [(name, c['حاضر'], c['غائب'], sum(c.values())) for name, c in report['students']]
+        assert sum(sum(c.values()) for _, c in report['months']) == rows
+
+        print(f"{'4 counts + per-student (old)':<40}{old_ms:>10.1f} ms")
+        print(f"{'grouped pass (+groups, +months)':<40}{new_ms:>10.1f} ms")
+        print(f"students={len(report['students'])} groups={len(report['groups'])} "
+              f"months={len(report['months'])}")
+        for name in ('reports.attendance_by_enrollment', 'reports.attendance_by_date'):
+            print(f"{name:<36}{' | '.join(SQL.explain(db, SQL[name]))}")
+        db.close()
+
+
+def bench_report_cache():
+    """إعادة عرض التقارير: من ReportCache ما لم يُكتب في جداولها"""
+    print("=" * 60)
+    print("Report cache - repeated views vs writes to their tables")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = build_sample_db(os.path.join(tmp, "reports.db"), students=5000, groups=100, sessions=50)
+
+        # كل أمر كتابة مسجل يجب أن يُعرف جدوله، وإلا لن تُلغى التقارير المعتمدة عليه
+        for query in SQL:
+            if re.match(r"\s*(INSERT|REPLACE|UPDATE|DELETE)\b", query, re.IGNORECASE):
+                assert db.versions.written_table(query), query.name
+        app = make_headless_app(db)
+        app.icons['export'] = 'e'
+        reports = {
+            'students': app.show_students_report,
+            'groups': app.show_groups_report,
+            'payments': app.show_payments_report,
+            'attendance': lambda: app.show_report('attendance', app.fetch_attendance_report,
+                                                  app.format_attendance_report),
+        }
+
+        def view(report):
+            statements = count_statements(db, reports[report])
+            return statements, app.report_text.text
+
+        def view_all():
+            return {report: view(report) for report in reports}
+
+        print(f"{'report':<14}{'first ms':>10}{'again ms':>10}{'statements':>12}")
+        first = {}
+        for report, show in reports.items():
+            first_ms = timed(show)
+            first[report] = app.report_text.text
+            again_ms = timed(show, repeat=10) / 10
+            statements, text = view(report)
+            print(f"{report:<14}{first_ms:>10.1f}{again_ms:>10.3f}{statements:>12}")
+            assert statements == 0 and text == first[report], report
+            assert again_ms * 20 < first_ms, (report, first_ms, again_ms)
+
+        # كتابة في جدول لا تقرأ منه التقارير: كلها من الذاكرة
+        db.execute_query(SQL['notifications.mark_all_read'])
+        assert all(statements == 0 for statements, _ in view_all().values())
+
+        # دفعة جديدة: تقرير الدفعات فقط يُعاد حسابه
+        db.execute_query(SQL['payments.insert'], (1, 1, 12345, date.today().isoformat(), ""))
+        views = view_all()
+        assert views['payments'][0] > 0 and views['payments'][1] != first['payments']
+        assert all(views[report][0] == 0 for report in ('students', 'groups', 'attendance'))
+
+        # حضور داخل معاملة: يُلغى التقرير بعد الـ commit
+        with db.transaction():
+            db.execute_many(SQL['attendance.upsert'],
+                            [(1, 1, "2030-01-01", 'حاضر', ""), (2, 1, "2030-01-01", 'غائب', "")])
+            assert view('attendance')[0] == 0
+        statements, text = view('attendance')
+        assert statements > 0 and "2030-01" in text
+
+        # كتابة من خيط قاعدة البيانات (اتصال آخر بنفس الأرقام المشتركة)
+        worker = DatabaseWorker(db.db_name, profile=db.profile, stats=db.stats, versions=db.versions)
+        worker.submit(lambda wdb: wdb.execute_query(SQL['groups.update'],
+                                                    ("مجموعة معدلة", "مادة", "معلم", "", 999, 1))).result()
+        worker.stop()
+        views = view_all()
+        assert "مجموعة معدلة" in views['groups'][1] and views['groups'][0] > 0
+        assert views['students'][0] > 0 and views['payments'][0] > 0 and views['attendance'][0] > 0
+
+        # حذف طالب يحذف دفعاته وحضوره بـ CASCADE: كل التقارير تُعاد
+        db.execute_query("DELETE FROM students WHERE id = ?", (2,))
+        assert all(statements > 0 for statements, _ in view_all().values())
+        db.close()
+    print("OK: unchanged reports come from the cache, written tables recompute theirs")
+
+
+def bench_attendance_milestone():
+    """فحص إنجاز الحضور بعد كل تسجيل - قراءة العداد فقط، بدون إعدادات أو إعادة عدّ"""
+    print("=" * 60)
+    print("Attendance milestone check - statements per attendance insert")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = build_sample_db(os.path.join(tmp, "milestone.db"), students=500)
+        app = make_headless_app(db)
+        enrollments = db.fetch_all("SELECT student_id, group_id FROM student_groups LIMIT 200")
+
+        # أول فحص يحمّل الإعدادات مرة واحدة
+        app.check_attendance_milestone(*enrollments[0])
+        statements = []
+        elapsed = timed(lambda: [statements.extend(trace_statements(
+            db, lambda: app.check_attendance_milestone(s, g))) for s, g in enrollments])
+        settings_queries = [sql for sql in statements if 'notification_settings' in sql]
+        recounts = [sql for sql in statements if re.search(r"\bFROM attendance\b|\bLIKE\b", sql)]
+
+        print(f"{'statements per check':<40}{len(statements) / len(enrollments):>10.1f}")
+        print(f"{'time per check':<40}{elapsed / len(enrollments):>10.3f} ms")
+        print(f"{'settings queries':<40}{len(settings_queries):>10}")
+        print(f"{'attendance recounts / LIKE scans':<40}{len(recounts):>10}")
+
+        # دفعة خاطئة ثم حذفها: تعود الدورة السابقة بدون تكرار إنجازاتها المُبلّغة
+        counter = "SELECT present_since_payment, last_milestone FROM attendance_counters " \
+                  "WHERE student_id = ? AND group_id = ?"
+        student_id, group_id = enrollments[0]
+        db.execute_many(SQL['attendance.upsert'], [(student_id, group_id, f"2098-01-{day:02d}", 'حاضر', "")
+                                                   for day in range(1, 9)])
+        present = db.fetch_one(counter, (student_id, group_id))[0]
+        db.execute_query(SQL['attendance.claim_milestone'], (present, student_id, group_id, present))
+        before = db.fetch_one(counter, (student_id, group_id))
+        payment_id = db.execute_query(SQL['payments.insert'], (student_id, group_id, 100, "2099-01-01", ""))
+        after_payment = db.fetch_one(counter, (student_id, group_id))
+        db.execute_query(SQL['payments.delete'], (payment_id,))
+        after_delete = db.fetch_one(counter, (student_id, group_id))
+        db.close()
+
+    assert not settings_queries, settings_queries[:3]
+    assert not recounts, recounts[:3]
+    assert after_payment == (0, 0), after_payment
+    assert before[0] > 0 and after_delete == before, (before, after_delete)
+    print("OK: counter lookup only on the attendance path")
+
+
+def bench_roll_call():
+    """كشف حضور جلسة كاملة مقابل تسجيل كل طالب على حدة - نفس النتائج، معاملة واحدة"""
+    print("=" * 60)
+    print("Roll call - one transaction per session vs one per student")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        single_db = build_sample_db(os.path.join(tmp, "single.db"), students=1000, groups=10)
+        batch_db = build_sample_db(os.path.join(tmp, "batch.db"), students=1000, groups=10)
+        single, batch = make_headless_app(single_db), make_headless_app(batch_db)
+        group_id = 1
+        students = [row[0] for row in single_db.fetch_all(SQL['students.in_group'], (group_id,))]
+        rng = random.Random(7)
+        sessions = [((date.today() + timedelta(days=7 * i)).strftime("%Y-%m-%d"),
+                     [(s, rng.choice(['حاضر'] * 8 + ['غائب']), '') for s in students])
+                    for i in range(1, 9)]
+
+        def add_one_by_one():
+            for attendance_date, records in sessions:
+                for student_id, status, notes in records:
+                    with single_db.transaction():
+                        single_db.execute_query(SQL['attendance.upsert'],
+                                                (student_id, group_id, attendance_date, status, notes))
+                        if status == 'حاضر':
+                            single.check_attendance_milestone(student_id, group_id)
+
+        def roll_call():
+            for attendance_date, records in sessions:
+                batch.save_roll_call(group_id, attendance_date, records)
+
+        def profile(db, func):
+            # (عدد المعاملات، عدد أوامر فحص الإنجاز) - بدون أوامر تسجيل الحضور نفسها
+            statements = trace_statements(db, func)
+            commits = statements.count('COMMIT')
+            milestone = [sql for sql in statements
+                         if sql not in ('BEGIN', 'COMMIT') and not sql.startswith('INSERT INTO attendance')]
+            return commits, len(milestone)
+
+        # تحميل الإعدادات مرة واحدة قبل القياس
+        single.settings.get_int('attendance_milestone_count')
+        batch.settings.get_int('attendance_milestone_count')
+        single_commits, single_checks = profile(single_db, add_one_by_one)
+        batch_commits, batch_checks = profile(batch_db, roll_call)
+        # إعادة نفس الكشوف: لا إشعارات مكررة
+        single_time = timed(add_one_by_one)
+        batch_time = timed(roll_call)
+
+        def results(db):
+            return (sorted(db.fetch_all("SELECT student_id, group_id, message FROM notifications")),
+                    sorted(db.fetch_all("SELECT * FROM attendance_counters")),
+                    sorted(db.fetch_all("SELECT student_id, group_id, attendance_date, status FROM attendance")))
+
+        milestones = single_db.fetch_one("SELECT COUNT(*) FROM notifications")[0]
+        same = results(single_db) == results(batch_db)
+        print(f"{'students x sessions':<40}{len(students):>6} x {len(sessions)}")
+        print(f"{'commits (one by one / roll call)':<40}{single_commits:>6} / {batch_commits}")
+        print(f"{'milestone statements (one by one / roll)':<40}{single_checks:>6} / {batch_checks}")
+        print(f"{'re-save time (one by one)':<40}{single_time:>10.1f} ms")
+        print(f"{'re-save time (roll call)':<40}{batch_time:>10.1f} ms")
+        print(f"{'milestone notifications':<40}{milestones:>10}")
+        single_db.close()
+        batch_db.close()
+
+    assert milestones, "no milestones fired"
+    assert same, "roll call results differ from per-student path"
+    assert batch_commits == len(sessions), batch_commits
+    assert batch_checks <= 2 * len(sessions), batch_checks
+    print("OK: roll call matches per-student milestones")
+
+
+def write_xlsx(path, rows):
+    """ملف XLSX بنفس كاتب التصدير - الصف الأول للعناوين"""
+    rows = iter(rows)
+    writer = XlsxLedgerWriter(path, {'headers': next(rows)})
+    writer.write_rows(rows)
+    writer.close()
+
+
+def bench_import():
+    """استيراد 100 ألف طالب من CSV و XLSX - دفعات، تكرار، أخطاء، وذاكرة محدودة"""
+    print("=" * 60)
+    print("Bulk import - 100k students (CSV and XLSX)")
+    print("=" * 60)
+
+    rows = 100_000
+    rng = random.Random(3)
+
+    def student_rows():
+        yield ["الاسم", "رقم الهاتف", "البريد", "العنوان", "المجموعة"]
+        for i in range(rows):
+            if i % 50 == 49:
+                # رقم موجود مسبقاً في قاعدة البيانات بصيغة دولية
+                yield [f"طالب {i}", f"+20 11{rng.randint(1, 500):08d}", "", "", ""]
+            elif i % 100 == 98:
+                yield ["", "01000000000", "", "", ""]
+            else:
+                yield [f"طالب مستورد {i}", f"012{i:08d}", f"s{i}@example.com",
+                       "القاهرة", f"مجموعة {i % 10 + 1}"]
+
+    expected_inserted = rows - rows // 50 - rows // 100
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "students.csv")
+        xlsx_path = os.path.join(tmp, "students.xlsx")
+        with open(csv_path, 'w', encoding='utf-8-sig', newline='') as stream:
+            csv.writer(stream).writerows(student_rows())
+        write_xlsx(xlsx_path, student_rows())
+
+        for label, path in (("csv", csv_path), ("xlsx", xlsx_path)):
+            db = build_sample_db(os.path.join(tmp, f"{label}.db"), students=500, groups=10, sessions=2)
+            updates = []
+            start = time.perf_counter()
+            result = BulkImporter(db, 'students', lambda done, fraction: updates.append(fraction)).run(path)
+            elapsed = (time.perf_counter() - start) * 1000
+
+            # ذاكرة القارئ وحده: الصفوف لا تُحفظ مهما كان حجم الملف
+            tracemalloc.start()
+            for _ in iter_import_rows(path):
+                pass
+            peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+
+            print(f"{label + ' time':<40}{elapsed:>10.0f} ms")
+            print(f"{label + ' reader peak memory':<40}{peak:>10.1f} MB")
+            print(f"{label + ' inserted / duplicates / errors':<40}"
+                  f"{result['inserted']:>7} / {result['duplicates']} / {result['errors']}")
+            print(f"{label + ' enrolled':<40}{result['enrolled']:>10}")
+            print(f"{label + ' progress updates':<40}{len(updates):>10}")
+
+            searchable = db.fetch_one("SELECT COUNT(*) FROM search_index WHERE kind = 'student'")[0]
+            students = db.fetch_one("SELECT COUNT(*) FROM students")[0]
+            db.close()
+
+            assert result['rows'] == rows, result['rows']
+            assert result['inserted'] == expected_inserted, result['inserted']
+            assert result['duplicates'] == rows // 50, result['duplicates']
+            assert result['errors'] == rows // 100, result['errors']
+            assert result['enrolled'] == expected_inserted
+            assert searchable == students == 500 + expected_inserted
+            assert updates == sorted(updates) and updates[-1] == 1.0
+            assert peak < 16, peak
+
+        # اسم يطابق أكثر من طالب موجود: خطأ بدلاً من مكرر يُهمل تسجيله في المجموعة
+        db = build_sample_db(os.path.join(tmp, "ambiguous.db"), students=10, groups=2, sessions=1)
+        for _ in range(2):
+            db.execute_query(SQL['students.insert'], ("طالب مكرر", "", "", ""))
+        path = os.path.join(tmp, "ambiguous.csv")
+        with open(path, 'w', encoding='utf-8-sig', newline='') as stream:
+            csv.writer(stream).writerows([["الاسم", "المجموعة"], ["طالب  مكرر", "1"]])
+        result = BulkImporter(db, 'students', lambda done, fraction: None).run(path)
+        db.close()
+        assert (result['errors'], result['duplicates'], result['enrolled']) == (1, 0, 0), result
+        assert result['error_samples'][0][0] == 2, result['error_samples']
+    print("OK: streamed import with dedupe, validation and search index in sync")
+
+
+def bench_export():
+    """تصدير سجل الحضور (500 ألف صف) بالصيغ الثلاث - ذاكرة ثابتة وفلاتر التاريخ/المجموعة"""
+    print("=" * 60)
+    print("Ledger export - 500k attendance rows")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = build_sample_db(os.path.join(tmp, "export.db"), students=10000, sessions=25)
+        total = db.fetch_one("SELECT COUNT(*) FROM attendance")[0]
+
+        counts = {}
+        for fmt in LedgerExporter.WRITERS:
+            path = os.path.join(tmp, f"attendance.{fmt}")
+            elapsed = timed(lambda: counts.__setitem__(fmt, LedgerExporter(db, 'attendance', fmt).run(path)))
+            size = os.path.getsize(path) / 2 ** 20
+            print(f"{fmt + ' export':<40}{elapsed:>10.0f} ms  {size:>6.1f} MB")
+        with open(os.path.join(tmp, "attendance.jsonl"), encoding='utf-8') as stream:
+            jsonl_rows = sum(1 for _ in stream)
+        xlsx_rows = sum(1 for _ in iter_import_rows(os.path.join(tmp, "attendance.xlsx"))) - 1
+
+        # الذاكرة: دفعة واحدة من الصفوف وليس السجل كاملاً
+        tracemalloc.start()
+        LedgerExporter(db, 'attendance', 'csv').run(os.path.join(tmp, "memory.csv"))
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+        print(f"{'csv export peak python memory':<40}{peak:>10.1f} MB")
+
+        # الفلاتر: نفس نتيجة COUNT المباشر
+        dates = db.fetch_all("SELECT DISTINCT attendance_date FROM attendance ORDER BY 1")
+        date_from, date_to = dates[5][0], dates[14][0]
+        filtered = LedgerExporter(db, 'attendance', 'csv').run(
+            os.path.join(tmp, "filtered.csv"), date_from, date_to, group_id=7)
+        expected = db.fetch_one("""SELECT COUNT(*) FROM attendance
+                                   WHERE group_id = 7 AND attendance_date BETWEEN ? AND ?""",
+                                (date_from, date_to))[0]
+        print(f"{'group 7, sessions 6-15':<40}{filtered:>10}")
+
+        # الإيقاف: لا يبقى ملف ناقص
+        stopped_path = os.path.join(tmp, "stopped.xlsx")
+        stopped = LedgerExporter(db, 'payments', 'xlsx', cancelled=lambda: True).run(stopped_path)
+        db.close()
+
+    assert counts == {fmt: total for fmt in LedgerExporter.WRITERS}, counts
+    assert jsonl_rows == xlsx_rows == total, (jsonl_rows, xlsx_rows)
+    assert peak < 16, peak
+    assert filtered == expected, (filtered, expected)
+    assert stopped is None and not os.path.exists(stopped_path)
+    print("OK: streamed export in constant memory")
+
+
+def bench_query_plans():
+    """خطة تنفيذ كل الأوامر المسجلة - يفشل عند قراءة جدول كامل غير مسموح بها"""
+    print("=" * 60)
+    print(f"Query plans - {len(SQL)} registered queries")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = build_sample_db(os.path.join(tmp, "plans.db"), students=500, sessions=5)
+        db.execute_query("ANALYZE")
+        for query in SQL:
+            print(f"{query.name:<36}{' | '.join(SQL.explain(db, query))[:120]}")
+        scans = SQL.full_scans(db)
+        db.close()
+
+    assert not scans, "full table scans:\n" + "\n".join(f"  {name}: {detail}" for name, detail in scans)
+    print("OK: no unexpected full table scans")
+
+
+BENCHMARKS = {
+    'indexes': bench_indexes,
+    'teachers': bench_load_teachers,
+    'batch': bench_batch_writes,
+    'virtual': bench_virtual_tree,
+    'keyset': bench_keyset_pages,
+    'combo': bench_combo_search,
+    'milestone': bench_attendance_milestone,
+    'rollcall': bench_roll_call,
+    'import': bench_import,
+    'export': bench_export,
+    'student_groups': bench_student_groups,
+    'report': bench_attendance_report,
+    'report_cache': bench_report_cache,
+    'plans': bench_query_plans,
+}
+
+
+def main():
+    """تشغيل القياسات المطلوبة"""
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"unknown benchmark: {name} (available: {', '.join(BENCHMARKS)})")
+            return 1
+        BENCHMARKS[name]()
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,26 +7,733 @@ Desktop Application - Python + Tkinter + SQLite
 
 import sqlite3
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox, scrolledtext, filedialog
 from datetime import datetime, date, timedelta
 import os
+import re
+import io
+import sys
+import csv
 import json
+import time
+import heapq
+import queue
+import logging
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import Future
+from contextlib import contextmanager, nullcontext
+
+
+logger = logging.getLogger(__name__)
+
+
+# توحيد الحروف العربية للبحث + حذف التشكيل والألف الخنجرية والتطويل
+_ARABIC_NORMALIZATION = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي',
+    'ؤ': 'و',
+    'ئ': 'ي',
+    **{chr(code): None for code in range(0x064B, 0x0653)},
+    '\u0670': None,
+    '\u0640': None,
+})
+
+
+def normalize_arabic(text):
+    """توحيد النص للبحث: الهمزات، التاء المربوطة، الألف المقصورة، التشكيل"""
+    if text is None:
+        return ""
+    return str(text).translate(_ARABIC_NORMALIZATION).lower()
+
+
+def search_tokens(text):
+    """كلمات البحث بعد التوحيد (نفس تقسيم unicode61 في FTS5)"""
+    return re.findall(r"[^\W_]+", normalize_arabic(text))
+
+
+def search_text(text):
+    """النص المخزن في فهرس البحث: الكلمات الموحدة + نفس الكلمات بدون "ال" التعريف"""
+    words = search_tokens(text)
+    return " ".join(words + [word[2:] for word in words if word.startswith('ال') and len(word) > 3])
+
+
+def normalize_name(text):
+    """مفتاح مقارنة الأسماء: كلمات موحدة بمسافة واحدة"""
+    return " ".join(search_tokens(text))
+
+
+# الأرقام العربية والفارسية -> لاتينية
+_DIGIT_NORMALIZATION = str.maketrans({
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+})
+
+
+def normalize_phone(text):
+    """مفتاح مقارنة أرقام الهاتف: أرقام لاتينية فقط بصيغة 01xxxxxxxxx المحلية"""
+    digits = re.sub(r"[^0-9\u0660-\u0669\u06F0-\u06F9]", "", str(text or "")).translate(_DIGIT_NORMALIZATION)
+    if digits.startswith('00'):
+        digits = digits[2:]
+    if digits.startswith('20') and len(digits) == 12:
+        digits = '0' + digits[2:]
+    elif digits.startswith('1') and len(digits) == 10:
+        # Excel يحذف الصفر الأول من الأرقام
+        digits = '0' + digits
+    return digits
+
+
+def search_digits(text):
+    """نص البحث بأرقام لاتينية إذا كان أرقاماً فقط (جزء من هاتف أو رقم طالب)، وإلا نص فارغ"""
+    digits = str(text or "").strip().translate(_DIGIT_NORMALIZATION)
+    return digits if re.fullmatch(r"[0-9]+", digits) else ""
+
+
+def fts_query(text):
+    """تحويل نص البحث لاستعلام FTS5: كل كلمة كبادئة، وكل الكلمات مطلوبة"""
+    return " ".join(f'"{token}"*' for token in search_tokens(text))
+
+
+def matches_search(tokens, *fields):
+    """نفس منطق fts_query في الذاكرة: كل كلمة بحث بداية لكلمة في الحقول"""
+    words = search_text(" ".join(str(field) for field in fields if field is not None)).split()
+    return all(any(word.startswith(token) for word in words) for token in tokens)
+
+
+class StartupTracer:
+    """تتبع زمن بدء التشغيل: مقطع (span) لكل مرحلة وكل أمر SQL وكل بناء صفحة
+
+    يُفعّل بالخيار --trace-startup أو المتغير STUDENT_MANAGER_TRACE_STARTUP=1، ويكتب
+    ملخصاً في السجل وملف JSON بصيغة Chrome trace (chrome://tracing أو Perfetto).
+    """
+    
+    FLAG = '--trace-startup'
+    ENV_VAR = 'STUDENT_MANAGER_TRACE_STARTUP'
+    
+    def __init__(self, enabled=False, output_dir="."):
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.finished = False
+        self.events = []
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_environment(cls, argv=None):
+        """تفعيل التتبع حسب سطر الأوامر أو متغير البيئة"""
+        argv = sys.argv[1:] if argv is None else argv
+        return cls(enabled=cls.FLAG in argv or os.environ.get(cls.ENV_VAR, '') not in ('', '0'))
+    
+    def span(self, name, category='phase', **args):
+        """with tracer.span(...): - لا يفعل شيئاً عند تعطيل التتبع"""
+        if not self.enabled or self.finished:
+            return nullcontext()
+        return self._span(name, category, args)
+    
+    @contextmanager
+    def _span(self, name, category, args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, category, start, time.perf_counter(), **args)
+    
+    def record(self, name, category, start, end, **args):
+        """تسجيل مقطع بين وقتين من time.perf_counter()"""
+        if not self.enabled or self.finished:
+            return
+        event = {
+            'name': name, 'cat': category, 'ph': 'X',
+            'ts': round((start - self.origin) * 1e6), 'dur': round((end - start) * 1e6),
+            'pid': os.getpid(), 'tid': threading.get_ident(),
+        }
+        if args:
+            event['args'] = args
+        with self._lock:
+            self.events.append(event)
+    
+    def finish(self):
+        """إنهاء التتبع وكتابة ملف JSON والملخص - يعيد مسار الملف"""
+        if not self.enabled or self.finished:
+            return None
+        self.finished = True
+        
+        path = os.path.join(self.output_dir,
+                            f"startup-trace-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        thread_names = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': thread.ident,
+                         'args': {'name': thread.name}} for thread in threading.enumerate()]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': thread_names + self.events, 'displayTimeUnit': 'ms'},
+                      f, ensure_ascii=False)
+        
+        totals = {}
+        for event in self.events:
+            count, total = totals.get(event['cat'], (0, 0))
+            totals[event['cat']] = (count + 1, total + event['dur'])
+        logger.info("Startup trace written to %s", path)
+        for category, (count, total) in sorted(totals.items()):
+            logger.info("  %-8s %5d spans %9.1f ms", category, count, total / 1000)
+        for event in sorted((e for e in self.events if e['cat'] != 'sql'),
+                            key=lambda e: e['dur'], reverse=True)[:10]:
+            logger.info("  %9.1f ms  %s", event['dur'] / 1000, event['name'])
+        return path
+
+
+class QueryStats:
+    """إحصائيات أوامر SQL: الزمن وعدد الصفوف ودالة التطبيق التي نفذت الأمر
+
+    يُفعّل بالخيار --sql-stats أو STUDENT_MANAGER_SQL_STATS=1 (أو من تقرير التشخيص)،
+    والأوامر الأبطأ من STUDENT_MANAGER_SLOW_QUERY_MS (200 افتراضياً) تُسجل كتحذير.
+    """
+    
+    FLAG = '--sql-stats'
+    ENV_VAR = 'STUDENT_MANAGER_SQL_STATS'
+    SLOW_ENV_VAR = 'STUDENT_MANAGER_SLOW_QUERY_MS'
+    
+    def __init__(self, enabled=False, slow_query_ms=200):
+        self.enabled = enabled
+        self.slow_query_ms = slow_query_ms
+        self.statements = {}
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_environment(cls, argv=None):
+        argv = sys.argv[1:] if argv is None else argv
+        enabled = cls.FLAG in argv or os.environ.get(cls.ENV_VAR, '') not in ('', '0')
+        return cls(enabled, float(os.environ.get(cls.SLOW_ENV_VAR, 200)))
+    
+    @staticmethod
+    def call_site():
+        """أول دالة خارج طبقة قاعدة البيانات في مكدس الاستدعاء"""
+        frame = sys._getframe(2)
+        while frame is not None:
+            name = getattr(frame.f_code, 'co_qualname', None)
+            if name is None:
+                # Python < 3.11: اسم الصنف من self إن وجد
+                name = frame.f_code.co_name
+                instance = frame.f_locals.get('self')
+                if instance is not None:
+                    name = f"{type(instance).__name__}.{name}"
+            if not name.startswith(('StudentManagementDB.', 'QueryStats.')):
+                return name
+            frame = frame.f_back
+        return '?'
+    
+    def record(self, query, elapsed, rows):
+        """تسجيل تنفيذ أمر (elapsed بالثواني)"""
+        site = self.call_site()
+        sql = " ".join(query.split())
+        if isinstance(query, NamedQuery):
+            sql = f"[{query.name}] {sql}"
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            entry = self.statements.get(sql)
+            if entry is None:
+                entry = self.statements[sql] = {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                                'rows': 0, 'sites': {}}
+            entry['calls'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            entry['rows'] += rows
+            entry['sites'][site] = entry['sites'].get(site, 0) + 1
+        
+        if elapsed_ms >= self.slow_query_ms:
+            logger.warning("Slow query %.1f ms (%d rows) from %s: %s", elapsed_ms, rows, site, sql[:200])
+    
+    def top(self, limit=20):
+        """أكثر الأوامر استهلاكاً للوقت الكلي"""
+        with self._lock:
+            items = [(sql, dict(entry, sites=dict(entry['sites'])))
+                     for sql, entry in self.statements.items()]
+        return sorted(items, key=lambda item: item[1]['total_ms'], reverse=True)[:limit]
+    
+    def reset(self):
+        with self._lock:
+            self.statements.clear()
+
+
+class TableVersions:
+    """رقم تغيير لكل جدول يزيد مع كل كتابة عبر execute_query / execute_many
+
+    مشترك بين الاتصال الرئيسي وخيوط قاعدة البيانات (مثل QueryStats)، فأي نتيجة
+    محسوبة من جداول لم تتغير أرقامها منذ حسابها ما زالت صحيحة.
+    """
+    
+    # الجدول الذي يكتب فيه الأمر: INSERT / REPLACE / UPDATE / DELETE
+    WRITE_PATTERN = re.compile(
+        r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)"
+        r"\s+[\"`\[]?(\w+)", re.IGNORECASE)
+    
+    def __init__(self):
+        self.versions = Counter()
+        self._tables = {}
+        self._lock = threading.Lock()
+    
+    def written_table(self, query):
+        """اسم الجدول الذي يعدله الأمر أو None للقراءة (محفوظ لكل نص أمر)"""
+        table = self._tables.get(query, False)
+        if table is False:
+            match = self.WRITE_PATTERN.match(query)
+            table = match.group(1).lower() if match else None
+            # الأوامر المسجلة ثابتة، والمبنية ديناميكياً لا تملأ الذاكرة
+            if isinstance(query, NamedQuery) or len(self._tables) < 1024:
+                self._tables[query] = table
+        return table
+    
+    def bump(self, *tables):
+        """زيادة أرقام الجداول التي تغيرت"""
+        with self._lock:
+            self.versions.update(tables)
+    
+    def snapshot(self, tables):
+        """أرقام الجداول المطلوبة الآن - تتغير إذا كُتب في أي منها"""
+        with self._lock:
+            return tuple(self.versions[table] for table in tables)
+
+
+class LabelSearchIndex:
+    """فهرس بحث في الذاكرة لعناصر القوائم المنسدلة
+
+    قاموس مرتب لكلمات العناصر (بعد search_text) مع مواضع كل كلمة، فالبحث عن بادئة
+    كلمة هو نطاق bisect بدلاً من المرور على كل العناصر، ويتوقف عند أول limit نتيجة.
+    البحث ببداية الكلمات فقط (وليس جزءاً من وسط الاسم أو الرقم).
+    
+    الموضع (slot) ثابت لكل عنصر: add() تضيف في النهاية، وremove() تترك مكاناً فارغاً،
+    فيبقى ترتيب النتائج نفس ترتيب القائمة بعد أي تعديل دون إعادة البناء.
+    """
+    
+    def __init__(self, labels=()):
+        self.labels = list(labels)
+        self.label_words = [search_text(label).split() for label in self.labels]
+        # كلمة -> مواضع العناصر التي تحتويها (تصاعدياً)
+        self.postings = {}
+        for position, words in enumerate(self.label_words):
+            for word in set(words):
+                self.postings.setdefault(word, []).append(position)
+        self.vocabulary = sorted(self.postings)
+    
+    def add(self, label):
+        """إضافة عنصر في نهاية القائمة - يعيد موضعه"""
+        position = len(self.labels)
+        self.labels.append(label)
+        self.label_words.append(search_text(label).split())
+        self._add_words(position)
+        return position
+    
+    def replace(self, position, label):
+        """تعديل نص عنصر في مكانه"""
+        self._remove_words(position)
+        self.labels[position] = label
+        self.label_words[position] = search_text(label).split()
+        self._add_words(position)
+    
+    def remove(self, position):
+        """حذف عنصر - مكانه يبقى فارغاً حتى إعادة البناء"""
+        self._remove_words(position)
+        self.labels[position] = None
+        self.label_words[position] = []
+    
+    def _add_words(self, position):
+        for word in set(self.label_words[position]):
+            postings = self.postings.get(word)
+            if postings is None:
+                self.postings[word] = [position]
+                insort(self.vocabulary, word)
+            elif postings[-1] < position:
+                postings.append(position)
+            else:
+                insort(postings, position)
+    
+    def _remove_words(self, position):
+        for word in set(self.label_words[position]):
+            postings = self.postings[word]
+            del postings[bisect_left(postings, position)]
+            if not postings:
+                del self.postings[word]
+                del self.vocabulary[bisect_left(self.vocabulary, word)]
+    
+    def _prefix_postings(self, token):
+        """قوائم المواضع لكل الكلمات التي تبدأ بـ token"""
+        start = bisect_left(self.vocabulary, token)
+        end = bisect_left(self.vocabulary, token + chr(0x10FFFF), start)
+        return [self.postings[word] for word in self.vocabulary[start:end]]
+    
+    def search(self, text, limit):
+        """أول limit عنصر (بترتيب القائمة) تكون فيه كل كلمة بحث بداية لكلمة فيه"""
+        tokens = set(search_tokens(text))
+        if not tokens:
+            return [label for label in self.labels if label is not None][:limit]
+        
+        # المرور على مواضع الكلمة الأقل نتائج بالترتيب، والتوقف عند limit
+        postings = {token: self._prefix_postings(token) for token in tokens}
+        driver = min(tokens, key=lambda token: sum(map(len, postings[token])))
+        others = [token for token in tokens if token != driver]
+        
+        results = []
+        previous = None
+        for position in heapq.merge(*postings[driver]):
+            if position == previous:
+                continue
+            previous = position
+            words = self.label_words[position]
+            if all(any(word.startswith(token) for word in words) for token in others):
+                results.append(self.labels[position])
+                if len(results) >= limit:
+                    break
+        return results
+
+
+class NamedQuery(str):
+    """أمر SQL مسجل باسم - يُمرر كنص عادي لـ sqlite3 مع معلومات للتحقق والتشخيص"""
+
+    def __new__(cls, name, sql, allow_scan=()):
+        query = super().__new__(cls, sql)
+        query.name = name
+        # عدد المعاملات ? خارج النصوص الثابتة '...'
+        query.param_count = re.sub(r"'(?:[^']|'')*'", "", sql).count('?')
+        # الجداول المسموح بقراءتها كاملة (قوائم العرض مثلاً)
+        query.allow_scan = frozenset(allow_scan)
+        return query
+
+    def check(self, params):
+        """التحقق من عدد المعاملات قبل التنفيذ"""
+        if len(params) != self.param_count:
+            raise ValueError(f"Query '{self.name}' expects {self.param_count} parameters, "
+                             f"got {len(params)}")
+
+
+class QueryRegistry:
+    """سجل مركزي للأوامر المسماة - يسمح بفحص خطة تنفيذ كل الأوامر دفعة واحدة"""
+
+    def __init__(self):
+        self.queries = {}
+
+    def register(self, name, sql, allow_scan=()):
+        if name in self.queries:
+            raise ValueError(f"Query already registered: {name}")
+        query = self.queries[name] = NamedQuery(name, sql.strip(), allow_scan)
+        return query
+
+    def __getitem__(self, name):
+        return self.queries[name]
+
+    def __iter__(self):
+        return iter(self.queries.values())
+
+    def __len__(self):
+        return len(self.queries)
+
+    @staticmethod
+    def explain(db, query):
+        """خطة التنفيذ (EXPLAIN QUERY PLAN) بمعاملات فارغة - لا يُنفذ الأمر فعلياً"""
+        return [row[3] for row in db.fetch_all("EXPLAIN QUERY PLAN " + query,
+                                               (None,) * query.param_count)]
+
+    def full_scans(self, db):
+        """الأوامر التي تقرأ جدولاً كاملاً دون فهرس: [(الاسم، سطر الخطة)]"""
+        scans = []
+        for query in self:
+            for detail in self.explain(db, query):
+                match = re.fullmatch(r"SCAN (\w+)", detail)
+                if match and match.group(1) not in query.allow_scan:
+                    scans.append((query.name, detail))
+        return scans
+
+
+# إعادة حساب عداد الحضور منذ آخر دفعة لزوج (طالب، مجموعة) - {row} = new أو old في المشغل
+# last_milestone يبدأ من الصفر فقط عند دفعة أحدث (دورة دفع جديدة). إذا عاد التاريخ للخلف
+# (حذف دفعة خاطئة) تعود الدورة السابقة، وإنجازاتها حتى العدد الحالي تعتبر مُبلّغة فلا تتكرر
+ATTENDANCE_COUNTER_REFRESH = """
+    INSERT INTO attendance_counters (student_id, group_id, last_payment_date, present_since_payment)
+    SELECT {row}.student_id, {row}.group_id, last.payment_date,
+           (SELECT COUNT(*) FROM attendance
+            WHERE student_id = {row}.student_id AND group_id = {row}.group_id AND status = 'حاضر'
+            AND attendance_date > COALESCE(last.payment_date, ''))
+    FROM (SELECT MAX(payment_date) AS payment_date FROM payments
+          WHERE student_id = {row}.student_id AND group_id = {row}.group_id) AS last
+    -- الحذف المتتالي لطالب/مجموعة يحذف الدفعات أيضاً - لا داعي لعداد
+    WHERE EXISTS (SELECT 1 FROM students WHERE id = {row}.student_id)
+    AND EXISTS (SELECT 1 FROM groups WHERE id = {row}.group_id)
+    ON CONFLICT (student_id, group_id) DO UPDATE SET
+        last_milestone = CASE
+            WHEN COALESCE(excluded.last_payment_date, '') > COALESCE(last_payment_date, '') THEN 0
+            WHEN last_payment_date IS excluded.last_payment_date THEN last_milestone
+            ELSE MAX(last_milestone, excluded.present_since_payment) END,
+        last_payment_date = excluded.last_payment_date,
+        present_since_payment = excluded.present_since_payment;"""
+
+
+class DatabaseSupportError(RuntimeError):
+    """نسخة SQLite المثبتة تنقصها إمكانية يحتاجها البرنامج"""
 
 
 class StudentManagementDB:
     """إدارة قاعدة البيانات SQLite"""
+
+    # ملفات إعدادات الاتصال (PRAGMA) - تُطبق عند كل اتصال
+    # يمكن اختيار الملف عبر المتغير STUDENT_MANAGER_DB_PROFILE
+    CONNECTION_PROFILES = {
+        'default': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'foreign_keys': 'ON',
+            'cache_size': -16000,       # ~16 MB
+            'mmap_size': 67108864,      # 64 MB
+            'temp_store': 'MEMORY',
+        },
+        # للأقراص الشبكية/المحمولة حيث لا يعمل WAL بشكل موثوق
+        'compat': {
+            'journal_mode': 'DELETE',
+            'synchronous': 'FULL',
+            'foreign_keys': 'ON',
+            'cache_size': -16000,
+            'mmap_size': 0,
+            'temp_store': 'MEMORY',
+        },
+    }
+
+    # ترحيلات المخطط - (رقم الإصدار، أوامر SQL) مرتبة تصاعدياً
+    # الإصدار الحالي محفوظ في PRAGMA user_version
+    SCHEMA_MIGRATIONS = [
+        (1, [
+            # آخر دفعة لكل (طالب، مجموعة) + فحص الدفعات المتأخرة
+            "CREATE INDEX IF NOT EXISTS idx_payments_student_group_date "
+            "ON payments(student_id, group_id, payment_date)",
+            # ترتيب سجل الدفعات
+            "CREATE INDEX IF NOT EXISTS idx_payments_date ON payments(payment_date)",
+            # عدّ الحضور/الغياب لكل (طالب، مجموعة) بعد تاريخ معين
+            "CREATE INDEX IF NOT EXISTS idx_attendance_student_group_status_date "
+            "ON attendance(student_id, group_id, status, attendance_date)",
+            # ترتيب سجل الحضور
+            "CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance(attendance_date)",
+            # البحث عن إشعار موجود لنفس الطالب والمجموعة
+            "CREATE INDEX IF NOT EXISTS idx_notifications_type_student_group "
+            "ON notifications(type, student_id, group_id, is_read)",
+            # ترتيب قائمة الإشعارات
+            "CREATE INDEX IF NOT EXISTS idx_notifications_read_created "
+            "ON notifications(is_read, created_at)",
+            # مجموعات المعلم
+            "CREATE INDEX IF NOT EXISTS idx_groups_teacher ON groups(teacher)",
+            # طلاب المجموعة (UNIQUE الحالي يبدأ بـ student_id)
+            "CREATE INDEX IF NOT EXISTS idx_student_groups_group ON student_groups(group_id)",
+            "ANALYZE",
+        ]),
+        (2, [
+            # إزالة إشعارات الدفع المفتوحة المكررة قبل إنشاء القيد
+            """DELETE FROM notifications
+               WHERE type='payment' AND is_read=0 AND id NOT IN (
+                   SELECT MIN(id) FROM notifications
+                   WHERE type='payment' AND is_read=0
+                   GROUP BY student_id, group_id
+               )""",
+            # إشعار دفع مفتوح واحد فقط لكل (طالب، مجموعة)
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_notifications_open_payment "
+            "ON notifications(student_id, group_id) WHERE type='payment' AND is_read=0",
+        ]),
+        (3, [
+            # تنظيف السجلات اليتيمة المتبقية من فترة تعطيل foreign_keys
+            """DELETE FROM student_groups
+               WHERE student_id NOT IN (SELECT id FROM students)
+               OR group_id NOT IN (SELECT id FROM groups)""",
+            """DELETE FROM payments
+               WHERE student_id NOT IN (SELECT id FROM students)
+               OR group_id NOT IN (SELECT id FROM groups)""",
+            """DELETE FROM attendance
+               WHERE student_id NOT IN (SELECT id FROM students)
+               OR group_id NOT IN (SELECT id FROM groups)""",
+            """DELETE FROM notifications
+               WHERE student_id NOT IN (SELECT id FROM students)
+               OR (group_id IS NOT NULL AND group_id NOT IN (SELECT id FROM groups))""",
+        ]),
+        (4, [
+            # فهرس البحث النصي للطلبة - النص مخزن بعد search_text
+            # rowid = id * 4 + 1 ليكون الحذف/التحديث بالمفتاح
+            """CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+                   kind UNINDEXED, ref_id UNINDEXED, name, details,
+                   tokenize='unicode61 remove_diacritics 2'
+               )""",
+            # المشغلات لا تستدعي search_text (دالة Python غير موجودة في الاتصالات الأخرى):
+            # تضع الطالب في search_pending فقط، ويفهرسه sync_search_index في مسار الكتابة
+            "CREATE TABLE IF NOT EXISTS search_pending (student_id INTEGER PRIMARY KEY)",
+            """CREATE TRIGGER IF NOT EXISTS students_search_insert AFTER INSERT ON students BEGIN
+                   INSERT INTO search_pending (student_id)
+                   SELECT new.id WHERE NOT EXISTS (SELECT 1 FROM search_pending WHERE student_id = new.id);
+               END""",
+            """CREATE TRIGGER IF NOT EXISTS students_search_update
+               AFTER UPDATE OF id, name, phone, email ON students BEGIN
+                   DELETE FROM search_index WHERE rowid = old.id * 4 + 1;
+                   INSERT INTO search_pending (student_id)
+                   SELECT new.id WHERE NOT EXISTS (SELECT 1 FROM search_pending WHERE student_id = new.id);
+               END""",
+            """CREATE TRIGGER IF NOT EXISTS students_search_delete AFTER DELETE ON students BEGIN
+                   DELETE FROM search_index WHERE rowid = old.id * 4 + 1;
+               END""",
+            # الطلبة الحاليون يُفهرسون بعد الترحيل (sync_search_index عند التشغيل)
+            "DELETE FROM search_index",
+            "INSERT OR IGNORE INTO search_pending (student_id) SELECT id FROM students",
+        ]),
+        (5, [
+            # عدد حصص الحضور منذ آخر دفعة لكل (طالب، مجموعة) - تحدثه المشغلات
+            # last_milestone: آخر عدد أُرسل له إشعار إنجاز في دورة الدفع الحالية
+            """CREATE TABLE IF NOT EXISTS attendance_counters (
+                   student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+                   group_id INTEGER NOT NULL REFERENCES groups(id) ON DELETE CASCADE,
+                   last_payment_date DATE,
+                   present_since_payment INTEGER NOT NULL DEFAULT 0,
+                   last_milestone INTEGER NOT NULL DEFAULT 0,
+                   PRIMARY KEY (student_id, group_id)
+               ) WITHOUT ROWID""",
+            "CREATE INDEX IF NOT EXISTS idx_attendance_counters_group ON attendance_counters(group_id)",
+            # الحضور: زيادة/نقص العداد إذا كان التاريخ بعد آخر دفعة
+            # (NOT EXISTS وليس OR IGNORE - سياسة التعارض للأمر الخارجي تلغي سياسة المشغل)
+            """CREATE TRIGGER IF NOT EXISTS attendance_counters_insert
+               AFTER INSERT ON attendance WHEN new.status = 'حاضر' BEGIN
+                   INSERT INTO attendance_counters (student_id, group_id)
+                   SELECT new.student_id, new.group_id WHERE NOT EXISTS (
+                       SELECT 1 FROM attendance_counters
+                       WHERE student_id = new.student_id AND group_id = new.group_id);
+                   UPDATE attendance_counters SET present_since_payment = present_since_payment + 1
+                   WHERE student_id = new.student_id AND group_id = new.group_id
+                   AND new.attendance_date > COALESCE(last_payment_date, '');
+               END""",
+            """CREATE TRIGGER IF NOT EXISTS attendance_counters_delete
+               AFTER DELETE ON attendance WHEN old.status = 'حاضر' BEGIN
+                   UPDATE attendance_counters SET present_since_payment = present_since_payment - 1
+                   WHERE student_id = old.student_id AND group_id = old.group_id
+                   AND old.attendance_date > COALESCE(last_payment_date, '');
+               END""",
+            """CREATE TRIGGER IF NOT EXISTS attendance_counters_update
+               AFTER UPDATE OF student_id, group_id, attendance_date, status ON attendance BEGIN
+                   UPDATE attendance_counters SET present_since_payment = present_since_payment - 1
+                   WHERE old.status = 'حاضر' AND student_id = old.student_id AND group_id = old.group_id
+                   AND old.attendance_date > COALESCE(last_payment_date, '');
+                   INSERT INTO attendance_counters (student_id, group_id)
+                   SELECT new.student_id, new.group_id WHERE NOT EXISTS (
+                       SELECT 1 FROM attendance_counters
+                       WHERE student_id = new.student_id AND group_id = new.group_id);
+                   UPDATE attendance_counters SET present_since_payment = present_since_payment + 1
+                   WHERE new.status = 'حاضر' AND student_id = new.student_id AND group_id = new.group_id
+                   AND new.attendance_date > COALESCE(last_payment_date, '');
+               END""",
+            # الدفعات: إعادة حساب العداد للزوج (يصبح صفراً عادةً عند دفعة جديدة)
+            f"""CREATE TRIGGER IF NOT EXISTS payments_counters_insert AFTER INSERT ON payments BEGIN
+                   {ATTENDANCE_COUNTER_REFRESH.format(row='new')}
+               END""",
+            f"""CREATE TRIGGER IF NOT EXISTS payments_counters_delete AFTER DELETE ON payments BEGIN
+                   {ATTENDANCE_COUNTER_REFRESH.format(row='old')}
+               END""",
+            f"""CREATE TRIGGER IF NOT EXISTS payments_counters_update
+               AFTER UPDATE OF student_id, group_id, payment_date ON payments BEGIN
+                   {ATTENDANCE_COUNTER_REFRESH.format(row='old')}
+                   {ATTENDANCE_COUNTER_REFRESH.format(row='new')}
+               END""",
+            # حساب العدادات للبيانات الحالية - الإنجازات الحالية تعتبر مُبلّغة
+            "DELETE FROM attendance_counters",
+            """INSERT INTO attendance_counters (student_id, group_id, last_payment_date, present_since_payment)
+               SELECT p.student_id, p.group_id, p.last_payment_date,
+                      (SELECT COUNT(*) FROM attendance a
+                       WHERE a.student_id = p.student_id AND a.group_id = p.group_id AND a.status = 'حاضر'
+                       AND a.attendance_date > COALESCE(p.last_payment_date, ''))
+               FROM (SELECT u.student_id, u.group_id,
+                            (SELECT MAX(payment_date) FROM payments m
+                             WHERE m.student_id = u.student_id AND m.group_id = u.group_id) AS last_payment_date
+                     FROM (SELECT student_id, group_id FROM attendance
+                           UNION SELECT student_id, group_id FROM payments) u) p""",
+            "UPDATE attendance_counters SET last_milestone = present_since_payment",
+        ]),
+        (6, [
+            # تقرير الحضور حسب الشهر: تجميع مرتب بالفهرس بدون قراءة الجدول
+            "CREATE INDEX IF NOT EXISTS idx_attendance_date_status ON attendance(attendance_date, status)",
+        ]),
+    ]
     
-    def __init__(self, db_name="student_management.db"):
+    # أقل إصدار SQLite: ON CONFLICT ... DO UPDATE (تسجيل الحضور وعدادات الحضور)
+    MIN_SQLITE_VERSION = (3, 24, 0)
+    
+    # ترتيب نتائج البحث: الاسم أهم من التفاصيل (bm25 - الأقل أفضل)
+    SEARCH_RANK = "bm25(search_index, 0.0, 0.0, 10.0, 1.0)"
+
+    # عدد الأوامر المحضرة (prepared statements) المحفوظة على الاتصال - LRU داخل sqlite3
+    # يكفي لكل أوامر SQL المسجلة مع هامش للأوامر المبنية ديناميكياً
+    STATEMENT_CACHE_SIZE = 256
+
+    # حجم الصفحة الافتراضي لـ fetch_page / iter_pages
+    PAGE_SIZE = 500
+
+    def __init__(self, db_name="student_management.db", profile=None, pragmas=None,
+                 initialize=True, tracer=None, stats=None, versions=None):
         self.db_name = db_name
+        self.tracer = tracer or StartupTracer()
+        self.stats = stats or QueryStats()
+        self.versions = versions or TableVersions()
         self.conn = None
         self.cursor = None
-        self.connect()
-        self.create_tables()
+        self._transaction_depth = 0
+        self._written_tables = set()
+        self._search_pending = False
+        
+        # إعدادات الاتصال: الملف المختار + أي تعديلات إضافية
+        profile = profile or os.environ.get('STUDENT_MANAGER_DB_PROFILE', 'default')
+        if profile not in self.CONNECTION_PROFILES:
+            raise ValueError(f"Unknown connection profile: {profile}")
+        self.profile = profile
+        self.pragmas = dict(self.CONNECTION_PROFILES[profile])
+        self.pragmas.update(pragmas or {})
+        self.applied_pragmas = {}
+        
+        with self.tracer.span('connect'):
+            self.connect()
+        if initialize:
+            self.check_sqlite_support()
+            with self.tracer.span('create_tables'):
+                self.create_tables()
+            with self.tracer.span('migrate'):
+                self.migrate()
+                # طلبة أضافتهم برامج أخرى منذ آخر تشغيل
+                with self.transaction():
+                    self.sync_search_index()
     
     def connect(self):
         """الاتصال بقاعدة البيانات"""
-        self.conn = sqlite3.connect(self.db_name)
+        self.conn = sqlite3.connect(self.db_name, cached_statements=self.STATEMENT_CACHE_SIZE)
         self.cursor = self.conn.cursor()
+        self.apply_pragmas()
+    
+    def check_sqlite_support(self):
+        """التأكد من إمكانيات SQLite المطلوبة قبل الترحيل بدلاً من الفشل في منتصفه"""
+        if sqlite3.sqlite_version_info < self.MIN_SQLITE_VERSION:
+            raise DatabaseSupportError(
+                f"يتطلب البرنامج SQLite {'.'.join(map(str, self.MIN_SQLITE_VERSION))} أو أحدث "
+                f"(الإصدار الحالي {sqlite3.sqlite_version}). يرجى تثبيت إصدار أحدث من Python."
+            )
+        try:
+            # جدول مؤقت في الذاكرة - لا يلمس ملف قاعدة البيانات
+            self.cursor.execute("CREATE VIRTUAL TABLE temp.fts5_check USING fts5(text)")
+            self.cursor.execute("DROP TABLE temp.fts5_check")
+        except sqlite3.OperationalError:
+            raise DatabaseSupportError(
+                f"نسخة SQLite المثبتة ({sqlite3.sqlite_version}) لا تدعم FTS5 المطلوب للبحث. "
+                "يرجى تثبيت إصدار Python الرسمي."
+            ) from None
+    
+    def apply_pragmas(self):
+        """تطبيق إعدادات PRAGMA على الاتصال وتسجيل القيم الفعلية"""
+        self.applied_pragmas = {}
+        for name, value in self.pragmas.items():
+            if value is None:
+                continue
+            if not re.fullmatch(r'[a-z_]+', name) or not re.fullmatch(r'-?\w+', str(value)):
+                raise ValueError(f"Invalid pragma: {name}={value}")
+            self.cursor.execute(f"PRAGMA {name} = {value}")
+            self.applied_pragmas[name] = self.cursor.execute(f"PRAGMA {name}").fetchone()[0]
+        
+        logger.info("SQLite connection profile '%s' on %s: %s", self.profile, self.db_name,
+                    ", ".join(f"{name}={value}" for name, value in self.applied_pragmas.items()))
     
     def create_tables(self):
         """إنشاء الجداول الأساسية"""
@@ -150,22 +857,243 @@ class StudentManagementDB:
         """)
         
         self.conn.commit()
+
+    def get_schema_version(self):
+        """إصدار المخطط الحالي"""
+        return self.cursor.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self):
+        """ترقية قاعدة البيانات الحالية إلى أحدث إصدار للمخطط"""
+        current_version = self.get_schema_version()
+
+        for version, statements in self.SCHEMA_MIGRATIONS:
+            if version <= current_version:
+                continue
+
+            # كل ترحيل يُطبق كاملاً أو لا يُطبق إطلاقاً
+            changes_before = self.conn.total_changes
+            with self.transaction():
+                for statement in statements:
+                    self.cursor.execute(statement)
+                self.cursor.execute(f"PRAGMA user_version = {int(version)}")
+            current_version = version
+            logger.info("Applied schema migration %d (%d rows changed)",
+                        version, self.conn.total_changes - changes_before)
+
+    @contextmanager
+    def transaction(self):
+        """تجميع عدة أوامر كتابة في معاملة واحدة (commit واحد)
+
+        المعاملات المتداخلة تنضم للمعاملة الخارجية، وأي خطأ يلغي المعاملة كاملة.
+        """
+        if self._transaction_depth:
+            self._transaction_depth += 1
+            try:
+                yield self
+            finally:
+                self._transaction_depth -= 1
+            return
+
+        self._transaction_depth = 1
+        try:
+            if not self.conn.in_transaction:
+                self.conn.execute("BEGIN")
+            yield self
+            if self._search_pending:
+                # مرة واحدة لكل المعاملة بدلاً من كل أمر كتابة فيها
+                self.sync_search_index()
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        finally:
+            self._transaction_depth = 0
+            self._search_pending = False
+            # أرقام الجداول تزيد بعد الـ commit فقط، حتى لا يُحفظ تقرير من بيانات قديمة برقم جديد
+            self.versions.bump(*self._written_tables)
+            self._written_tables.clear()
+
+    def sync_search_index(self):
+        """فهرسة الطلبة المنتظرين في search_pending - يعيد عددهم
+
+        النص يُحسب هنا بـ search_text وليس في المشغلات، فالكتابة في students من أي
+        اتصال آخر تعمل، وما يضيفه يُفهرس مع أول كتابة أو تشغيل تالٍ للبرنامج.
+        """
+        pending = self.conn.execute(SQL['search.pending']).fetchall()
+        if not pending:
+            return 0
+        students = [(student_id, search_text(name), search_text(f"{student_id} {phone or ''} {email or ''}"))
+                    for student_id, name, phone, email, exists in pending if exists]
+        self.conn.executemany(SQL['search.delete_student'], [(student[0],) for student in students])
+        self.conn.executemany(SQL['search.insert_student'],
+                              [(student_id, student_id, name, details) for student_id, name, details in students])
+        self.conn.execute(SQL['search.clear_pending'])
+        return len(pending)
+    
+    def _index_written(self, query):
+        """فهرسة الطلبة الذين أضافهم/عدّلهم الأمر قبل الـ commit (داخل transaction() عند نهايتها)"""
+        if self.versions.written_table(query) != 'students':
+            return
+        if self._transaction_depth:
+            self._search_pending = True
+        else:
+            self.sync_search_index()
+    
+    def _mark_written(self, query):
+        """تسجيل تغيير الجدول الذي كتب فيه الأمر (يؤجل حتى نهاية المعاملة)"""
+        table = self.versions.written_table(query)
+        if table is None:
+            return
+        if self._transaction_depth:
+            self._written_tables.add(table)
+        else:
+            self.versions.bump(table)
+    
+    def _commit(self):
+        """حفظ التغييرات إلا داخل transaction()"""
+        if not self._transaction_depth:
+            self.conn.commit()
+
+    def _observed(self):
+        return self.stats.enabled or self.tracer.enabled
+    
+    def _observe(self, query, start, rows):
+        """تسجيل زمن أمر SQL في التتبع والإحصائيات"""
+        end = time.perf_counter()
+        label = query.name if isinstance(query, NamedQuery) else " ".join(query.split())[:80]
+        self.tracer.record(label, 'sql', start, end, query=query, rows=rows)
+        if self.stats.enabled:
+            self.stats.record(query, end - start, rows)
     
     def execute_query(self, query, params=()):
         """تنفيذ استعلام"""
+        if isinstance(query, NamedQuery):
+            query.check(params)
+        if not self._observed():
+            self.cursor.execute(query, params)
+            self._index_written(query)
+            self._commit()
+            self._mark_written(query)
+            return self.cursor.lastrowid
+        
+        start = time.perf_counter()
         self.cursor.execute(query, params)
-        self.conn.commit()
+        self._index_written(query)
+        self._commit()
+        self._mark_written(query)
+        self._observe(query, start, max(self.cursor.rowcount, 0))
         return self.cursor.lastrowid
+
+    def execute_many(self, query, params_seq):
+        """تنفيذ نفس الأمر لعدة صفوف دفعة واحدة - يعيد عدد الصفوف المتأثرة"""
+        if isinstance(query, NamedQuery) and isinstance(params_seq, (list, tuple)):
+            for params in params_seq:
+                query.check(params)
+        start = time.perf_counter()
+        self.cursor.executemany(query, params_seq)
+        self._index_written(query)
+        self._commit()
+        self._mark_written(query)
+        if self._observed():
+            self._observe(query, start, max(self.cursor.rowcount, 0))
+        return self.cursor.rowcount
     
     def fetch_all(self, query, params=()):
         """جلب جميع النتائج"""
+        if isinstance(query, NamedQuery):
+            query.check(params)
+        if not self._observed():
+            self.cursor.execute(query, params)
+            return self.cursor.fetchall()
+        
+        start = time.perf_counter()
         self.cursor.execute(query, params)
-        return self.cursor.fetchall()
+        rows = self.cursor.fetchall()
+        self._observe(query, start, len(rows))
+        return rows
     
     def fetch_one(self, query, params=()):
         """جلب نتيجة واحدة"""
+        if isinstance(query, NamedQuery):
+            query.check(params)
+        if not self._observed():
+            self.cursor.execute(query, params)
+            return self.cursor.fetchone()
+        
+        start = time.perf_counter()
         self.cursor.execute(query, params)
-        return self.cursor.fetchone()
+        row = self.cursor.fetchone()
+        self._observe(query, start, 0 if row is None else 1)
+        return row
+    
+    def fetch_page(self, query, sort_column, id_column, key_indexes, after=None, size=None,
+                   where="", params=(), descending=True):
+        """صفحة واحدة بترقيم keyset على (sort_column, id_column) - بدون OFFSET
+
+        query: SELECT بدون WHERE أو ORDER BY، و where شرط إضافي اختياري بمعاملاته params.
+        sort_column=None للترتيب بالمعرف فقط (أعمدة الترتيب يجب ألا تكون NULL).
+        key_indexes: موضع عمود الترتيب وعمود المعرف في الصف.
+        after: مفتاح آخر صف في الصفحة السابقة (None للصفحة الأولى).
+        يعيد (الصفوف، مفتاح الصفحة التالية أو None في آخر صفحة)
+        """
+        size = size or self.PAGE_SIZE
+        key_columns = (sort_column, id_column) if sort_column else (id_column,)
+        key_indexes = key_indexes[-len(key_columns):]
+        direction = "DESC" if descending else "ASC"
+        
+        conditions = [f"({where})"] if where else []
+        if after is not None:
+            conditions.append(f"({', '.join(key_columns)}) {'<' if descending else '>'} "
+                              f"({', '.join('?' * len(key_columns))})")
+            params = (*params, *after)
+        sql = (f"{query} {'WHERE ' + ' AND '.join(conditions) if conditions else ''} "
+               f"ORDER BY {', '.join(f'{column} {direction}' for column in key_columns)} LIMIT ?")
+        rows = self.fetch_all(sql, (*params, size))
+        
+        if len(rows) < size:
+            return rows, None
+        return rows, tuple(rows[-1][index] for index in key_indexes)
+    
+    def iter_pages(self, query, sort_column, id_column, key_indexes, size=None,
+                   where="", params=(), descending=True):
+        """كل صفحات fetch_page بالترتيب (generator) - الذاكرة = صفحة واحدة
+
+        كل صفحة استعلام قصير مستقل، فلا تبقى معاملة قراءة مفتوحة بين الصفحات.
+        """
+        after = None
+        while True:
+            rows, after = self.fetch_page(query, sort_column, id_column, key_indexes, after, size,
+                                          where, params, descending)
+            if rows:
+                yield rows
+            if after is None:
+                return
+    
+    def fetch_chunks(self, query, params=(), size=1000):
+        """جلب النتائج على دفعات (generator) - الذاكرة = دفعة واحدة مهما كان عدد الصفوف
+
+        يستخدم cursor خاصاً فلا تتأثر النتائج بأوامر أخرى أثناء المرور عليها.
+        """
+        if isinstance(query, NamedQuery):
+            query.check(params)
+        cursor = self.conn.cursor()
+        # زمن SQLite فقط، بدون زمن معالجة الدفعات عند المستهلك
+        sql_time, rows = 0.0, 0
+        try:
+            start = time.perf_counter()
+            cursor.execute(query, params)
+            while True:
+                chunk = cursor.fetchmany(size)
+                sql_time += time.perf_counter() - start
+                if not chunk:
+                    break
+                rows += len(chunk)
+                yield chunk
+                start = time.perf_counter()
+        finally:
+            cursor.close()
+            if self._observed():
+                self._observe(query, time.perf_counter() - sql_time, rows)
     
     def close(self):
         """إغلاق الاتصال"""
@@ -173,10 +1101,1402 @@ class StudentManagementDB:
             self.conn.close()
 
 
+# ========== الأوامر المسجلة ==========
+# الأوامر المتكررة في التطبيق - تُستخدم بالاسم: SQL['students.row']
+# allow_scan: الجداول التي يُقصد قراءتها كاملة (قوائم العرض)
+# benchmark_db.py plans يفحص خطة كل أمر هنا ويفشل عند أي قراءة كاملة غير متوقعة
+
+SQL = QueryRegistry()
+
+# الطلبة
+SQL.register('students.insert', "INSERT INTO students (name, phone, email, address) VALUES (?, ?, ?, ?)")
+SQL.register('students.update', "UPDATE students SET name=?, phone=?, email=?, address=? WHERE id=?")
+SQL.register('students.delete', "DELETE FROM students WHERE id=?")
+SQL.register('students.list', """
+    SELECT id, name, phone, email, address,
+           datetime(created_at, 'localtime') as created_at
+    FROM students
+    ORDER BY created_at DESC
+""", allow_scan=('students',))
+SQL.register('students.search', f"""
+    SELECT s.id, s.name, s.phone, s.email, s.address,
+           datetime(s.created_at, 'localtime') as created_at
+    FROM search_index f
+    JOIN students s ON s.id = f.ref_id
+    WHERE search_index MATCH ? AND f.kind = 'student'
+    ORDER BY {StudentManagementDB.SEARCH_RANK}
+""")
+SQL.register('students.search_digits', """
+    SELECT id, name, phone, email, address,
+           datetime(created_at, 'localtime') as created_at
+    FROM students
+    WHERE id IN (SELECT ref_id FROM search_index WHERE search_index MATCH ? AND kind = 'student')
+    OR phone LIKE ?
+    ORDER BY created_at DESC
+""", allow_scan=('students',))
+# فهرسة الطلبة المنتظرين - rowid = id * 4 + 1 كما في ترحيل الإصدار 4
+SQL.register('search.pending', """
+    SELECT p.student_id, s.name, s.phone, s.email, s.id IS NOT NULL
+    FROM search_pending p
+    LEFT JOIN students s ON s.id = p.student_id
+""", allow_scan=('p',))
+SQL.register('search.delete_student', "DELETE FROM search_index WHERE rowid = ? * 4 + 1")
+SQL.register('search.insert_student', """
+    INSERT INTO search_index (rowid, kind, ref_id, name, details)
+    VALUES (? * 4 + 1, 'student', ?, ?, ?)
+""")
+SQL.register('search.clear_pending', "DELETE FROM search_pending")
+SQL.register('students.row', """
+    SELECT id, name, phone, email, address,
+           datetime(created_at, 'localtime') as created_at
+    FROM students WHERE id=?
+""")
+# مفاتيح مقارنة الطلبة الموجودين عند الاستيراد
+SQL.register('students.keys', "SELECT id, name, phone FROM students", allow_scan=('students',))
+SQL.register('students.in_group', """
+    SELECT s.id, s.name
+    FROM students s
+    JOIN student_groups sg ON s.id = sg.student_id
+    WHERE sg.group_id = ?
+    ORDER BY s.name
+""")
+
+# المجموعات
+SQL.register('groups.insert', "INSERT INTO groups (name, subject, teacher, schedule, fee) VALUES (?, ?, ?, ?, ?)")
+SQL.register('groups.update', "UPDATE groups SET name=?, subject=?, teacher=?, schedule=?, fee=? WHERE id=?")
+SQL.register('groups.delete', "DELETE FROM groups WHERE id=?")
+SQL.register('groups.list', "SELECT id, name, subject, teacher, schedule, fee FROM groups ORDER BY id DESC",
+             allow_scan=('groups',))
+SQL.register('groups.row', "SELECT id, name, subject, teacher, schedule, fee FROM groups WHERE id=?")
+SQL.register('groups.by_teacher', """
+    SELECT g.id, g.name, g.subject, g.schedule, g.fee,
+           COUNT(sg.id) as student_count
+    FROM groups g
+    LEFT JOIN student_groups sg ON sg.group_id = g.id
+    WHERE g.teacher = ?
+    GROUP BY g.id
+    ORDER BY g.name
+""")
+
+# المعلمون
+SQL.register('teachers.insert', "INSERT INTO teachers (name, phone, email, specialization) VALUES (?, ?, ?, ?)")
+SQL.register('teachers.update', "UPDATE teachers SET name=?, phone=?, email=?, specialization=? WHERE id=?")
+SQL.register('teachers.delete', "DELETE FROM teachers WHERE id=?")
+# استعلام واحد يجمع عدد المجموعات والطلاب لكل المعلمين
+SQL.register('teachers.list', """
+    SELECT t.id, t.name, t.phone, t.email, t.specialization,
+           COUNT(DISTINCT sg.student_id) as student_count
+    FROM teachers t
+    LEFT JOIN groups g ON g.teacher = t.name
+    LEFT JOIN student_groups sg ON sg.group_id = g.id
+    GROUP BY t.id
+    ORDER BY t.name
+""", allow_scan=('t',))
+
+# قوائم الاختيار (EntityCache)
+SQL.register('entities.students', "SELECT id, name FROM students", allow_scan=('students',))
+SQL.register('entities.groups', "SELECT id, name FROM groups", allow_scan=('groups',))
+SQL.register('entities.teachers', "SELECT id, name FROM teachers ORDER BY name", allow_scan=('teachers',))
+
+# التسجيلات
+SQL.register('enrollments.insert', "INSERT INTO student_groups (student_id, group_id) VALUES (?, ?)")
+SQL.register('enrollments.insert_ignore',
+             "INSERT OR IGNORE INTO student_groups (student_id, group_id) VALUES (?, ?)")
+SQL.register('enrollments.delete', "DELETE FROM student_groups WHERE id=?")
+SQL.register('enrollments.list', """
+    SELECT sg.id, s.name, g.name, sg.joined_at
+    FROM student_groups sg
+    JOIN students s ON sg.student_id = s.id
+    JOIN groups g ON sg.group_id = g.id
+    ORDER BY sg.joined_at DESC
+""", allow_scan=('sg', 's', 'g'))
+SQL.register('enrollments.row', """
+    SELECT sg.id, s.name, g.name, sg.joined_at
+    FROM student_groups sg
+    JOIN students s ON sg.student_id = s.id
+    JOIN groups g ON sg.group_id = g.id
+    WHERE sg.id=?
+""")
+
+# الدفعات والحضور
+SQL.register('payments.insert',
+             "INSERT INTO payments (student_id, group_id, amount, payment_date, notes) VALUES (?, ?, ?, ?, ?)")
+SQL.register('payments.delete', "DELETE FROM payments WHERE id=?")
+# ON CONFLICT DO UPDATE بدلاً من REPLACE: مشغلات attendance_counters ترى التعديل كتحديث
+SQL.register('attendance.upsert', """
+    INSERT INTO attendance
+    (student_id, group_id, attendance_date, status, notes)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (student_id, group_id, attendance_date)
+    DO UPDATE SET status = excluded.status, notes = excluded.notes
+""")
+SQL.register('attendance.counter', """
+    SELECT present_since_payment, last_milestone FROM attendance_counters
+    WHERE student_id=? AND group_id=?
+""")
+SQL.register('attendance.claim_milestone', """
+    UPDATE attendance_counters SET last_milestone=?
+    WHERE student_id=? AND group_id=? AND last_milestone < ?
+""")
+SQL.register('attendance.delete', "DELETE FROM attendance WHERE id=?")
+# كشف الحضور: كل طلاب المجموعة مع حالتهم المسجلة في التاريخ (إن وجدت)
+SQL.register('attendance.roll_call', """
+    SELECT s.id, s.name, a.status, a.notes
+    FROM student_groups sg
+    JOIN students s ON s.id = sg.student_id
+    LEFT JOIN attendance a
+           ON a.student_id = sg.student_id AND a.group_id = sg.group_id AND a.attendance_date = ?
+    WHERE sg.group_id = ?
+    ORDER BY s.name
+""")
+# إنجازات جلسة كاملة دفعة واحدة: الحاضرون في (التاريخ، المجموعة) الذين بلغ عدادهم
+# مضاعفاً جديداً للعدد المطلوب. نفس الشرط في الأمرين - الإدراج أولاً ثم الحجز
+SQL.register('attendance.claim_session_milestones', """
+    UPDATE attendance_counters SET last_milestone = present_since_payment
+    WHERE student_id IN (SELECT student_id FROM attendance
+                         WHERE attendance_date = ? AND group_id = ? AND status = 'حاضر')
+    AND group_id = ?
+    AND present_since_payment > last_milestone AND present_since_payment % ? = 0
+""")
+# مجموعات الطالب مع آخر دفعة وعدد الحضور/الغياب بعدها - أمر واحد لكل المجموعات
+SQL.register('students.group_stats', """
+    SELECT g.id, g.name, g.subject, g.teacher, g.schedule, g.fee, p.last_payment_date,
+           COUNT(CASE WHEN a.status = 'حاضر' THEN 1 END) AS present,
+           COUNT(CASE WHEN a.status IN ('غائب', 'غياب بعذر') THEN 1 END) AS absent
+    FROM student_groups sg
+    JOIN groups g ON g.id = sg.group_id
+    LEFT JOIN (SELECT group_id, MAX(payment_date) AS last_payment_date
+               FROM payments WHERE student_id = ? GROUP BY group_id) p
+           ON p.group_id = sg.group_id
+    LEFT JOIN attendance a
+           ON a.student_id = sg.student_id AND a.group_id = sg.group_id
+          AND a.attendance_date > COALESCE(p.last_payment_date, '')
+    WHERE sg.student_id = ?
+    GROUP BY sg.group_id
+    ORDER BY g.name
+""")
+
+# تصدير السجلات: فترة (من، إلى) ومجموعة اختيارية (NULL = كل المجموعات)
+# ترتيب الفهرس على التاريخ (+ rowid) - بدون فرز مؤقت مهما كان عدد الصفوف
+SQL.register('export.payments', """
+    SELECT p.id, s.name, g.name, p.amount, p.payment_date, p.notes
+    FROM payments p
+    JOIN students s ON s.id = p.student_id
+    JOIN groups g ON g.id = p.group_id
+    WHERE p.payment_date BETWEEN ? AND ?
+    AND p.group_id IN (SELECT id FROM groups WHERE ? IS NULL OR id = ?)
+    ORDER BY p.payment_date, p.id
+""")
+SQL.register('export.payments_count', """
+    SELECT COUNT(*) FROM payments
+    WHERE payment_date BETWEEN ? AND ?
+    AND group_id IN (SELECT id FROM groups WHERE ? IS NULL OR id = ?)
+""")
+SQL.register('export.attendance', """
+    SELECT a.id, s.name, g.name, a.status, a.attendance_date, a.notes
+    FROM attendance a
+    JOIN students s ON s.id = a.student_id
+    JOIN groups g ON g.id = a.group_id
+    WHERE a.attendance_date BETWEEN ? AND ?
+    AND a.group_id IN (SELECT id FROM groups WHERE ? IS NULL OR id = ?)
+    ORDER BY a.attendance_date, a.id
+""")
+SQL.register('export.attendance_count', """
+    SELECT COUNT(*) FROM attendance
+    WHERE attendance_date BETWEEN ? AND ?
+    AND group_id IN (SELECT id FROM groups WHERE ? IS NULL OR id = ?)
+""")
+
+# التقارير - تجميع مرتب بالفهارس المغطية (بدون فرز مؤقت)
+# تقرير الطلبة: صفحات keyset بالمعرف (db.iter_pages) - بدون WHERE أو ORDER BY
+SQL.register('reports.students', """
+    SELECT s.id, s.name, s.phone,
+           (SELECT GROUP_CONCAT(g.name, ', ')
+            FROM student_groups sg JOIN groups g ON g.id = sg.group_id
+            WHERE sg.student_id = s.id) AS groups,
+           (SELECT COUNT(*) FROM student_groups sg WHERE sg.student_id = s.id) AS group_count
+    FROM students s
+""", allow_scan=('s',))
+SQL.register('reports.attendance_by_enrollment', """
+    SELECT student_id, group_id, status, COUNT(*)
+    FROM attendance
+    GROUP BY student_id, group_id, status
+""")
+SQL.register('reports.attendance_by_date', """
+    SELECT attendance_date, status, COUNT(*)
+    FROM attendance
+    GROUP BY attendance_date, status
+""")
+
+# الإشعارات والإعدادات
+SQL.register('settings.all', "SELECT setting_key, setting_value FROM notification_settings",
+             allow_scan=('notification_settings',))
+SQL.register('settings.set', "UPDATE notification_settings SET setting_value=? WHERE setting_key=?")
+SQL.register('notifications.list', """
+    SELECT n.id, n.is_read, n.priority, n.title, n.message, s.name,
+           datetime(n.created_at, 'localtime') as created_at
+    FROM notifications n
+    JOIN students s ON n.student_id = s.id
+    ORDER BY n.is_read ASC, n.created_at DESC
+""", allow_scan=('n',))
+SQL.register('notifications.details', """
+    SELECT n.*, s.name as student_name, g.name as group_name
+    FROM notifications n
+    JOIN students s ON n.student_id = s.id
+    LEFT JOIN groups g ON n.group_id = g.id
+    WHERE n.id=?
+""")
+SQL.register('notifications.unread_count', "SELECT COUNT(*) FROM notifications WHERE is_read=0")
+SQL.register('notifications.mark_read', "UPDATE notifications SET is_read=1 WHERE id=?")
+SQL.register('notifications.mark_all_read', "UPDATE notifications SET is_read=1", allow_scan=('notifications',))
+SQL.register('notifications.delete', "DELETE FROM notifications WHERE id=?")
+SQL.register('notifications.delete_payment', """
+    DELETE FROM notifications
+    WHERE student_id=? AND group_id=? AND type='payment'
+""")
+SQL.register('notifications.insert_milestone', """
+    INSERT INTO notifications
+    (student_id, group_id, type, title, message, priority)
+    SELECT s.id, g.id, 'attendance_milestone',
+           'إنجاز حضور - ' || g.name,
+           'تهانينا! الطالب ' || s.name || ' أكمل ' || ? || ' حصة في مجموعة ' || g.name,
+           'normal'
+    FROM students s, groups g
+    WHERE s.id=? AND g.id=?
+""")
+SQL.register('notifications.insert_session_milestones', """
+    INSERT INTO notifications
+    (student_id, group_id, type, title, message, priority)
+    SELECT c.student_id, c.group_id, 'attendance_milestone',
+           'إنجاز حضور - ' || g.name,
+           'تهانينا! الطالب ' || s.name || ' أكمل ' || c.present_since_payment || ' حصة في مجموعة ' || g.name,
+           'normal'
+    FROM attendance a
+    JOIN attendance_counters c ON c.student_id = a.student_id AND c.group_id = a.group_id
+    JOIN students s ON s.id = c.student_id
+    JOIN groups g ON g.id = c.group_id
+    WHERE a.attendance_date = ? AND a.group_id = ? AND a.status = 'حاضر'
+    AND c.present_since_payment > c.last_milestone AND c.present_since_payment % ? = 0
+""")
+# حذف الإشعارات القديمة التي لم تعد صالحة (الطالب دفع بالفعل)
+SQL.register('notifications.cleanup_paid', """
+    DELETE FROM notifications
+    WHERE type='payment' AND id IN (
+        SELECT n.id FROM notifications n
+        WHERE n.type='payment'
+        AND EXISTS (
+            SELECT 1 FROM payments p
+            WHERE p.student_id = n.student_id
+            AND p.group_id = n.group_id
+            AND p.payment_date >= ?
+        )
+    )
+""")
+# أمر واحد لكل التسجيلات - الفهرس idx_notifications_open_payment
+# يضمن عدم تكرار إشعار الدفع المفتوح
+SQL.register('notifications.generate_payment', """
+    INSERT INTO notifications
+    (student_id, group_id, type, title, message, priority)
+    SELECT s.id, g.id, 'payment',
+           'تذكير دفعة - ' || g.name,
+           'الطالب ' || s.name || ' لم يدفع رسوم ' || g.name
+               || ' (' || COALESCE(g.fee, 0) || ' ج.م) منذ أكثر من ' || ? || ' يوم',
+           'high'
+    FROM student_groups sg
+    JOIN students s ON sg.student_id = s.id
+    JOIN groups g ON sg.group_id = g.id
+    WHERE NOT EXISTS (
+        SELECT 1 FROM payments p
+        WHERE p.student_id = s.id
+        AND p.group_id = g.id
+        AND p.payment_date >= ?
+    )
+    AND NOT EXISTS (
+        SELECT 1 FROM notifications n
+        WHERE n.student_id = s.id
+        AND n.group_id = g.id
+        AND n.type = 'payment' AND n.is_read = 0
+    )
+""", allow_scan=('sg', 's', 'g'))
+
+
+class DatabaseWorker:
+    """خيط خلفي يملك اتصال SQLite خاص به لتنفيذ الاستعلامات بعيداً عن خيط Tk
+
+    الطلبات تُرسل عبر submit() وتُعاد كـ Future، ولا يلمس الخيط أي عنصر Tk.
+    """
+    
+    def __init__(self, db_name, profile=None, tracer=None, stats=None, versions=None):
+        self.db_name = db_name
+        self.profile = profile
+        self.tracer = tracer
+        self.stats = stats
+        self.versions = versions
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="db-worker", daemon=True)
+        self.thread.start()
+    
+    def _run(self):
+        """حلقة الخيط: تنفيذ الطلبات بالترتيب على اتصال الخيط"""
+        try:
+            # المخطط أنشئ مسبقاً من الاتصال الرئيسي
+            db = StudentManagementDB(self.db_name, profile=self.profile, initialize=False,
+                                     tracer=self.tracer, stats=self.stats, versions=self.versions)
+            open_error = None
+        except Exception as e:
+            logger.exception("Database worker failed to connect")
+            db, open_error = None, e
+        
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            func, args, future = request
+            if not future.set_running_or_notify_cancel():
+                continue
+            if open_error:
+                future.set_exception(open_error)
+                continue
+            try:
+                future.set_result(func(db, *args))
+            except BaseException as e:
+                future.set_exception(e)
+        
+        if db:
+            db.close()
+    
+    def submit(self, func, *args):
+        """تنفيذ func(db, *args) في خيط قاعدة البيانات"""
+        future = Future()
+        self.requests.put((func, args, future))
+        return future
+    
+    def stop(self):
+        """إيقاف الخيط بعد إنهاء الطلبات الحالية"""
+        self.requests.put(None)
+
+
+class TreeRowSync:
+    """مزامنة صفوف Treeview بالمعرف (iid = id الصف) بدلاً من حذف كل الصفوف وإعادة إدراجها
+
+    يتم إدراج/تحديث/حذف الصفوف المتغيرة فقط، فيبقى التحديد وموضع التمرير كما هما.
+    """
+    
+    def __init__(self, tree):
+        self.tree = tree
+        self.rows = {}  # iid -> (values, tag)
+    
+    def __len__(self):
+        return len(self.rows)
+    
+    @staticmethod
+    def stripe(index):
+        return 'evenrow' if index % 2 == 0 else 'oddrow'
+    
+    def sync(self, rows, start=0):
+        """مطابقة الجدول مع rows: عناصر (iid, values) أو (iid, values, tag)
+
+        الصفوف بدون tag تُلوّن بالتناوب حسب موضعها (start + index).
+        """
+        tree = self.tree
+        # الجدول هو المرجع - في حال حذف صفوف من خارج هذه الفئة
+        existing = tree.get_children()
+        if len(existing) != len(self.rows):
+            self.rows = {iid: self.rows[iid] for iid in existing if iid in self.rows}
+            for iid in existing:
+                if iid not in self.rows:
+                    tree.delete(iid)
+        
+        wanted = []
+        for idx, row in enumerate(rows):
+            iid = str(row[0])
+            values = tuple(row[1])
+            tag = row[2] if len(row) > 2 else self.stripe(start + idx)
+            wanted.append((iid, values, tag))
+        wanted_ids = {iid for iid, _, _ in wanted}
+        
+        for iid in [iid for iid in self.rows if iid not in wanted_ids]:
+            tree.delete(iid)
+            del self.rows[iid]
+        
+        for idx, (iid, values, tag) in enumerate(wanted):
+            current = self.rows.get(iid)
+            if current is None:
+                tree.insert("", idx, iid=iid, values=values, tags=(tag,))
+            elif current != (values, tag):
+                tree.item(iid, values=values, tags=(tag,))
+            self.rows[iid] = (values, tag)
+        
+        order = [iid for iid, _, _ in wanted]
+        if list(tree.get_children()) != order:
+            for idx, iid in enumerate(order):
+                tree.move(iid, "", idx)
+    
+    def upsert(self, iid, values, index=0, tag=None):
+        """إضافة أو تحديث صف واحد دون لمس بقية الصفوف"""
+        iid = str(iid)
+        values = tuple(values)
+        current = self.rows.get(iid)
+        if current is not None:
+            tag = tag or current[1]
+            self.tree.item(iid, values=values, tags=(tag,))
+        else:
+            if tag is None:
+                # عكس لون الصف المجاور حتى يبقى التناوب عند الإدراج في الأعلى
+                children = self.tree.get_children()
+                if not children:
+                    tag = 'evenrow'
+                else:
+                    neighbour = children[min(index, len(children) - 1)]
+                    neighbour_tag = self.rows.get(neighbour, (None, 'oddrow'))[1]
+                    tag = 'oddrow' if neighbour_tag == 'evenrow' else 'evenrow'
+            self.tree.insert("", index, iid=iid, values=values, tags=(tag,))
+        self.rows[iid] = (values, tag)
+    
+    def remove(self, iid):
+        """حذف صف واحد"""
+        iid = str(iid)
+        if self.rows.pop(iid, None) is not None:
+            self.tree.delete(iid)
+
+
+class VirtualTreeview:
+    """جدول افتراضي للسجلات الكبيرة: الصفوف الظاهرة فقط موجودة في Treeview
+
+    الصفحات تُجلب بترقيم keyset على (sort_column, id_column) تنازلياً، والقفز
+    لموضع بعيد في شريط التمرير يستخدم OFFSET مرة واحدة ثم يكمل بـ keyset.
+    query: استعلام SELECT بدون WHERE أو ORDER BY
+    key_indexes: موضع عمود الترتيب وعمود المعرف في الصف
+    row_values: تحويل الصف لقيم الأعمدة في الجدول
+    """
+    
+    PAGE_SIZE = 200
+    MAX_PAGES = 8
+    
+    def __init__(self, tree, scrollbar, db, query, count_query, sort_column, id_column,
+                 key_indexes, row_values):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.db = db
+        self.query = query
+        self.count_query = count_query
+        self.sort_column = sort_column
+        self.id_column = id_column
+        self.key_indexes = key_indexes
+        self.row_values = row_values
+        
+        self.total = 0
+        self.offset = 0
+        self.visible = max(1, int(tree['height']))
+        self.pages = OrderedDict()
+        self.anchors = {}
+        self.row_sync = TreeRowSync(tree)
+        
+        # شريط التمرير يعكس موضع النافذة في كل السجلات وليس محتوى Treeview
+        scrollbar.configure(command=self.yview)
+        tree.configure(yscrollcommand=lambda *args: None)
+        tree.bind('<Configure>', self._on_resize, add='+')
+        tree.bind('<MouseWheel>', self._on_mousewheel)
+        tree.bind('<Button-4>', lambda e: self.scroll(-3))
+        tree.bind('<Button-5>', lambda e: self.scroll(3))
+        tree.bind('<Up>', lambda e: self._on_arrow(-1))
+        tree.bind('<Down>', lambda e: self._on_arrow(1))
+        tree.bind('<Prior>', lambda e: self.scroll(-self.visible) or 'break')
+        tree.bind('<Next>', lambda e: self.scroll(self.visible) or 'break')
+    
+    def fetch_page(self, db, page_no, anchor=None):
+        """جلب صفحة: keyset بعد مفتاح آخر صف في الصفحة السابقة، أو OFFSET عند القفز"""
+        if page_no == 0 or anchor is not None:
+            return db.fetch_page(self.query, self.sort_column, self.id_column, self.key_indexes,
+                                 after=anchor, size=self.PAGE_SIZE)[0]
+        return db.fetch_all(
+            f"{self.query} ORDER BY {self.sort_column} DESC, {self.id_column} DESC LIMIT ? OFFSET ?",
+            (self.PAGE_SIZE, page_no * self.PAGE_SIZE)
+        )
+    
+    def fetch_snapshot(self, db, offset):
+        """عدد السجلات والصفحة التي تحتوي offset - آمن للتشغيل في خيط قاعدة البيانات"""
+        total = db.fetch_one(self.count_query)[0]
+        page_no = min(offset, max(0, total - 1)) // self.PAGE_SIZE
+        return total, page_no, self.fetch_page(db, page_no)
+    
+    def reset(self, snapshot):
+        """استبدال البيانات المخزنة بنتيجة fetch_snapshot مع الحفاظ على موضع التمرير"""
+        total, page_no, rows = snapshot
+        self.total = total
+        self.pages.clear()
+        self.anchors.clear()
+        self._store_page(page_no, rows)
+        self.render()
+    
+    def _store_page(self, page_no, rows):
+        self.pages[page_no] = rows
+        self.pages.move_to_end(page_no)
+        if rows:
+            self.anchors[page_no] = (rows[-1][self.key_indexes[0]], rows[-1][self.key_indexes[1]])
+        while len(self.pages) > self.MAX_PAGES:
+            self.pages.popitem(last=False)
+    
+    def _page(self, page_no):
+        rows = self.pages.get(page_no)
+        if rows is None:
+            # صفحة واحدة بفهرس - سريعة بما يكفي على الاتصال الرئيسي
+            rows = self.fetch_page(self.db, page_no, self.anchors.get(page_no - 1))
+            self._store_page(page_no, rows)
+        else:
+            self.pages.move_to_end(page_no)
+        return rows
+    
+    def rows_at(self, offset, count):
+        """الصفوف من offset إلى offset + count"""
+        rows = []
+        end = min(offset + count, self.total)
+        position = offset
+        while position < end:
+            page_no, start = divmod(position, self.PAGE_SIZE)
+            page = self._page(page_no)[start:start + end - position]
+            if not page:
+                break
+            rows.extend(page)
+            position += len(page)
+        return rows
+    
+    def render(self):
+        """عرض النافذة الحالية فقط"""
+        self.offset = max(0, min(self.offset, self.total - self.visible))
+        # التلوين حسب الموضع المطلق - الصف يحتفظ بلونه أثناء التمرير
+        self.row_sync.sync(
+            ((row[self.key_indexes[1]], self.row_values(row))
+             for row in self.rows_at(self.offset, self.visible)),
+            start=self.offset
+        )
+        
+        if self.total:
+            self.scrollbar.set(self.offset / self.total,
+                               min(1.0, (self.offset + self.visible) / self.total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+    
+    def scroll(self, rows):
+        """تحريك النافذة بعدد من الصفوف"""
+        offset = max(0, min(self.offset + rows, self.total - self.visible))
+        if offset != self.offset:
+            self.offset = offset
+            self.render()
+    
+    def yview(self, *args):
+        """أوامر شريط التمرير: moveto / scroll"""
+        if args[0] == 'moveto':
+            self.offset = int(float(args[1]) * self.total)
+            self.render()
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            self.scroll(step * self.visible if args[2] == 'pages' else step)
+    
+    def _on_mousewheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+        return 'break'
+    
+    def _on_arrow(self, direction):
+        """الأسهم عند حافة النافذة تحرك النافذة نفسها"""
+        children = self.tree.get_children()
+        if not children:
+            return None
+        edge = children[0] if direction < 0 else children[-1]
+        if self.tree.focus() != edge:
+            return None
+        self.scroll(direction)
+        children = self.tree.get_children()
+        if children:
+            edge = children[0] if direction < 0 else children[-1]
+            self.tree.focus(edge)
+            self.tree.selection_set(edge)
+        return 'break'
+    
+    def _on_resize(self, event):
+        rowheight = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+        # صف للعناوين
+        visible = max(1, event.height // rowheight - 1)
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
+
+class EntityCache:
+    """قوائم الطلبة والمجموعات والمعلمين المشتركة بين كل القوائم المنسدلة
+
+    كل قائمة tuple واحدة ("id - الاسم"، أو الاسم للمعلمين) تُحمّل مرة واحدة، وأي
+    إضافة/تعديل/حذف ينتج tuple جديدة ويزيد رقم الإصدار ويُبلّغ المستمعين.
+    فهرس البحث (LabelSearchIndex) واحد لكل قائمة ويتحدث في مكانه مع كل تغيير.
+    """
+    
+    QUERIES = {
+        'students': SQL['entities.students'],
+        'groups': SQL['entities.groups'],
+        'teachers': SQL['entities.teachers'],
+    }
+    
+    def __init__(self, db):
+        self.db = db
+        self.labels = {}
+        self.positions = {}
+        # فهرس البحث لكل قائمة + موضع كل سجل فيه (يختلف عن positions بعد الحذف)
+        self.indexes = {}
+        self.slots = {}
+        self.versions = {kind: 0 for kind in self.QUERIES}
+        self.listeners = []
+    
+    @staticmethod
+    def label(kind, entity_id, name):
+        return name if kind == 'teachers' else f"{entity_id} - {name}"
+    
+    def get(self, kind):
+        """القائمة الحالية (tuple) - استعلام واحد عند أول طلب أو بعد الإلغاء"""
+        if kind not in self.labels:
+            self.prime(kind, self.db.fetch_all(self.QUERIES[kind]), self.versions[kind])
+        return self.labels[kind]
+    
+    def prime(self, kind, rows, version):
+        """تعبئة القائمة بصفوف QUERIES[kind] (مثلاً من خيط قاعدة البيانات)
+
+        تُهمل الصفوف إن تغيرت القائمة بعد بدء جلبها (version مختلف).
+        """
+        if kind in self.labels or version != self.versions[kind]:
+            return
+        self.labels[kind] = tuple(self.label(kind, row[0], row[1]) for row in rows)
+        self.positions[kind] = {row[0]: position for position, row in enumerate(rows)}
+    
+    def version(self, kind):
+        return self.versions[kind]
+    
+    def index(self, kind):
+        """فهرس البحث للقائمة - يُبنى مرة واحدة ثم يتحدث مع update()"""
+        index = self.indexes.get(kind)
+        if index is None:
+            index = self.indexes[kind] = LabelSearchIndex(self.get(kind))
+            self.slots[kind] = dict(self.positions[kind])
+        return index
+    
+    def update(self, kind, entity_id, name=None):
+        """تطبيق تغيير سجل واحد على القائمة بدون استعلام (name=None للحذف)"""
+        old = self.labels.get(kind)
+        if old is None or kind == 'teachers':
+            # المعلمون مرتبون بالاسم - إعادة التحميل عند الطلب التالي
+            self.invalidate(kind)
+            return
+        
+        labels = list(old)
+        positions = self.positions[kind]
+        position = positions.get(entity_id)
+        index = self.indexes.get(kind)
+        slots = self.slots.get(kind)
+        if name is None:
+            if position is None:
+                return
+            del labels[position]
+            del positions[entity_id]
+            for other_id, other_position in positions.items():
+                if other_position > position:
+                    positions[other_id] = other_position - 1
+            if index is not None:
+                index.remove(slots.pop(entity_id))
+        elif position is None:
+            positions[entity_id] = len(labels)
+            labels.append(self.label(kind, entity_id, name))
+            if index is not None:
+                slots[entity_id] = index.add(labels[-1])
+        else:
+            labels[position] = self.label(kind, entity_id, name)
+            if index is not None:
+                index.replace(slots[entity_id], labels[position])
+        
+        self.labels[kind] = tuple(labels)
+        self._changed(kind, old)
+    
+    def invalidate(self, kind=None):
+        """إلغاء قائمة (أو كل القوائم) لإعادة تحميلها من قاعدة البيانات"""
+        for name in ([kind] if kind else list(self.QUERIES)):
+            old = self.labels.pop(name, None)
+            self.positions.pop(name, None)
+            self.indexes.pop(name, None)
+            self.slots.pop(name, None)
+            self._changed(name, old)
+    
+    def _changed(self, kind, old):
+        self.versions[kind] += 1
+        for listener in self.listeners:
+            listener(kind, old)
+
+
+class ReportCache:
+    """نتائج التقارير المحسوبة بمفتاح (نوع التقرير، المعاملات)
+
+    كل نتيجة تُحفظ مع أرقام جداولها من TableVersions وقت بدء الحساب، وتُعاد فقط
+    إذا لم يُكتب في أي من هذه الجداول منذ ذلك - فيُعاد حساب التقارير المتأثرة فقط.
+    """
+    
+    # الجداول التي يقرأ منها كل تقرير، مع الجداول الأب التي يحذف منها ON DELETE CASCADE
+    TABLES = {
+        'students': ('students', 'student_groups', 'groups'),
+        'groups': ('groups', 'student_groups', 'students'),
+        'payments': ('payments', 'groups', 'students'),
+        'attendance': ('attendance', 'students', 'groups'),
+    }
+    MAX_ENTRIES = 32
+    
+    def __init__(self, versions):
+        self.versions = versions
+        self.entries = OrderedDict()
+    
+    def snapshot(self, report):
+        """أرقام جداول التقرير الآن - تؤخذ قبل الحساب"""
+        return self.versions.snapshot(self.TABLES[report])
+    
+    def get(self, report, *params):
+        """النتيجة المحفوظة إذا لم تتغير جداول التقرير، وإلا None"""
+        key = (report, params)
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != self.snapshot(report):
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+    
+    def put(self, report, params, snapshot, data):
+        key = (report, tuple(params))
+        self.entries[key] = (snapshot, data)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.MAX_ENTRIES:
+            self.entries.popitem(last=False)
+    
+    def clear(self):
+        self.entries.clear()
+
+
+class NotificationSettings:
+    """إعدادات الإشعارات في الذاكرة - تُقرأ من الجدول مرة واحدة
+
+    كل الكتابة تمر عبر save() التي تلغي النسخة المحفوظة، فلا يحتاج مسار
+    تسجيل الحضور لأي استعلام إعدادات.
+    """
+    
+    # القيم الافتراضية عند غياب المفتاح أو عدم صلاحية قيمته
+    DEFAULTS = {
+        'payment_reminder_days': '7',
+        'show_notifications_on_startup': '1',
+        'payment_alert_enabled': '1',
+        'attendance_milestone_enabled': '1',
+        'attendance_milestone_count': '4',
+    }
+    
+    def __init__(self, db):
+        self.db = db
+        self.values = None
+    
+    def get(self, key):
+        """القيمة النصية كما في الجدول"""
+        if self.values is None:
+            self.values = dict(self.DEFAULTS)
+            self.values.update(self.db.fetch_all(SQL['settings.all']))
+        return self.values[key]
+    
+    def get_int(self, key):
+        try:
+            return int(self.get(key))
+        except ValueError:
+            return int(self.DEFAULTS[key])
+    
+    def get_bool(self, key):
+        return self.get(key) == '1'
+    
+    def save(self, values):
+        """حفظ {المفتاح: القيمة} - commit واحد لكل الإعدادات"""
+        self.db.execute_many(SQL['settings.set'],
+                             [(str(value), key) for key, value in values.items()])
+        self.invalidate()
+    
+    def invalidate(self):
+        self.values = None
+
+
+# ========== الاستيراد والتصدير ==========
+
+_XLSX_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_XLSX_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+
+def _csv_encoding(path):
+    """UTF-8 (مع أو بدون BOM)، أو cp1256 لملفات Excel العربية القديمة"""
+    with open(path, 'rb') as stream:
+        head = stream.read(65536)
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # حرف مقطوع في نهاية العينة لا يعني ترميزاً آخر
+        if e.start < len(head) - 3:
+            return 'cp1256'
+    return 'utf-8-sig'
+
+
+def iter_csv_rows(path):
+    """صفوف ملف CSV: (رقم السطر، القيم، نسبة التقدم) - قراءة متدفقة بذاكرة ثابتة"""
+    size = os.path.getsize(path) or 1
+    with open(path, 'rb') as raw:
+        text = io.TextIOWrapper(raw, encoding=_csv_encoding(path), newline='')
+        sample = text.read(8192)
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(text, dialect)
+        for values in reader:
+            yield reader.line_num, values, raw.tell() / size
+
+
+def _xlsx_first_sheet(book):
+    """مسار أول ورقة في المصنف حسب ترتيب workbook.xml"""
+    try:
+        workbook = ET.fromstring(book.read('xl/workbook.xml'))
+        rel_id = workbook.find(f'{_XLSX_NS}sheets/{_XLSX_NS}sheet').get(f'{_XLSX_REL_NS}id')
+        for rel in ET.fromstring(book.read('xl/_rels/workbook.xml.rels')):
+            if rel.get('Id') == rel_id:
+                target = rel.get('Target')
+                return target[1:] if target.startswith('/') else 'xl/' + target
+    except (KeyError, AttributeError):
+        pass
+    return 'xl/worksheets/sheet1.xml'
+
+
+def _xlsx_shared_strings(book):
+    """جدول النصوص المشتركة - النص فقط، والعناصر تُحذف أولاً بأول"""
+    if 'xl/sharedStrings.xml' not in book.namelist():
+        return []
+    strings = []
+    with book.open('xl/sharedStrings.xml') as stream:
+        root = None
+        for event, elem in ET.iterparse(stream, events=('start', 'end')):
+            if root is None:
+                root = elem
+            elif event == 'end' and elem.tag == f'{_XLSX_NS}si':
+                strings.append("".join(t.text or "" for t in elem.iter(f'{_XLSX_NS}t')))
+                root.clear()
+    return strings
+
+
+def _xlsx_column(ref):
+    """رقم العمود (من 0) من مرجع الخلية مثل AB12"""
+    index = 0
+    for char in ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+def _xlsx_cell_value(cell, shared):
+    kind = cell.get('t')
+    if kind == 'inlineStr':
+        return "".join(t.text or "" for t in cell.iter(f'{_XLSX_NS}t'))
+    value = cell.findtext(f'{_XLSX_NS}v') or ""
+    if kind == 's':
+        return shared[int(value)] if value else ""
+    if kind in (None, 'n') and value:
+        # الأرقام الصحيحة كما كُتبت (الهاتف 1012345678.0 -> 1012345678)
+        try:
+            number = float(value)
+        except ValueError:
+            return value
+        if number.is_integer():
+            return str(int(number))
+    return value
+
+
+def iter_xlsx_rows(path):
+    """صفوف أول ورقة في ملف XLSX: (رقم الصف، القيم، نسبة التقدم)
+
+    قراءة متدفقة بـ zipfile + iterparse بدون مكتبات خارجية - كل صف يُحذف من
+    الشجرة بعد قراءته، فالذاكرة = النصوص المشتركة + صف واحد.
+    """
+    with zipfile.ZipFile(path) as book:
+        shared = _xlsx_shared_strings(book)
+        sheet = _xlsx_first_sheet(book)
+        size = book.getinfo(sheet).file_size or 1
+        with book.open(sheet) as stream:
+            sheet_data = None
+            line = 0
+            for event, elem in ET.iterparse(stream, events=('start', 'end')):
+                if event == 'start':
+                    if elem.tag == f'{_XLSX_NS}sheetData':
+                        sheet_data = elem
+                elif elem.tag == f'{_XLSX_NS}row' and sheet_data is not None:
+                    values = []
+                    for cell in elem.iter(f'{_XLSX_NS}c'):
+                        ref = cell.get('r')
+                        if ref:
+                            values.extend([""] * (_xlsx_column(ref) - len(values)))
+                        values.append(_xlsx_cell_value(cell, shared))
+                    line = int(elem.get('r', line + 1))
+                    sheet_data.clear()
+                    # الموضع في XML الورقة بعد فك الضغط
+                    yield line, values, min(stream.tell() / size, 1.0)
+
+
+def iter_import_rows(path):
+    """صفوف ملف استيراد حسب امتداده"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        return iter_xlsx_rows(path)
+    if extension in ('.csv', '.txt'):
+        return iter_csv_rows(path)
+    raise ValueError(f"نوع ملف غير مدعوم: {extension or path} (CSV أو XLSX فقط)")
+
+
+class BulkImporter:
+    """استيراد الطلبة أو المجموعات أو التسجيلات من ملف CSV/XLSX
+
+    الصفوف تُقرأ بشكل متدفق، وتُتحقق وتُكتب على دفعات (معاملة لكل دفعة)، فالذاكرة
+    = دفعة واحدة + مفاتيح المقارنة للسجلات الموجودة مهما كان حجم الملف. الصفوف غير
+    الصالحة تُتخطى وتُسجل مع رقم السطر.
+
+    يعمل في خيط قاعدة البيانات: progress(rows, fraction) و cancelled() لا يلمسان Tk.
+    الطالب المكرر: نفس الهاتف بعد التوحيد، أو نفس الاسم إذا لم يكن في الصف هاتف.
+    """
+    
+    CHUNK_SIZE = 1000
+    # أقصى عدد أخطاء محفوظة للعرض (العدد الكلي يُحسب دائماً)
+    MAX_ERRORS = 100
+    
+    # أسماء الأعمدة المقبولة في صف العناوين لكل نوع
+    COLUMNS = {
+        'students': {
+            'name': ('name', 'الاسم', 'اسم الطالب', 'الطالب'),
+            'phone': ('phone', 'mobile', 'الهاتف', 'رقم الهاتف', 'الموبايل'),
+            'email': ('email', 'البريد', 'البريد الإلكتروني'),
+            'address': ('address', 'العنوان'),
+            'group': ('group', 'المجموعة'),
+        },
+        'groups': {
+            'name': ('name', 'group', 'الاسم', 'المجموعة', 'اسم المجموعة'),
+            'subject': ('subject', 'المادة'),
+            'teacher': ('teacher', 'المعلم', 'المدرس'),
+            'schedule': ('schedule', 'الجدول', 'المواعيد'),
+            'fee': ('fee', 'الرسوم'),
+        },
+        'enrollments': {
+            'student': ('student', 'name', 'الطالب', 'اسم الطالب', 'الاسم'),
+            'phone': ('phone', 'mobile', 'الهاتف', 'رقم الهاتف', 'الموبايل'),
+            'group': ('group', 'المجموعة', 'اسم المجموعة'),
+        },
+    }
+    REQUIRED = {
+        'students': ('name',),
+        'groups': ('name',),
+        'enrollments': ('group',),
+    }
+    
+    def __init__(self, db, kind, progress=None, cancelled=None):
+        if kind not in self.COLUMNS:
+            raise ValueError(f"Unknown import kind: {kind}")
+        self.db = db
+        self.kind = kind
+        self.progress = progress or (lambda rows, fraction: None)
+        self.cancelled = cancelled or (lambda: False)
+        self.columns = None
+        self.result = {'rows': 0, 'inserted': 0, 'duplicates': 0, 'enrolled': 0,
+                       'errors': 0, 'error_samples': [], 'cancelled': False}
+        # مفتاح -> id (None للاسم المشترك بين أكثر من سجل)
+        self.students_by_phone = {}
+        self.students_by_name = {}
+        self.groups_by_name = {}
+        self.group_ids = set()
+    
+    @staticmethod
+    def _add_key(keys, key, entity_id):
+        if key:
+            keys[key] = None if key in keys and keys[key] != entity_id else entity_id
+    
+    def load_keys(self):
+        """مفاتيح السجلات الموجودة - مرة واحدة قبل أول دفعة"""
+        if self.kind != 'groups':
+            for student_id, name, phone in self.db.fetch_all(SQL['students.keys']):
+                self._add_key(self.students_by_phone, normalize_phone(phone), student_id)
+                self._add_key(self.students_by_name, normalize_name(name), student_id)
+        for group_id, name in self.db.fetch_all(SQL['entities.groups']):
+            self.group_ids.add(group_id)
+            self._add_key(self.groups_by_name, normalize_name(name), group_id)
+    
+    def read_header(self, values):
+        """ربط الحقول بأرقام الأعمدة من صف العناوين"""
+        headers = [normalize_name(value) for value in values]
+        self.columns = {}
+        for field, aliases in self.COLUMNS[self.kind].items():
+            for alias in aliases:
+                if normalize_name(alias) in headers:
+                    self.columns[field] = headers.index(normalize_name(alias))
+                    break
+        missing = [field for field in self.REQUIRED[self.kind] if field not in self.columns]
+        if self.kind == 'enrollments' and not {'student', 'phone'} & set(self.columns):
+            missing.append('student/phone')
+        if missing:
+            raise ValueError(f"أعمدة مطلوبة غير موجودة في صف العناوين: {', '.join(missing)}")
+    
+    def error(self, line, message):
+        self.result['errors'] += 1
+        if len(self.result['error_samples']) < self.MAX_ERRORS:
+            self.result['error_samples'].append((line, message))
+    
+    def run(self, path):
+        """استيراد الملف كاملاً - يعيد ملخص النتيجة"""
+        rows = iter_import_rows(path)
+        chunk = []
+        fraction = 0.0
+        try:
+            self.load_keys()
+            for line, values, fraction in rows:
+                if not any(value.strip() for value in values):
+                    continue
+                if self.columns is None:
+                    self.read_header(values)
+                    continue
+                chunk.append((line, values))
+                if len(chunk) >= self.CHUNK_SIZE:
+                    self.write_chunk(chunk)
+                    chunk = []
+                    self.progress(self.result['rows'], fraction)
+                    if self.cancelled():
+                        self.result['cancelled'] = True
+                        break
+            else:
+                if self.columns is None:
+                    raise ValueError("الملف فارغ - لا يوجد صف عناوين")
+                self.write_chunk(chunk)
+        finally:
+            rows.close()
+        self.progress(self.result['rows'], 1.0 if not self.result['cancelled'] else fraction)
+        return self.result
+    
+    def write_chunk(self, chunk):
+        """التحقق من دفعة صفوف ثم كتابتها في معاملة واحدة"""
+        validate = getattr(self, f'validate_{self.kind}')
+        records = []
+        for line, values in chunk:
+            row = {field: values[index].strip() if index < len(values) else ""
+                   for field, index in self.columns.items()}
+            try:
+                records.append((line, validate(row)))
+            except ValueError as e:
+                self.error(line, str(e))
+        
+        self.result['rows'] += len(chunk)
+        if records:
+            with self.db.transaction():
+                getattr(self, f'write_{self.kind}')(records)
+    
+    def resolve_group(self, value):
+        """رقم المجموعة من الرقم أو "رقم - الاسم" أو الاسم"""
+        group_id = value.split(' - ', 1)[0].strip()
+        if group_id.isdigit() and int(group_id) in self.group_ids:
+            return int(group_id)
+        group_id = self.groups_by_name.get(normalize_name(value), 0)
+        if group_id is None:
+            raise ValueError(f"اسم المجموعة مكرر، استخدم رقمها: {value}")
+        if not group_id:
+            raise ValueError(f"مجموعة غير موجودة: {value}")
+        return group_id
+    
+    def validate_students(self, row):
+        if not row['name']:
+            raise ValueError("اسم الطالب مطلوب")
+        phone = row.get('phone', "")
+        if phone and not 8 <= len(normalize_phone(phone)) <= 15:
+            raise ValueError(f"رقم هاتف غير صالح: {phone}")
+        email = row.get('email', "")
+        if email and not re.fullmatch(r"[^@\s]+@[^@\s]+\.[^@\s]+", email):
+            raise ValueError(f"بريد إلكتروني غير صالح: {email}")
+        group_id = self.resolve_group(row['group']) if row.get('group') else None
+        return row['name'], phone, email, row.get('address', ""), group_id
+    
+    def write_students(self, records):
+        enrollments = []
+        for line, (name, phone, email, address, group_id) in records:
+            phone_key, name_key = normalize_phone(phone), normalize_name(name)
+            keys, key = ((self.students_by_phone, phone_key) if phone_key
+                         else (self.students_by_name, name_key))
+            if key in keys and keys[key] is None:
+                # لا يُعرف أي طالب هو - لا يُضاف ولا يُسجل في المجموعة
+                self.error(line, f"أكثر من طالب بنفس البيانات، أضف رقم الهاتف: {phone or name}")
+                continue
+            if key in keys:
+                self.result['duplicates'] += 1
+                student_id = keys[key]
+            else:
+                student_id = self.db.execute_query(SQL['students.insert'], (name, phone, email, address))
+                self.result['inserted'] += 1
+                self._add_key(self.students_by_phone, phone_key, student_id)
+                self._add_key(self.students_by_name, name_key, student_id)
+            if group_id and student_id:
+                enrollments.append((student_id, group_id))
+        if enrollments:
+            self.result['enrolled'] += self.db.execute_many(SQL['enrollments.insert_ignore'], enrollments)
+    
+    def validate_groups(self, row):
+        if not row['name']:
+            raise ValueError("اسم المجموعة مطلوب")
+        fee = row.get('fee', "").replace(',', '')
+        try:
+            fee = float(fee) if fee else 0.0
+        except ValueError:
+            raise ValueError(f"الرسوم يجب أن تكون رقماً: {row['fee']}")
+        if fee < 0:
+            raise ValueError(f"الرسوم لا يمكن أن تكون سالبة: {row['fee']}")
+        return row['name'], row.get('subject', ""), row.get('teacher', ""), row.get('schedule', ""), fee
+    
+    def write_groups(self, records):
+        for line, record in records:
+            name_key = normalize_name(record[0])
+            if name_key in self.groups_by_name:
+                self.result['duplicates'] += 1
+                continue
+            group_id = self.db.execute_query(SQL['groups.insert'], record)
+            self.result['inserted'] += 1
+            self.group_ids.add(group_id)
+            self._add_key(self.groups_by_name, name_key, group_id)
+    
+    def validate_enrollments(self, row):
+        group_id = self.resolve_group(row['group']) if row['group'] else None
+        if not group_id:
+            raise ValueError("المجموعة مطلوبة")
+        phone, name = row.get('phone', ""), row.get('student', "")
+        if phone:
+            student_id = self.students_by_phone.get(normalize_phone(phone), 0)
+        elif name:
+            student_id = self.students_by_name.get(normalize_name(name), 0)
+        else:
+            raise ValueError("الطالب مطلوب (الاسم أو الهاتف)")
+        if student_id is None:
+            raise ValueError(f"أكثر من طالب بنفس البيانات، استخدم الهاتف: {phone or name}")
+        if not student_id:
+            raise ValueError(f"طالب غير موجود: {phone or name}")
+        return student_id, group_id
+    
+    def write_enrollments(self, records):
+        enrolled = self.db.execute_many(SQL['enrollments.insert_ignore'], [record for line, record in records])
+        self.result['enrolled'] += enrolled
+        self.result['duplicates'] += len(records) - enrolled
+
+
+class CsvLedgerWriter:
+    """CSV بترميز UTF-8 مع BOM ليفتحه Excel بالعربية مباشرة"""
+    
+    def __init__(self, path, ledger):
+        self.stream = open(path, 'w', encoding='utf-8-sig', newline='')
+        self.writer = csv.writer(self.stream)
+        self.writer.writerow(ledger['headers'])
+    
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+    
+    def close(self):
+        self.stream.close()
+
+
+class JsonLinesLedgerWriter:
+    """JSON Lines: كائن واحد لكل سطر بأسماء الحقول الإنجليزية"""
+    
+    def __init__(self, path, ledger):
+        self.stream = open(path, 'w', encoding='utf-8')
+        self.fields = ledger['fields']
+        # json.dumps بمعاملات غير افتراضية ينشئ encoder جديداً لكل صف
+        self.encode = json.JSONEncoder(ensure_ascii=False).encode
+    
+    def write_rows(self, rows):
+        self.stream.writelines(self.encode(dict(zip(self.fields, row))) + "\n" for row in rows)
+    
+    def close(self):
+        self.stream.close()
+
+
+class XlsxLedgerWriter:
+    """XLSX بدون مكتبات خارجية: XML الورقة يُكتب مباشرة داخل ملف zip صفاً بصف
+
+    ورقة جديدة كل MAX_ROWS صف (حد Excel)، وقائمة الأوراق تُكتب عند الإغلاق.
+    """
+    
+    MAX_ROWS = 1048575
+    # محارف التحكم غير مسموحة في XML
+    _INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+    _PACKAGE_RELS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+    _DOCUMENT_RELS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    _CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml'
+    
+    def __init__(self, path, ledger):
+        self.book = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        self.header = self._row(ledger['headers'])
+        self.sheets = 0
+        self.sheet = None
+        self.rows = 0
+        self._new_sheet()
+    
+    def _cell(self, value):
+        if value is None:
+            return '<c/>'
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return f'<c><v>{value}</v></c>'
+        text = escape(self._INVALID_XML.sub('', str(value)))
+        return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+    
+    def _row(self, values):
+        return f'<row>{"".join(self._cell(value) for value in values)}</row>'
+    
+    def _new_sheet(self):
+        self._close_sheet()
+        self.sheets += 1
+        # force_zip64: الورقة قد تتجاوز 2GB قبل الضغط
+        self.sheet = io.TextIOWrapper(
+            self.book.open(f'xl/worksheets/sheet{self.sheets}.xml', 'w', force_zip64=True),
+            encoding='utf-8'
+        )
+        self.sheet.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                         f'<worksheet xmlns="{_XLSX_NS[1:-1]}"><sheetData>{self.header}')
+        self.rows = 0
+    
+    def _close_sheet(self):
+        if self.sheet:
+            self.sheet.write('</sheetData></worksheet>')
+            self.sheet.close()
+            self.sheet = None
+    
+    def write_rows(self, rows):
+        for row in rows:
+            if self.rows == self.MAX_ROWS:
+                self._new_sheet()
+            self.sheet.write(self._row(row))
+            self.rows += 1
+    
+    def close(self):
+        """إغلاق آخر ورقة وكتابة ملفات المصنف الثابتة"""
+        self._close_sheet()
+        sheets = range(1, self.sheets + 1)
+        xml = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        self.book.writestr('[Content_Types].xml', (
+            f'{xml}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            f'<Override PartName="/xl/workbook.xml" ContentType="{self._CONTENT_TYPE}.sheet.main+xml"/>'
+            + "".join(f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+                      f'ContentType="{self._CONTENT_TYPE}.worksheet+xml"/>' for n in sheets)
+            + '</Types>'
+        ))
+        self.book.writestr('_rels/.rels', (
+            f'{xml}<Relationships xmlns="{self._PACKAGE_RELS}">'
+            f'<Relationship Id="rId1" Type="{self._DOCUMENT_RELS}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ))
+        self.book.writestr('xl/workbook.xml', (
+            f'{xml}<workbook xmlns="{_XLSX_NS[1:-1]}" xmlns:r="{_XLSX_REL_NS[1:-1]}"><sheets>'
+            + "".join(f'<sheet name="Sheet{n}" sheetId="{n}" r:id="rId{n}"/>' for n in sheets)
+            + '</sheets></workbook>'
+        ))
+        self.book.writestr('xl/_rels/workbook.xml.rels', (
+            f'{xml}<Relationships xmlns="{self._PACKAGE_RELS}">'
+            + "".join(f'<Relationship Id="rId{n}" Type="{self._DOCUMENT_RELS}/worksheet" '
+                      f'Target="worksheets/sheet{n}.xml"/>' for n in sheets)
+            + '</Relationships>'
+        ))
+        self.book.close()
+
+
+class LedgerExporter:
+    """تصدير سجل الدفعات أو الحضور إلى CSV أو XLSX أو JSON Lines
+
+    الصفوف تُقرأ من cursor على دفعات (fetch_chunks) وتُكتب مباشرة للملف، فالذاكرة
+    ثابتة مهما كان عدد السجلات. يعمل في خيط قاعدة بيانات: progress(rows, fraction)
+    و cancelled() لا يلمسان Tk، والملف الناقص يُحذف عند الإيقاف أو الخطأ.
+    """
+    
+    CHUNK_SIZE = 5000
+    
+    LEDGERS = {
+        'payments': {
+            'query': SQL['export.payments'],
+            'count_query': SQL['export.payments_count'],
+            'fields': ('id', 'student', 'group', 'amount', 'payment_date', 'notes'),
+            'headers': ("رقم", "الطالب", "المجموعة", "المبلغ", "التاريخ", "ملاحظات"),
+        },
+        'attendance': {
+            'query': SQL['export.attendance'],
+            'count_query': SQL['export.attendance_count'],
+            'fields': ('id', 'student', 'group', 'status', 'attendance_date', 'notes'),
+            'headers': ("رقم", "الطالب", "المجموعة", "الحالة", "التاريخ", "ملاحظات"),
+        },
+    }
+    
+    WRITERS = {
+        'csv': CsvLedgerWriter,
+        'xlsx': XlsxLedgerWriter,
+        'jsonl': JsonLinesLedgerWriter,
+    }
+    
+    def __init__(self, db, ledger, fmt, progress=None, cancelled=None):
+        if ledger not in self.LEDGERS:
+            raise ValueError(f"Unknown ledger: {ledger}")
+        if fmt not in self.WRITERS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        self.db = db
+        self.ledger = self.LEDGERS[ledger]
+        self.writer_class = self.WRITERS[fmt]
+        self.progress = progress or (lambda rows, fraction: None)
+        self.cancelled = cancelled or (lambda: False)
+    
+    def run(self, path, date_from=None, date_to=None, group_id=None):
+        """تصدير السجلات بين تاريخين (شاملين) لمجموعة أو لكل المجموعات
+
+        يعيد عدد الصفوف، أو None إذا أُوقف التصدير قبل اكتماله.
+        """
+        params = (date_from or "", date_to or "9999-12-31", group_id, group_id)
+        total = self.db.fetch_one(self.ledger['count_query'], params)[0]
+        
+        rows = 0
+        completed = False
+        writer = self.writer_class(path, self.ledger)
+        try:
+            for chunk in self.db.fetch_chunks(self.ledger['query'], params, self.CHUNK_SIZE):
+                writer.write_rows(chunk)
+                rows += len(chunk)
+                self.progress(rows, rows / total if total else 1.0)
+                if self.cancelled():
+                    break
+            else:
+                completed = True
+        finally:
+            writer.close()
+            if not completed:
+                os.remove(path)
+        
+        if not completed:
+            return None
+        self.progress(rows, 1.0)
+        return rows
+
+
 class StudentManagementApp:
     """التطبيق الرئيسي - واجهة Tkinter"""
     
-    def __init__(self, root):
+    # الهدف: النافذة الرئيسية قابلة للاستخدام خلال هذا الوقت (مللي ثانية)
+    STARTUP_TARGET_MS = 1500
+    # الصفحات الأكثر زيارة بعد صفحة الطلبة - تُجلب قوائمها مسبقاً في الخلفية
+    PREFETCH_ENTITIES = ('students', 'groups', 'teachers')
+    # أقصى انتظار لتوقف استيراد/تصدير جارٍ عند إغلاق البرنامج (ثوانٍ)
+    JOB_STOP_TIMEOUT = 30
+    # أقصى عدد عناصر معروضة في القائمة المنسدلة
+    COMBO_MAX_RESULTS = 100
+    # تأخير البحث المباشر بعد آخر ضغطة مفتاح (مللي ثانية)
+    SEARCH_DEBOUNCE_MS = 250
+    STUDENT_SEARCH_PLACEHOLDER = "ابحث عن طالب بالاسم، الهاتف، أو البريد..."
+    
+    def __init__(self, root, tracer=None):
+        self.started_at = time.perf_counter()
+        self.tracer = tracer or StartupTracer()
         self.root = root
         self.root.title("🎓 برنامج إدارة الطلبة والمجموعات")
         self.root.geometry("1440x900")
@@ -234,13 +2554,144 @@ class StudentManagementApp:
         self.setup_rtl()
         
         # قاعدة البيانات
-        self.db = StudentManagementDB()
+        with self.tracer.span('StudentManagementDB()'):
+            self.db = StudentManagementDB(tracer=self.tracer, stats=QueryStats.from_environment())
+        
+        # خيط قاعدة البيانات للتحميل في الخلفية - نفس التتبع والإحصائيات وأرقام الجداول
+        self.db_worker = DatabaseWorker(self.db.db_name, profile=self.db.profile,
+                                        tracer=self.tracer, stats=self.db.stats,
+                                        versions=self.db.versions)
+        self._pending_futures = []
+        # الاستيراد/التصدير الجاري: (حدث الإيقاف، Future)
+        self._jobs = []
+        self._load_tokens = {}
+        self._load_futures = {}
+        self.row_syncs = {}
+        self.entities = EntityCache(self.db)
+        self.report_cache = ReportCache(self.db.versions)
+        self.entities.listeners.append(self.on_entities_changed)
+        self.entity_combos = {}
+        self.settings = NotificationSettings(self.db)
+        self._search_after_id = None
+        self._student_search_cache = None
+        self._loading_labels = {}
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # إعداد الواجهة
-        self.setup_ui()
+        with self.tracer.span('setup_ui'):
+            self.setup_ui()
         
         # تفعيل النسخ واللصق
         self.setup_copy_paste()
+        self.tracer.record('StudentManagementApp.__init__', 'phase',
+                           self.started_at, time.perf_counter())
+    
+    def on_close(self):
+        """إغلاق البرنامج وإيقاف خيط قاعدة البيانات"""
+        # إيقاف الاستيراد/التصدير الجاري عند نهاية الدفعة الحالية وانتظاره: خيوط قاعدة
+        # البيانات daemon وتتوقف فجأة عند الخروج، فيبقى ملف تصدير ناقص
+        jobs = [(cancel, future) for cancel, future in self._jobs if not future.done()]
+        for cancel, future in jobs:
+            cancel.set()
+        for cancel, future in jobs:
+            try:
+                future.result(timeout=self.JOB_STOP_TIMEOUT)
+            except Exception:
+                logger.warning("Background job did not stop cleanly before exit", exc_info=True)
+        self.db_worker.stop()
+        self.db.close()
+        self.root.destroy()
+    
+    def track_job(self, cancel, future):
+        """تسجيل استيراد/تصدير جارٍ ليوقفه on_close قبل الخروج"""
+        self._jobs = [job for job in self._jobs if not job[1].done()]
+        self._jobs.append((cancel, future))
+    
+    def run_db_async(self, func, callback, *args, on_error=None, worker=None):
+        """تنفيذ func(db, *args) في خيط قاعدة البيانات وتسليم النتيجة لـ callback عبر root.after
+
+        worker: خيط آخر بدلاً من db_worker (للمهام الطويلة التي لا يجب أن تؤخر تحميل الصفحات)
+        """
+        future = (worker or self.db_worker).submit(func, *args)
+        if not self._pending_futures:
+            self.root.after(15, self._poll_db_futures)
+        self._pending_futures.append((future, callback, on_error))
+        return future
+    
+    def _poll_db_futures(self):
+        """تسليم نتائج خيط قاعدة البيانات على خيط Tk"""
+        pending = []
+        for future, callback, on_error in self._pending_futures:
+            if not future.done():
+                pending.append((future, callback, on_error))
+            elif future.cancelled():
+                continue
+            elif future.exception():
+                logger.error("Background query failed", exc_info=future.exception())
+                if on_error:
+                    on_error()
+                messagebox.showerror("خطأ", f"فشل تحميل البيانات: {future.exception()}")
+            else:
+                callback(future.result())
+        
+        self._pending_futures = pending
+        if pending:
+            self.root.after(15, self._poll_db_futures)
+    
+    def set_loading(self, tree, loading):
+        """إظهار/إخفاء مؤشر التحميل فوق الجدول"""
+        label = self._loading_labels.get(tree)
+        if loading:
+            if label is None:
+                label = tk.Label(tree.master, text="⏳ جاري التحميل...",
+                                 bg=self.colors['card'], fg=self.colors['text_secondary'],
+                                 font=('Segoe UI', 14, 'bold'), padx=20, pady=10)
+                self._loading_labels[tree] = label
+            label.place(relx=0.5, rely=0.5, anchor='center')
+            label.lift()
+        elif label is not None:
+            label.place_forget()
+    
+    def tree_rows(self, tree):
+        """مزامنة صفوف الجدول بالمعرف (TreeRowSync واحد لكل جدول)"""
+        rows = self.row_syncs.get(tree)
+        if rows is None:
+            rows = self.row_syncs[tree] = TreeRowSync(tree)
+        return rows
+    
+    def load_async(self, key, tree, fetch, render, *args):
+        """تحميل بيانات جدول في الخلفية وعرضها عند الانتهاء
+
+        كل طلب جديد لنفس الجدول يُلغي نتيجة الطلب الأقدم.
+        """
+        self.cancel_load(key)
+        token = self._load_tokens[key]
+        self.set_loading(tree, True)
+        
+        def deliver(rows):
+            if self._load_tokens.get(key) != token:
+                return
+            self.set_loading(tree, False)
+            with self.tracer.span(f'render {key}', 'widgets', rows=len(rows)):
+                render(rows)
+        
+        def failed():
+            if self._load_tokens.get(key) == token:
+                self.set_loading(tree, False)
+        
+        future = self.run_db_async(fetch, deliver, *args, on_error=failed)
+        self._load_futures[key] = (future, tree)
+        return future
+    
+    def cancel_load(self, key):
+        """إلغاء تحميل جارٍ: لا يُنفذ إن لم يبدأ، وتُهمل نتيجته إن بدأ"""
+        self._load_tokens[key] = self._load_tokens.get(key, 0) + 1
+        pending = self._load_futures.pop(key, None)
+        if pending:
+            future, tree = pending
+            future.cancel()
+            if tree is not None:
+                self.set_loading(tree, False)
     
     def setup_rtl(self):
         """إعداد RTL (Right to Left) للغة العربية"""
@@ -585,6 +3036,40 @@ $Shortcut.Description = "Student Manager App"
         combo.bind('<KeyRelease>', self.on_combo_key_release)
         combo.bind('<FocusOut>', self.on_combo_focus_out)
         combo.all_values = []
+    
+    def set_combo_values(self, combo, values):
+        """تعيين عناصر القائمة المنسدلة (المعروض محدود بـ COMBO_MAX_RESULTS)"""
+        combo.all_values = values
+        combo['values'] = values[:self.COMBO_MAX_RESULTS]
+    
+    def bind_entity_combo(self, combo, kind):
+        """ربط قائمة منسدلة بقائمة مشتركة من EntityCache - تتحدث تلقائياً عند التغيير"""
+        combos = self.entity_combos.setdefault(kind, [])
+        if combo not in combos:
+            combos.append(combo)
+        combo.entity_kind = kind
+        self.set_combo_values(combo, self.entities.get(kind))
+    
+    def on_entities_changed(self, kind, old):
+        """تحديث القوائم التي تعرض القائمة الكاملة (وليس قائمة مصفاة مثل طلاب مجموعة)"""
+        for combo in self.entity_combos.get(kind, []):
+            if old is None or combo.all_values is old:
+                self.set_combo_values(combo, self.entities.get(kind))
+    
+    def combo_search_index(self, combo):
+        """فهرس البحث لعناصر القائمة
+
+        القوائم الكاملة تستخدم فهرس EntityCache المشترك (يتحدث مع كل تعديل)، والقوائم
+        المصفاة الصغيرة (مثل طلاب مجموعة) فهرساً خاصاً بالقائمة.
+        """
+        kind = getattr(combo, 'entity_kind', None)
+        if kind and combo.all_values is self.entities.labels.get(kind):
+            return self.entities.index(kind)
+        index = getattr(combo, 'search_index', None)
+        if index is None or getattr(combo, 'search_index_source', None) is not combo.all_values:
+            index = combo.search_index = LabelSearchIndex(combo.all_values)
+            combo.search_index_source = combo.all_values
+        return index
         
     def on_combo_focus_out(self, event):
         """استعادة القيم عند الخروج"""
@@ -592,7 +3077,7 @@ $Shortcut.Description = "Student Manager App"
         if hasattr(combo, 'all_values') and combo.all_values:
             current = combo.get()
             # Restore all values but keep current text
-            combo['values'] = combo.all_values
+            combo['values'] = combo.all_values[:self.COMBO_MAX_RESULTS]
             
     def on_combo_key_release(self, event):
         """تصفية القائمة عند الكتابة"""
@@ -605,13 +3090,9 @@ $Shortcut.Description = "Student Manager App"
             return
             
         if value == '':
-            combo['values'] = combo.all_values
+            combo['values'] = combo.all_values[:self.COMBO_MAX_RESULTS]
         else:
-            filtered_data = []
-            for item in combo.all_values:
-                if value in item.lower():
-                    filtered_data.append(item)
-            combo['values'] = filtered_data
+            combo['values'] = self.combo_search_index(combo).search(value, self.COMBO_MAX_RESULTS)
             
         # فتح القائمة تلقائياً إذا وجدت نتائج
         try:
@@ -668,11 +3149,15 @@ $Shortcut.Description = "Student Manager App"
                 btn.config(bg=self.colors['card'], fg=self.colors['text'], font=('Segoe UI', 15))
     
     def show_page(self, page_key):
-        """عرض صفحة محددة وإخفاء الباقي"""
+        """عرض صفحة محددة وإخفاء الباقي - الصفحة تُبنى وتُحمّل عند أول زيارة"""
         # Hide all pages
         for key, page in self.pages.items():
             page.pack_forget()
         
+        if page_key not in self.pages and page_key in self.page_builders:
+            with self.tracer.span(f'build page {page_key}', 'widgets'):
+                self.pages[page_key] = self.page_builders[page_key]()
+        
         # Show selected page
         if page_key in self.pages:
             self.pages[page_key].pack(fill=tk.BOTH, expand=True)
@@ -680,15 +3165,17 @@ $Shortcut.Description = "Student Manager App"
             self.highlight_nav_button(page_key)
     
     def create_all_pages(self):
-        """إنشاء جميع الصفحات"""
-        self.pages['students'] = self.create_students_page()
-        self.pages['groups'] = self.create_groups_page()
-        self.pages['teachers'] = self.create_teachers_page()
-        self.pages['enrollment'] = self.create_enrollment_page()
-        self.pages['payments'] = self.create_payments_page()
-        self.pages['attendance'] = self.create_attendance_page()
-        self.pages['notifications'] = self.create_notifications_page()
-        self.pages['reports'] = self.create_reports_page()
+        """تسجيل دوال إنشاء الصفحات - كل صفحة تُبنى في show_page عند أول زيارة"""
+        self.page_builders = {
+            'students': self.create_students_page,
+            'groups': self.create_groups_page,
+            'teachers': self.create_teachers_page,
+            'enrollment': self.create_enrollment_page,
+            'payments': self.create_payments_page,
+            'attendance': self.create_attendance_page,
+            'notifications': self.create_notifications_page,
+            'reports': self.create_reports_page,
+        }
     
     def show_students_page(self):
         self.show_page('students')
@@ -709,8 +3196,11 @@ $Shortcut.Description = "Student Manager App"
         self.show_page('attendance')
     
     def show_notifications_page(self):
+        # الصفحة الجديدة تُحمّل إشعاراتها عند البناء
+        built = 'notifications' in self.pages
         self.show_page('notifications')
-        self.load_notifications()
+        if built:
+            self.load_notifications()
     
     def show_reports_page(self):
         self.show_page('reports')
@@ -942,10 +3432,32 @@ $Shortcut.Description = "Student Manager App"
         
         # Show default page
         self.show_students_page()
+        self.root.after_idle(self.on_first_idle)
         
         # فحص الإشعارات عند التشغيل
         self.root.after(1000, self.check_notifications_on_startup)
     
+    def on_first_idle(self):
+        """قياس وقت الوصول لواجهة قابلة للاستخدام ثم الجلب المسبق في الخلفية"""
+        now = time.perf_counter()
+        self.tracer.record('time to interactive', 'phase', self.started_at, now)
+        elapsed = (now - self.started_at) * 1000
+        if elapsed > self.STARTUP_TARGET_MS:
+            logger.warning("Main window interactive after %.0f ms (target %d ms)",
+                           elapsed, self.STARTUP_TARGET_MS)
+        else:
+            logger.info("Main window interactive after %.0f ms", elapsed)
+        self.prefetch_entities()
+    
+    def prefetch_entities(self):
+        """جلب قوائم الطلبة/المجموعات/المعلمين في الخلفية لصفحات التسجيل والدفعات والحضور"""
+        for kind in self.PREFETCH_ENTITIES:
+            version = self.entities.version(kind)
+            self.run_db_async(
+                lambda db, kind=kind: db.fetch_all(EntityCache.QUERIES[kind]),
+                lambda rows, kind=kind, version=version: self.entities.prime(kind, rows, version)
+            )
+    
     def create_students_page(self):
         """صفحة إدارة الطلبة - Modern Desktop UI"""
         page = tk.Frame(self.content_area, bg=self.colors['bg'])
@@ -977,6 +3489,15 @@ $Shortcut.Description = "Student Manager App"
                                command=self.load_students)
         refresh_btn.pack(side=tk.LEFT, pady=15)
         
+        # زر الاستيراد من ملف
+        import_btn = tk.Button(header, text=f"{self.icons['import']} استيراد من ملف",
+                               bg=self.colors['success'], fg='white',
+                               font=('Segoe UI', 12, 'bold'),
+                               bd=0, padx=20, pady=8, cursor='hand2',
+                               activebackground=self.colors['primary'],
+                               command=self.show_import_dialog)
+        import_btn.pack(side=tk.LEFT, pady=15, padx=(10, 0))
+        
         # Container رئيسي
         main_container = tk.Frame(page, bg=self.colors['bg'])
         main_container.pack(fill=tk.BOTH, expand=True, padx=30, pady=20)
@@ -1040,17 +3561,17 @@ $Shortcut.Description = "Student Manager App"
                                insertbackground=self.colors['primary'],
                                justify='right')  # RTL
         search_entry.pack(fill=tk.X, padx=1, pady=1, ipady=8, ipadx=15)
-        search_entry.insert(0, "ابحث عن طالب بالاسم، الهاتف، أو البريد...")
+        search_entry.insert(0, self.STUDENT_SEARCH_PLACEHOLDER)
         
         def on_search_focus_in(e):
-            if search_entry.get() == "ابحث عن طالب بالاسم، الهاتف، أو البريد...":
+            if search_entry.get() == self.STUDENT_SEARCH_PLACEHOLDER:
                 search_entry.delete(0, tk.END)
                 search_entry.config(fg=self.colors['text'])
             entry_outer.config(bg=self.colors['primary'])
         
         def on_search_focus_out(e):
             if search_entry.get() == "":
-                search_entry.insert(0, "ابحث عن طالب بالاسم، الهاتف، أو البريد...")
+                search_entry.insert(0, self.STUDENT_SEARCH_PLACEHOLDER)
                 search_entry.config(fg=self.colors['text_light'])
             entry_outer.config(bg=self.colors['border'])
         
@@ -2266,9 +4787,24 @@ $Shortcut.Description = "Student Manager App"
         self.payments_tree.tag_configure('oddrow', background='#F3F4F6', foreground='#111827')
         self.payments_tree.tag_configure('evenrow', background='#FFFFFF', foreground='#111827')
         
-        vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=self.payments_tree.yview)
+        vsb = ttk.Scrollbar(tree_frame, orient="vertical")
         hsb = ttk.Scrollbar(tree_frame, orient="horizontal", command=self.payments_tree.xview)
-        self.payments_tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        self.payments_tree.configure(xscrollcommand=hsb.set)
+        
+        # عرض افتراضي - الصفوف الظاهرة فقط
+        self.payments_view = VirtualTreeview(
+            self.payments_tree, vsb, self.db,
+            query="""
+                SELECT p.id, s.name, g.name, p.amount, p.payment_date, p.notes
+                FROM payments p
+                JOIN students s ON p.student_id = s.id
+                JOIN groups g ON p.group_id = g.id
+            """,
+            count_query="SELECT COUNT(*) FROM payments",
+            sort_column="p.payment_date", id_column="p.id", key_indexes=(4, 0),
+            # الترتيب RTL: ملاحظات، التاريخ، المبلغ، المجموعة، الطالب، ID
+            row_values=lambda p: (p[5] or "", p[4], p[3], p[2], p[1], p[0])
+        )
         
         self.payments_tree.grid(row=0, column=0, sticky='nsew')
         vsb.grid(row=0, column=1, sticky='ns')
@@ -2379,6 +4915,8 @@ $Shortcut.Description = "Student Manager App"
                                   'info', self.icons['refresh']).pack(side=tk.LEFT, padx=5)
         self.create_modern_button(btn_frame, "حذف", self.delete_attendance, 
                                   'danger', self.icons['delete']).pack(side=tk.LEFT, padx=5)
+        self.create_modern_button(btn_frame, "كشف الحضور", self.show_roll_call, 
+                                  'primary', self.icons['groups']).pack(side=tk.LEFT, padx=5)
         self.create_modern_button(btn_frame, "تسجيل الحضور", self.add_attendance, 
                                   'success', self.icons['save']).pack(side=tk.LEFT, padx=5)
         
@@ -2421,9 +4959,24 @@ $Shortcut.Description = "Student Manager App"
         self.attendance_tree.tag_configure('oddrow', background='#F3F4F6', foreground='#111827')
         self.attendance_tree.tag_configure('evenrow', background='#FFFFFF', foreground='#111827')
         
-        vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=self.attendance_tree.yview)
+        vsb = ttk.Scrollbar(tree_frame, orient="vertical")
         hsb = ttk.Scrollbar(tree_frame, orient="horizontal", command=self.attendance_tree.xview)
-        self.attendance_tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        self.attendance_tree.configure(xscrollcommand=hsb.set)
+        
+        # عرض افتراضي - الصفوف الظاهرة فقط
+        self.attendance_view = VirtualTreeview(
+            self.attendance_tree, vsb, self.db,
+            query="""
+                SELECT a.id, s.name, g.name, a.status, a.attendance_date, a.notes
+                FROM attendance a
+                JOIN students s ON a.student_id = s.id
+                JOIN groups g ON a.group_id = g.id
+            """,
+            count_query="SELECT COUNT(*) FROM attendance",
+            sort_column="a.attendance_date", id_column="a.id", key_indexes=(4, 0),
+            # الترتيب RTL: ملاحظات، التاريخ، الحالة، المجموعة، الطالب، ID
+            row_values=lambda r: (r[5] or "", r[4], r[3], r[2], r[1], r[0])
+        )
         
         self.attendance_tree.grid(row=0, column=0, sticky='nsew')
         vsb.grid(row=0, column=1, sticky='ns')
@@ -2469,6 +5022,10 @@ $Shortcut.Description = "Student Manager App"
                                   'primary', self.icons['groups']).pack(side=tk.RIGHT, padx=5)
         self.create_modern_button(btn_frame, "تقرير الطلبة", self.show_students_report, 
                                   'primary', self.icons['student']).pack(side=tk.RIGHT, padx=5)
+        self.create_modern_button(btn_frame, "تشخيص SQL", self.show_sql_diagnostics_report, 
+                                  'secondary', self.icons['stats']).pack(side=tk.LEFT, padx=5)
+        self.create_modern_button(btn_frame, "تصدير السجلات", self.show_export_dialog, 
+                                  'warning', self.icons['export']).pack(side=tk.LEFT, padx=5)
         
         # عرض التقرير - Modern Card
         display_outer = tk.Frame(main_container, bg=self.colors['border'], bd=0)
@@ -2507,13 +5064,12 @@ $Shortcut.Description = "Student Manager App"
         address = self.student_address.get().strip()
         
         try:
-            self.db.execute_query(
-                "INSERT INTO students (name, phone, email, address) VALUES (?, ?, ?, ?)",
-                (name, phone, email, address)
+            student_id = self.db.execute_query(
+                SQL['students.insert'], (name, phone, email, address)
             )
             messagebox.showinfo("نجح", "تم إضافة الطالب بنجاح")
             self.clear_student_fields()
-            self.load_students()
+            self.refresh_student_row(student_id)
         except Exception as e:
             messagebox.showerror("خطأ", f"فشل إضافة الطالب: {str(e)}")
     
@@ -2538,12 +5094,11 @@ $Shortcut.Description = "Student Manager App"
         
         try:
             self.db.execute_query(
-                "UPDATE students SET name=?, phone=?, email=?, address=? WHERE id=?",
-                (name, phone, email, address, student_id)
+                SQL['students.update'], (name, phone, email, address, student_id)
             )
             messagebox.showinfo("نجح", "تم تحديث بيانات الطالب")
             self.clear_student_fields()
-            self.load_students()
+            self.refresh_student_row(student_id)
         except Exception as e:
             messagebox.showerror("خطأ", f"فشل التحديث: {str(e)}")
     
@@ -2559,55 +5114,104 @@ $Shortcut.Description = "Student Manager App"
         
         if messagebox.askyesno("تأكيد", "هل تريد حذف هذا الطالب؟"):
             try:
-                self.db.execute_query("DELETE FROM students WHERE id=?", (student_id,))
+                self.db.execute_query(SQL['students.delete'], (student_id,))
                 messagebox.showinfo("نجح", "تم حذف الطالب")
                 self.clear_student_fields()
-                self.load_students()
+                self.refresh_student_row(student_id)
             except Exception as e:
                 messagebox.showerror("خطأ", f"فشل الحذف: {str(e)}")
     
     def load_students(self, search_term=""):
-        """تحميل قائمة الطلبة"""
-        for item in self.students_tree.get_children():
-            self.students_tree.delete(item)
-        
-        if search_term and search_term != "ابحث عن طالب بالاسم، الهاتف، أو البريد...":
-            # بحث مع فلتر
-            query = """
-                SELECT id, name, phone, email, address, 
-                       datetime(created_at, 'localtime') as created_at 
-                FROM students 
-                WHERE name LIKE ? OR phone LIKE ? OR email LIKE ?
-                ORDER BY created_at DESC
-            """
-            search_pattern = f"%{search_term}%"
-            students = self.db.fetch_all(query, (search_pattern, search_pattern, search_pattern))
-        else:
-            # جلب جميع الطلبة
-            students = self.db.fetch_all("""
-                SELECT id, name, phone, email, address, 
-                       datetime(created_at, 'localtime') as created_at 
-                FROM students 
-                ORDER BY created_at DESC
-            """)
-        
-        # إضافة الطلبة للجدول مع تلوين الصفوف - RTL (عكس الترتيب)
-        for idx, student in enumerate(students):
-            tag = 'evenrow' if idx % 2 == 0 else 'oddrow'
-            # تنسيق التاريخ
-            created_at = student[5][:10] if len(student) > 5 and student[5] else ""
-            # الترتيب: المجموعات (أيقونة)، تاريخ التسجيل، العنوان، البريد، الهاتف، الاسم، ID
-            values = [self.icons['groups'], created_at, student[4], student[3], student[2], student[1], student[0]]
-            self.students_tree.insert("", tk.END, values=values, tags=(tag,))
+        """تحميل قائمة الطلبة في الخلفية"""
+        self.load_async('students', self.students_tree, self.fetch_students,
+                        lambda students: self.apply_student_search(search_term, students),
+                        search_term)
+    
+    @staticmethod
+    def fetch_students(db, search_term=""):
+        """جلب الطلبة (يعمل في خيط قاعدة البيانات)"""
+        query = fts_query(search_term)
+        digits = search_digits(search_term)
+        if digits:
+            # أرقام فقط: FTS يطابق بداية الكلمة، فآخر أرقام الهاتف تحتاج LIKE
+            return db.fetch_all(SQL['students.search_digits'], (query, f"%{digits}%"))
+        if query:
+            # بحث نصي مرتب بالصلة
+            return db.fetch_all(SQL['students.search'], (query,))
+        
+        # جلب جميع الطلبة
+        return db.fetch_all(SQL['students.list'])
+    
+    def student_values(self, student):
+        """قيم صف الطالب في الجدول - RTL (عكس الترتيب)"""
+        # تنسيق التاريخ
+        created_at = student[5][:10] if len(student) > 5 and student[5] else ""
+        # الترتيب: المجموعات (أيقونة)، تاريخ التسجيل، العنوان، البريد، الهاتف، الاسم، ID
+        return [self.icons['groups'], created_at, student[4], student[3], student[2], student[1], student[0]]
+    
+    def render_students(self, students):
+        """عرض الطلبة في الجدول"""
+        rows = self.tree_rows(self.students_tree)
+        rows.sync((student[0], self.student_values(student)) for student in students)
         
         # تحديث عداد الطلبة
         self.students_count_label.config(text=str(len(students)))
     
+    def refresh_student_row(self, student_id):
+        """تحديث صف طالب واحد بعد الإضافة/التعديل/الحذف دون إعادة تحميل الجدول"""
+        student = self.db.fetch_one(SQL['students.row'], (student_id,))
+        
+        self._student_search_cache = None
+        self.entities.update('students', student_id, student[1] if student else None)
+        rows = self.tree_rows(self.students_tree)
+        search_term = self.current_student_search()
+        if student and (not search_term or self.student_matches_search(search_term, student)):
+            # الأحدث في الأعلى
+            rows.upsert(student_id, self.student_values(student), index=0)
+        else:
+            # محذوف، أو لم يعد يطابق البحث الحالي
+            rows.remove(student_id)
+        self.students_count_label.config(text=str(len(rows)))
+    
+    def current_student_search(self):
+        """نص البحث المكتوب في صفحة الطلبة (فارغ إذا كان النص التوضيحي)"""
+        search_term = self.student_search_var.get().strip()
+        return "" if search_term == self.STUDENT_SEARCH_PLACEHOLDER else search_term
+    
+    @staticmethod
+    def student_matches_search(search_term, student):
+        """نفس منطق fetch_students في الذاكرة لصف طالب (id, name, phone, email, ...)"""
+        if matches_search(search_tokens(search_term), student[1], student[0], student[2], student[3]):
+            return True
+        digits = search_digits(search_term)
+        return bool(digits) and digits in (student[2] or "")
+    
     def search_students(self):
-        """البحث في قائمة الطلبة"""
-        search_term = self.student_search_var.get()
+        """البحث في قائمة الطلبة - ينتظر توقف الكتابة قبل التنفيذ"""
+        if self._search_after_id:
+            self.root.after_cancel(self._search_after_id)
+        self._search_after_id = self.root.after(self.SEARCH_DEBOUNCE_MS, self.run_student_search)
+    
+    def run_student_search(self):
+        """تنفيذ آخر بحث مكتوب"""
+        self._search_after_id = None
+        search_term = self.current_student_search()
+        
+        # إكمال نفس الكلمة: النتائج الجديدة جزء من السابقة - تصفية بدون قاعدة البيانات
+        cached = self._student_search_cache
+        if cached and search_term.startswith(cached[0]):
+            self.cancel_load('students')
+            students = [s for s in cached[1] if self.student_matches_search(search_term, s)]
+            self.apply_student_search(search_term, students)
+            return
+        
         self.load_students(search_term)
     
+    def apply_student_search(self, search_term, students):
+        """عرض نتيجة البحث وحفظها لإعادة استخدامها عند إكمال الكلمة"""
+        self._student_search_cache = (search_term, students) if search_term else None
+        self.render_students(students)
+    
     def view_student_details(self, event):
         """عرض تفاصيل الطالب في نافذة منبثقة"""
         selected = self.students_tree.selection()
@@ -2823,15 +5427,8 @@ $Shortcut.Description = "Student Manager App"
         content = tk.Frame(dialog, bg=self.colors['bg'])
         content.pack(fill=tk.BOTH, expand=True, padx=30, pady=20)
         
-        # جلب مجموعات الطالب
-        query = """
-            SELECT g.id, g.name, g.subject, g.teacher, g.schedule, g.fee
-            FROM groups g
-            INNER JOIN student_groups sg ON g.id = sg.group_id
-            WHERE sg.student_id = ?
-            ORDER BY g.name
-        """
-        groups = self.db.fetch_all(query, (student_id,))
+        # جلب مجموعات الطالب مع إحصائيات الحضور - استعلام واحد
+        groups = self.student_group_stats(student_id)
         
         if not groups:
             tk.Label(content, text="لا توجد مجموعات مسجلة لهذا الطالب",
@@ -2862,12 +5459,7 @@ $Shortcut.Description = "Student Manager App"
                 tree.heading(col, text=col)
             
             # إضافة البيانات
-            for idx, group in enumerate(groups):
-                group_id = group[0]
-                
-                # حساب إحصائيات الحضور
-                attendance_stats = self.get_student_attendance_in_group(student_id, group_id)
-                
+            for idx, (group, attendance_stats) in enumerate(groups):
                 tag = 'evenrow' if idx % 2 == 0 else 'oddrow'
                 values = [
                     f"{attendance_stats['percentage']:.1f}%",
@@ -2900,58 +5492,187 @@ $Shortcut.Description = "Student Manager App"
         self.create_modern_button(btn_frame, "إغلاق", dialog.destroy,
                                   'secondary', self.icons['close']).pack()
     
-    def get_student_attendance_in_group(self, student_id, group_id):
-        """حساب إحصائيات حضور الطالب في مجموعة معينة (بعد آخر دفعة)"""
-        # جلب تاريخ آخر دفعة للطالب في هذه المجموعة
-        last_payment = self.db.fetch_one("""
-            SELECT MAX(payment_date) 
-            FROM payments 
-            WHERE student_id=? AND group_id=?
-        """, (student_id, group_id))
-        
-        last_payment_date = last_payment[0] if last_payment and last_payment[0] else None
-        
-        # عدد أيام الحضور بعد آخر دفعة
-        if last_payment_date:
-            present_query = """
-                SELECT COUNT(*) FROM attendance
-                WHERE student_id = ? AND group_id = ? AND status = 'حاضر'
-                AND attendance_date > ?
-            """
-            present_count = self.db.fetch_one(present_query, (student_id, group_id, last_payment_date))[0]
-            
-            # عدد أيام الغياب بعد آخر دفعة
-            absent_query = """
-                SELECT COUNT(*) FROM attendance
-                WHERE student_id = ? AND group_id = ? AND status IN ('غائب', 'غياب بعذر')
-                AND attendance_date > ?
-            """
-            absent_count = self.db.fetch_one(absent_query, (student_id, group_id, last_payment_date))[0]
-        else:
-            # إذا لم يكن هناك دفعات، احسب كل الحضور
-            present_query = """
-                SELECT COUNT(*) FROM attendance
-                WHERE student_id = ? AND group_id = ? AND status = 'حاضر'
-            """
-            present_count = self.db.fetch_one(present_query, (student_id, group_id))[0]
-            
-            # عدد أيام الغياب
-            absent_query = """
-                SELECT COUNT(*) FROM attendance
-                WHERE student_id = ? AND group_id = ? AND status IN ('غائب', 'غياب بعذر')
-            """
-            absent_count = self.db.fetch_one(absent_query, (student_id, group_id))[0]
+    def student_group_stats(self, student_id):
+        """مجموعات الطالب مع إحصائيات الحضور بعد آخر دفعة (أو كل الحضور إذا لم يكن هناك دفعات)
+
+        يعيد [(صف المجموعة (id, name, subject, teacher, schedule, fee)، الإحصائيات)]
+        """
+        groups = []
+        for row in self.db.fetch_all(SQL['students.group_stats'], (student_id, student_id)):
+            present, absent = row[7], row[8]
+            total = present + absent
+            groups.append((row[:6], {
+                'last_payment_date': row[6],
+                'present': present,
+                'absent': absent,
+                'total': total,
+                'percentage': (present / total * 100) if total > 0 else 0,
+            }))
+        return groups
+    
+    # ========== الاستيراد ==========
+    
+    @staticmethod
+    def import_file(db, kind, path, progress, cancelled):
+        """استيراد ملف CSV/XLSX (يعمل في خيط قاعدة البيانات)"""
+        return BulkImporter(db, kind, progress, cancelled).run(path)
+    
+    def after_import(self):
+        """تحديث القوائم والجداول بعد الاستيراد - فهرس البحث وعدادات الحضور تحدثها المشغلات"""
+        self._student_search_cache = None
+        self.entities.invalidate()
+        if hasattr(self, 'students_tree'):
+            self.load_students()
+        if hasattr(self, 'groups_tree'):
+            self.load_groups()
+        if hasattr(self, 'enrollment_tree'):
+            self.load_enrollments()
+    
+    def show_import_dialog(self):
+        """استيراد الطلبة/المجموعات/التسجيلات من ملف CSV أو Excel في الخلفية"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("استيراد من ملف")
+        dialog.geometry("760x640")
+        dialog.configure(bg=self.colors['bg'])
+        dialog.transient(self.root)
+        dialog.grab_set()
         
-        # حساب النسبة المئوية
-        total = present_count + absent_count
-        percentage = (present_count / total * 100) if total > 0 else 0
+        # Header
+        header = tk.Frame(dialog, bg=self.colors['primary'], height=80)
+        header.pack(fill=tk.X)
+        header.pack_propagate(False)
         
-        return {
-            'present': present_count,
-            'absent': absent_count,
-            'total': total,
-            'percentage': percentage
-        }
+        tk.Label(header, text=f"{self.icons['import']} استيراد من ملف CSV / Excel",
+                bg=self.colors['primary'], fg='white',
+                font=('Segoe UI', 20, 'bold')).pack(pady=20)
+        
+        content = tk.Frame(dialog, bg=self.colors['bg'])
+        content.pack(fill=tk.BOTH, expand=True, padx=30, pady=20)
+        
+        # نوع البيانات
+        kind_var = tk.StringVar(value='students')
+        kind_frame = tk.Frame(content, bg=self.colors['bg'])
+        kind_frame.pack(fill=tk.X)
+        tk.Label(kind_frame, text="نوع البيانات:", bg=self.colors['bg'], fg=self.colors['text'],
+                font=('Segoe UI', 13, 'bold')).pack(side=tk.RIGHT)
+        
+        columns_label = tk.Label(content, bg=self.colors['bg'], fg=self.colors['text_secondary'],
+                                 font=('Segoe UI', 11), justify='right', anchor='e')
+        
+        def show_columns():
+            columns = BulkImporter.COLUMNS[kind_var.get()]
+            required = BulkImporter.REQUIRED[kind_var.get()]
+            columns_label.config(text="الأعمدة: " + "، ".join(
+                aliases[1] + (" *" if field in required else "") for field, aliases in columns.items()
+            ))
+        
+        for kind, text in (('students', "طلبة"), ('groups', "مجموعات"), ('enrollments', "تسجيلات")):
+            tk.Radiobutton(kind_frame, text=text, value=kind, variable=kind_var, command=show_columns,
+                           bg=self.colors['bg'], font=('Segoe UI', 12)).pack(side=tk.RIGHT, padx=10)
+        columns_label.pack(fill=tk.X, pady=(8, 15))
+        show_columns()
+        
+        # الملف
+        file_frame = tk.Frame(content, bg=self.colors['bg'])
+        file_frame.pack(fill=tk.X)
+        path_var = tk.StringVar()
+        
+        def browse():
+            path = filedialog.askopenfilename(parent=dialog, filetypes=[
+                ("CSV / Excel", "*.csv *.xlsx"), ("CSV", "*.csv"), ("Excel", "*.xlsx")
+            ])
+            if path:
+                path_var.set(path)
+        
+        tk.Entry(file_frame, textvariable=path_var, font=('Segoe UI', 12),
+                 justify='left').pack(side=tk.RIGHT, fill=tk.X, expand=True, ipady=6)
+        self.create_modern_button(file_frame, "اختيار ملف", browse,
+                                  'info', self.icons['search']).pack(side=tk.LEFT, padx=(0, 10))
+        
+        # التقدم والنتيجة
+        progress_bar = ttk.Progressbar(content, maximum=1.0, mode='determinate')
+        progress_bar.pack(fill=tk.X, pady=(20, 5))
+        status_label = tk.Label(content, text="", bg=self.colors['bg'], fg=self.colors['text'],
+                                font=('Segoe UI', 12), anchor='e')
+        status_label.pack(fill=tk.X)
+        
+        errors_text = scrolledtext.ScrolledText(content, height=10, font=('Segoe UI', 11), wrap=tk.WORD)
+        errors_text.pack(fill=tk.BOTH, expand=True, pady=(10, 0))
+        
+        btn_frame = tk.Frame(dialog, bg=self.colors['bg'])
+        btn_frame.pack(pady=(0, 20))
+        
+        # حالة الاستيراد الجاري: التقدم من خيط قاعدة البيانات عبر queue
+        progress = queue.Queue()
+        cancel = threading.Event()
+        running = []
+        
+        def poll_progress():
+            update = None
+            while not progress.empty():
+                update = progress.get_nowait()
+            if update:
+                rows, fraction = update
+                progress_bar['value'] = fraction
+                status_label.config(text=f"جاري الاستيراد... {rows:,} صف")
+            if running:
+                self.root.after(100, poll_progress)
+        
+        def finished(result=None):
+            running.clear()
+            # حتى عند الفشل: الأجزاء السابقة للخطأ محفوظة (معاملة لكل CHUNK_SIZE صف)
+            self.after_import()
+            if not dialog.winfo_exists():
+                return
+            start_btn.config(state=tk.NORMAL)
+            if result is None:
+                status_label.config(text="فشل الاستيراد - الأجزاء المستوردة قبل الخطأ محفوظة")
+                return
+            
+            progress_bar['value'] = 1.0 if not result['cancelled'] else progress_bar['value']
+            status_label.config(text=(
+                f"{'تم الإيقاف' if result['cancelled'] else 'اكتمل'}: {result['rows']:,} صف - "
+                f"جديد {result['inserted']:,}، مكرر {result['duplicates']:,}، "
+                f"تسجيل في مجموعات {result['enrolled']:,}، أخطاء {result['errors']:,}"
+            ))
+            errors_text.delete('1.0', tk.END)
+            for line, message in result['error_samples']:
+                errors_text.insert(tk.END, f"سطر {line}: {message}\n")
+            if result['errors'] > len(result['error_samples']):
+                errors_text.insert(tk.END, f"... و {result['errors'] - len(result['error_samples'])} خطأ آخر\n")
+        
+        def start():
+            path = path_var.get().strip()
+            if not path or not os.path.isfile(path):
+                messagebox.showerror("خطأ", "يرجى اختيار ملف CSV أو XLSX", parent=dialog)
+                return
+            
+            cancel.clear()
+            running.append(True)
+            start_btn.config(state=tk.DISABLED)
+            progress_bar['value'] = 0
+            status_label.config(text="جاري الاستيراد...")
+            errors_text.delete('1.0', tk.END)
+            future = self.run_db_async(self.import_file, finished, kind_var.get(), path,
+                                       lambda rows, fraction: progress.put((rows, fraction)), cancel.is_set,
+                                       on_error=finished)
+            self.track_job(cancel, future)
+            poll_progress()
+        
+        def close():
+            # الدفعات المكتوبة تبقى، والاستيراد يتوقف بعد الدفعة الحالية
+            cancel.set()
+            running.clear()
+            dialog.destroy()
+        
+        dialog.protocol("WM_DELETE_WINDOW", close)
+        self.create_modern_button(btn_frame, "إغلاق", close,
+                                  'secondary', self.icons['close']).pack(side=tk.LEFT, padx=5)
+        self.create_modern_button(btn_frame, "إيقاف", cancel.set,
+                                  'danger', self.icons['cancel']).pack(side=tk.LEFT, padx=5)
+        start_btn = self.create_modern_button(btn_frame, "بدء الاستيراد", start,
+                                              'success', self.icons['import'])
+        start_btn.pack(side=tk.LEFT, padx=5)
     
     def clear_student_fields(self):
         """مسح حقول الطالب"""
@@ -2980,13 +5701,12 @@ $Shortcut.Description = "Student Manager App"
             return
         
         try:
-            self.db.execute_query(
-                "INSERT INTO groups (name, subject, teacher, schedule, fee) VALUES (?, ?, ?, ?, ?)",
-                (name, subject, teacher, schedule, fee)
+            group_id = self.db.execute_query(
+                SQL['groups.insert'], (name, subject, teacher, schedule, fee)
             )
             messagebox.showinfo("نجح", "تم إضافة المجموعة بنجاح")
             self.clear_group_fields()
-            self.load_groups()
+            self.refresh_group_row(group_id)
         except Exception as e:
             messagebox.showerror("خطأ", f"فشل إضافة المجموعة: {str(e)}")
     
@@ -3017,12 +5737,11 @@ $Shortcut.Description = "Student Manager App"
         
         try:
             self.db.execute_query(
-                "UPDATE groups SET name=?, subject=?, teacher=?, schedule=?, fee=? WHERE id=?",
-                (name, subject, teacher, schedule, fee, group_id)
+                SQL['groups.update'], (name, subject, teacher, schedule, fee, group_id)
             )
             messagebox.showinfo("نجح", "تم تحديث بيانات المجموعة")
             self.clear_group_fields()
-            self.load_groups()
+            self.refresh_group_row(group_id)
         except Exception as e:
             messagebox.showerror("خطأ", f"فشل التحديث: {str(e)}")
     
@@ -3038,26 +5757,33 @@ $Shortcut.Description = "Student Manager App"
         
         if messagebox.askyesno("تأكيد", "هل تريد حذف هذه المجموعة؟"):
             try:
-                self.db.execute_query("DELETE FROM groups WHERE id=?", (group_id,))
+                self.db.execute_query(SQL['groups.delete'], (group_id,))
                 messagebox.showinfo("نجح", "تم حذف المجموعة")
                 self.clear_group_fields()
-                self.load_groups()
+                self.refresh_group_row(group_id)
             except Exception as e:
                 messagebox.showerror("خطأ", f"فشل الحذف: {str(e)}")
     
+    def group_values(self, group):
+        """قيم صف المجموعة في الجدول"""
+        # الترتيب RTL: عرض (أيقونة)، الرسوم، الجدول، المعلم، المادة، الاسم، ID
+        return [self.icons['info'], group[5], group[4], group[3], group[2], group[1], group[0]]
+    
     def load_groups(self):
         """تحميل قائمة المجموعات"""
-        for item in self.groups_tree.get_children():
-            self.groups_tree.delete(item)
-        
-        groups = self.db.fetch_all("SELECT id, name, subject, teacher, schedule, fee FROM groups ORDER BY id DESC")
-        
-        # إضافة المجموعات مع تلوين الصفوف - RTL
-        for idx, group in enumerate(groups):
-            tag = 'evenrow' if idx % 2 == 0 else 'oddrow'
-            # الترتيب RTL: عرض (أيقونة)، الرسوم، الجدول، المعلم، المادة، الاسم، ID
-            values = [self.icons['info'], group[5], group[4], group[3], group[2], group[1], group[0]]
-            self.groups_tree.insert("", tk.END, values=values, tags=(tag,))
+        groups = self.db.fetch_all(SQL['groups.list'])
+        self.tree_rows(self.groups_tree).sync((group[0], self.group_values(group)) for group in groups)
+    
+    def refresh_group_row(self, group_id):
+        """تحديث صف مجموعة واحدة دون إعادة تحميل الجدول"""
+        group = self.db.fetch_one(SQL['groups.row'], (group_id,))
+        self.entities.update('groups', group_id, group[1] if group else None)
+        rows = self.tree_rows(self.groups_tree)
+        if group:
+            # ORDER BY id DESC - الجديدة في الأعلى
+            rows.upsert(group_id, self.group_values(group), index=0)
+        else:
+            rows.remove(group_id)
     
     def select_group(self, event):
         """اختيار مجموعة من الجدول"""
@@ -3119,13 +5845,7 @@ $Shortcut.Description = "Student Manager App"
         content.pack(fill=tk.BOTH, expand=True, padx=30, pady=20)
         
         # جلب مجموعات المعلم
-        query = """
-            SELECT id, name, subject, schedule, fee
-            FROM groups
-            WHERE teacher = ?
-            ORDER BY name
-        """
-        groups = self.db.fetch_all(query, (teacher_name,))
+        groups = self.db.fetch_all(SQL['groups.by_teacher'], (teacher_name,))
         
         if not groups:
             tk.Label(content, text="لا توجد مجموعات لهذا المعلم",
@@ -3155,13 +5875,7 @@ $Shortcut.Description = "Student Manager App"
             
             # إضافة البيانات
             for idx, group in enumerate(groups):
-                group_id = group[0]
-                
-                # حساب عدد الطلاب في المجموعة
-                student_count_query = """
-                    SELECT COUNT(*) FROM student_groups WHERE group_id = ?
-                """
-                student_count = self.db.fetch_one(student_count_query, (group_id,))[0]
+                student_count = group[5]
                 
                 tag = 'evenrow' if idx % 2 == 0 else 'oddrow'
                 values = [
@@ -3195,10 +5909,7 @@ $Shortcut.Description = "Student Manager App"
     
     def refresh_group_teacher_combo(self):
         """تحديث قائمة المعلمين في dropdown المجموعات"""
-        teachers = self.db.fetch_all("SELECT name FROM teachers ORDER BY name")
-        teacher_names = [teacher[0] for teacher in teachers]
-        self.group_teacher['values'] = teacher_names
-        self.group_teacher.all_values = teacher_names
+        self.bind_entity_combo(self.group_teacher, 'teachers')
     
     def clear_group_fields(self):
         """مسح حقول المجموعة"""
@@ -3223,11 +5934,11 @@ $Shortcut.Description = "Student Manager App"
         
         try:
             self.db.execute_query(
-                "INSERT INTO teachers (name, phone, email, specialization) VALUES (?, ?, ?, ?)",
-                (name, phone, email, specialization)
+                SQL['teachers.insert'], (name, phone, email, specialization)
             )
             messagebox.showinfo("نجاح", "تم إضافة المعلم بنجاح!")
             self.clear_teacher_fields()
+            self.entities.invalidate('teachers')
             self.load_teachers()
         except Exception as e:
             messagebox.showerror("خطأ", f"فشل إضافة المعلم:\n{str(e)}")
@@ -3253,11 +5964,11 @@ $Shortcut.Description = "Student Manager App"
         
         try:
             self.db.execute_query(
-                "UPDATE teachers SET name=?, phone=?, email=?, specialization=? WHERE id=?",
-                (name, phone, email, specialization, teacher_id)
+                SQL['teachers.update'], (name, phone, email, specialization, teacher_id)
             )
             messagebox.showinfo("نجاح", "تم تحديث بيانات المعلم بنجاح!")
             self.clear_teacher_fields()
+            self.entities.invalidate('teachers')
             self.load_teachers()
         except Exception as e:
             messagebox.showerror("خطأ", f"فشل تحديث المعلم:\n{str(e)}")
@@ -3277,40 +5988,23 @@ $Shortcut.Description = "Student Manager App"
                                      f"هل أنت متأكد من حذف المعلم '{teacher_name}'؟")
         if confirm:
             try:
-                self.db.execute_query("DELETE FROM teachers WHERE id=?", (teacher_id,))
+                self.db.execute_query(SQL['teachers.delete'], (teacher_id,))
                 messagebox.showinfo("نجاح", "تم حذف المعلم بنجاح!")
                 self.clear_teacher_fields()
+                self.entities.invalidate('teachers')
                 self.load_teachers()
             except Exception as e:
                 messagebox.showerror("خطأ", f"فشل حذف المعلم:\n{str(e)}")
     
     def load_teachers(self):
         """تحميل قائمة المعلمين"""
-        for item in self.teachers_tree.get_children():
-            self.teachers_tree.delete(item)
-        
-        teachers = self.db.fetch_all(
-            "SELECT id, name, phone, email, specialization FROM teachers ORDER BY name"
-        )
-        
-        for idx, teacher in enumerate(teachers):
-            teacher_id = teacher[0]
-            teacher_name = teacher[1]
-            
-            # Count groups for this teacher
-            group_count = self.db.fetch_one(
-                "SELECT COUNT(*) FROM groups WHERE teacher = ?", (teacher_name,)
-            )[0]
-            
-            # Count total students across all groups
-            student_count = self.db.fetch_one("""
-                SELECT COUNT(DISTINCT sg.student_id)
-                FROM student_groups sg
-                INNER JOIN groups g ON sg.group_id = g.id
-                WHERE g.teacher = ?
-            """, (teacher_name,))[0]
-            
-            tag = 'evenrow' if idx % 2 == 0 else 'oddrow'
+        # استعلام واحد يجمع عدد الطلاب لكل المعلمين
+        teachers = self.db.fetch_all(SQL['teachers.list'])
+
+        rows = []
+        for teacher in teachers:
+            student_count = teacher[5]
+
             # Order: المجموعات، عدد الطلاب، التخصص، البريد، الهاتف، الاسم، ID
             values = [
                 self.icons['info'],  # Icon for groups
@@ -3321,10 +6015,8 @@ $Shortcut.Description = "Student Manager App"
                 teacher[1],  # name
                 teacher[0]   # id
             ]
-            self.teachers_tree.insert("", tk.END, values=values, tags=(tag,))
-        
-        # Refresh the teacher dropdown in groups page
-        self.refresh_group_teacher_combo()
+            rows.append((teacher[0], values))
+        self.tree_rows(self.teachers_tree).sync(rows)
     
     def select_teacher(self, event):
         """اختيار معلم من الجدول"""
@@ -3348,36 +6040,20 @@ $Shortcut.Description = "Student Manager App"
     
     def load_teacher_groups_display(self, teacher_name):
         """تحميل مجموعات المعلم في قسم العرض"""
-        # Clear existing data
-        for item in self.teacher_groups_tree.get_children():
-            self.teacher_groups_tree.delete(item)
-        
         # Update label
         self.selected_teacher_label.config(text=f"{self.icons['groups']} مجموعات المعلم: {teacher_name}")
         
         # Fetch teacher's groups
-        query = """
-            SELECT id, name, subject, schedule, fee
-            FROM groups
-            WHERE teacher = ?
-            ORDER BY name
-        """
-        groups = self.db.fetch_all(query, (teacher_name,))
+        groups = self.db.fetch_all(SQL['groups.by_teacher'], (teacher_name,))
         
+        rows = []
         if not groups:
             # Show message if no groups
-            self.teacher_groups_tree.insert("", tk.END, values=("", "", "", "لا توجد مجموعات", "", ""))
+            rows.append(('empty', ("", "", "", "لا توجد مجموعات", "", ""), ''))
         else:
-            for idx, group in enumerate(groups):
-                group_id = group[0]
+            for group in groups:
+                student_count = group[5]
                 
-                # Count students in this group
-                student_count_query = """
-                    SELECT COUNT(*) FROM student_groups WHERE group_id = ?
-                """
-                student_count = self.db.fetch_one(student_count_query, (group_id,))[0]
-                
-                tag = 'evenrow' if idx % 2 == 0 else 'oddrow'
                 values = [
                     student_count,  # عدد الطلاب
                     group[4],  # الرسوم
@@ -3386,7 +6062,8 @@ $Shortcut.Description = "Student Manager App"
                     group[1],  # اسم المجموعة
                     group[0]   # ID
                 ]
-                self.teacher_groups_tree.insert("", tk.END, values=values, tags=(tag,))
+                rows.append((group[0], values))
+        self.tree_rows(self.teacher_groups_tree).sync(rows)
     
     def on_teacher_tree_click(self, event):
         """معالجة النقر على جدول المعلمين"""
@@ -3415,17 +6092,8 @@ $Shortcut.Description = "Student Manager App"
     
     def refresh_enrollment_combos(self):
         """تحديث قوائم الطلبة والمجموعات للتسجيل"""
-        # الطلبة
-        students = self.db.fetch_all("SELECT id, name FROM students")
-        student_list = [f"{s[0]} - {s[1]}" for s in students]
-        self.enroll_student_combo["values"] = student_list
-        self.enroll_student_combo.all_values = student_list
-        
-        # المجموعات
-        groups = self.db.fetch_all("SELECT id, name FROM groups")
-        group_list = [f"{g[0]} - {g[1]}" for g in groups]
-        self.enroll_group_combo["values"] = group_list
-        self.enroll_group_combo.all_values = group_list
+        self.bind_entity_combo(self.enroll_student_combo, 'students')
+        self.bind_entity_combo(self.enroll_group_combo, 'groups')
     
     def enroll_student(self):
         """تسجيل طالب في مجموعة"""
@@ -3444,12 +6112,9 @@ $Shortcut.Description = "Student Manager App"
             return
         
         try:
-            self.db.execute_query(
-                "INSERT INTO student_groups (student_id, group_id) VALUES (?, ?)",
-                (student_id, group_id)
-            )
+            enrollment_id = self.db.execute_query(SQL['enrollments.insert'], (student_id, group_id))
             messagebox.showinfo("نجح", "تم تسجيل الطالب في المجموعة")
-            self.load_enrollments()
+            self.refresh_enrollment_row(enrollment_id)
         except sqlite3.IntegrityError:
             messagebox.showerror("خطأ", "الطالب مسجل مسبقاً في هذه المجموعة")
         except Exception as e:
@@ -3467,46 +6132,43 @@ $Shortcut.Description = "Student Manager App"
         
         if messagebox.askyesno("تأكيد", "هل تريد إلغاء هذا التسجيل؟"):
             try:
-                self.db.execute_query("DELETE FROM student_groups WHERE id=?", (enrollment_id,))
+                self.db.execute_query(SQL['enrollments.delete'], (enrollment_id,))
                 messagebox.showinfo("نجح", "تم إلغاء التسجيل")
-                self.load_enrollments()
+                self.refresh_enrollment_row(enrollment_id)
             except Exception as e:
                 messagebox.showerror("خطأ", f"فشل الإلغاء: {str(e)}")
     
+    @staticmethod
+    def enrollment_values(enrollment):
+        """قيم صف التسجيل في الجدول"""
+        # الترتيب RTL: تاريخ التسجيل، المجموعة، الطالب، ID
+        return [enrollment[3][:10] if enrollment[3] else "", enrollment[2], enrollment[1], enrollment[0]]
+    
     def load_enrollments(self):
         """تحميل قائمة التسجيلات"""
-        for item in self.enrollment_tree.get_children():
-            self.enrollment_tree.delete(item)
-        
-        query = """
-            SELECT sg.id, s.name, g.name, sg.joined_at
-            FROM student_groups sg
-            JOIN students s ON sg.student_id = s.id
-            JOIN groups g ON sg.group_id = g.id
-            ORDER BY sg.joined_at DESC
-        """
-        enrollments = self.db.fetch_all(query)
-        for idx, enrollment in enumerate(enrollments):
-            tag = 'evenrow' if idx % 2 == 0 else 'oddrow'
-            # الترتيب RTL: تاريخ التسجيل، المجموعة، الطالب، ID
-            values = [enrollment[3][:10] if enrollment[3] else "", enrollment[2], enrollment[1], enrollment[0]]
-            self.enrollment_tree.insert("", tk.END, values=values, tags=(tag,))
+        enrollments = self.db.fetch_all(SQL['enrollments.list'])
+        self.tree_rows(self.enrollment_tree).sync(
+            (enrollment[0], self.enrollment_values(enrollment)) for enrollment in enrollments
+        )
+    
+    def refresh_enrollment_row(self, enrollment_id):
+        """تحديث صف تسجيل واحد دون إعادة تحميل الجدول"""
+        enrollment = self.db.fetch_one(SQL['enrollments.row'], (enrollment_id,))
+        rows = self.tree_rows(self.enrollment_tree)
+        if enrollment:
+            rows.upsert(enrollment_id, self.enrollment_values(enrollment), index=0)
+        else:
+            rows.remove(enrollment_id)
     
     # ========== وظائف الدفعات ==========
     
     def refresh_payment_combos(self):
         """تحديث قوائم الطلبة والمجموعات للدفعات"""
         # المجموعات أولاً
-        groups = self.db.fetch_all("SELECT id, name FROM groups")
-        group_list = [f"{g[0]} - {g[1]}" for g in groups]
-        self.payment_group_combo["values"] = group_list
-        self.payment_group_combo.all_values = group_list
+        self.bind_entity_combo(self.payment_group_combo, 'groups')
         
         # الطلبة - جميع الطلاب مبدئياً
-        students = self.db.fetch_all("SELECT id, name FROM students")
-        student_list = [f"{s[0]} - {s[1]}" for s in students]
-        self.payment_student_combo["values"] = student_list
-        self.payment_student_combo.all_values = student_list
+        self.bind_entity_combo(self.payment_student_combo, 'students')
     
     def on_payment_group_change(self, event=None):
         """تحديث قائمة الطلاب عند تغيير المجموعة لإظهار طلاب المجموعة فقط"""
@@ -3515,20 +6177,12 @@ $Shortcut.Description = "Student Manager App"
         
         if group_id:
             # جلب طلاب المجموعة المحددة فقط
-            students = self.db.fetch_all("""
-                SELECT s.id, s.name 
-                FROM students s
-                JOIN student_groups sg ON s.id = sg.student_id
-                WHERE sg.group_id = ?
-                ORDER BY s.name
-            """, (group_id,))
+            students = self.db.fetch_all(SQL['students.in_group'], (group_id,))
+            student_list = [f"{s[0]} - {s[1]}" for s in students]
+            self.set_combo_values(self.payment_student_combo, student_list)
         else:
             # إذا لم يتم اختيار مجموعة، أظهر جميع الطلاب
-            students = self.db.fetch_all("SELECT id, name FROM students ORDER BY name")
-        
-        student_list = [f"{s[0]} - {s[1]}" for s in students]
-        self.payment_student_combo["values"] = student_list
-        self.payment_student_combo.all_values = student_list
+            self.bind_entity_combo(self.payment_student_combo, 'students')
         
         # مسح الاختيار الحالي للطالب
         self.payment_student_combo.set('')
@@ -3559,16 +6213,13 @@ $Shortcut.Description = "Student Manager App"
         notes = self.payment_notes.get().strip()
         
         try:
-            self.db.execute_query(
-                "INSERT INTO payments (student_id, group_id, amount, payment_date, notes) VALUES (?, ?, ?, ?, ?)",
-                (student_id, group_id, amount, payment_date, notes)
-            )
-            
-            # حذف إشعارات الدفع الخاصة بهذا الطالب والمجموعة
-            self.db.execute_query("""
-                DELETE FROM notifications 
-                WHERE student_id=? AND group_id=? AND type='payment'
-            """, (student_id, group_id))
+            with self.db.transaction():
+                self.db.execute_query(
+                    SQL['payments.insert'], (student_id, group_id, amount, payment_date, notes)
+                )
+                
+                # حذف إشعارات الدفع الخاصة بهذا الطالب والمجموعة
+                self.db.execute_query(SQL['notifications.delete_payment'], (student_id, group_id))
             
             # تحديث عرض الإشعارات إذا كان التبويب موجوداً
             if hasattr(self, 'notifications_tree'):
@@ -3593,46 +6244,26 @@ $Shortcut.Description = "Student Manager App"
         
         if messagebox.askyesno("تأكيد", "هل تريد حذف هذه الدفعة؟"):
             try:
-                self.db.execute_query("DELETE FROM payments WHERE id=?", (payment_id,))
+                self.db.execute_query(SQL['payments.delete'], (payment_id,))
                 messagebox.showinfo("نجح", "تم حذف الدفعة")
                 self.load_payments()
             except Exception as e:
                 messagebox.showerror("خطأ", f"فشل الحذف: {str(e)}")
     
     def load_payments(self):
-        """تحميل قائمة الدفعات مع التلوين المتناوب"""
-        for item in self.payments_tree.get_children():
-            self.payments_tree.delete(item)
-        
-        query = """
-            SELECT p.id, s.name, g.name, p.amount, p.payment_date, p.notes
-            FROM payments p
-            JOIN students s ON p.student_id = s.id
-            JOIN groups g ON p.group_id = g.id
-            ORDER BY p.payment_date DESC
-        """
-        payments = self.db.fetch_all(query)
-        for idx, payment in enumerate(payments):
-            # الترتيب RTL: ملاحظات، التاريخ، المبلغ، المجموعة، الطالب، ID
-            values = [payment[5] or "", payment[4], payment[3], payment[2], payment[1], payment[0]]
-            tag = 'evenrow' if idx % 2 == 0 else 'oddrow'
-            self.payments_tree.insert("", tk.END, values=values, tags=(tag,))
+        """تحميل الدفعات في الخلفية - الصفحة الظاهرة فقط"""
+        view = self.payments_view
+        self.load_async('payments', self.payments_tree, view.fetch_snapshot, view.reset, view.offset)
     
     # ========== وظائف الحضور ==========
     
     def refresh_attendance_combos(self):
         """تحديث قوائم الطلبة والمجموعات للحضور"""
         # المجموعات
-        groups = self.db.fetch_all("SELECT id, name FROM groups")
-        group_list = [f"{g[0]} - {g[1]}" for g in groups]
-        self.attendance_group_combo["values"] = group_list
-        self.attendance_group_combo.all_values = group_list
+        self.bind_entity_combo(self.attendance_group_combo, 'groups')
         
         # الطلبة - جميع الطلاب مبدئياً
-        students = self.db.fetch_all("SELECT id, name FROM students")
-        student_list = [f"{s[0]} - {s[1]}" for s in students]
-        self.attendance_student_combo["values"] = student_list
-        self.attendance_student_combo.all_values = student_list
+        self.bind_entity_combo(self.attendance_student_combo, 'students')
     
     def on_attendance_group_change(self, event=None):
         """تحديث قائمة الطلاب عند تغيير المجموعة لإظهار طلاب المجموعة فقط"""
@@ -3641,20 +6272,12 @@ $Shortcut.Description = "Student Manager App"
         
         if group_id:
             # جلب طلاب المجموعة المحددة فقط
-            students = self.db.fetch_all("""
-                SELECT s.id, s.name 
-                FROM students s
-                JOIN student_groups sg ON s.id = sg.student_id
-                WHERE sg.group_id = ?
-                ORDER BY s.name
-            """, (group_id,))
+            students = self.db.fetch_all(SQL['students.in_group'], (group_id,))
+            student_list = [f"{s[0]} - {s[1]}" for s in students]
+            self.set_combo_values(self.attendance_student_combo, student_list)
         else:
             # إذا لم يتم اختيار مجموعة، أظهر جميع الطلاب
-            students = self.db.fetch_all("SELECT id, name FROM students ORDER BY name")
-        
-        student_list = [f"{s[0]} - {s[1]}" for s in students]
-        self.attendance_student_combo["values"] = student_list
-        self.attendance_student_combo.all_values = student_list
+            self.bind_entity_combo(self.attendance_student_combo, 'students')
         
         # مسح الاختيار الحالي للطالب
         self.attendance_student_combo.set('')
@@ -3679,16 +6302,18 @@ $Shortcut.Description = "Student Manager App"
         notes = self.attendance_notes.get().strip()
         
         try:
-            self.db.execute_query(
-                """INSERT OR REPLACE INTO attendance 
-                (student_id, group_id, attendance_date, status, notes) 
-                VALUES (?, ?, ?, ?, ?)""",
-                (student_id, group_id, attendance_date, status, notes)
-            )
+            # التسجيل وإشعار الإنجاز في معاملة واحدة
+            with self.db.transaction():
+                self.db.execute_query(
+                    SQL['attendance.upsert'], (student_id, group_id, attendance_date, status, notes)
+                )
+                
+                # فحص عدد الحضور وإنشاء إشعار عند الوصول لـ 4 حصص
+                milestone_created = status == 'حاضر' and self.check_attendance_milestone(student_id, group_id)
             
-            # فحص عدد الحضور وإنشاء إشعار عند الوصول لـ 4 حصص
-            if status == 'حاضر':
-                self.check_attendance_milestone(student_id, group_id)
+            # تحديث عرض الإشعارات إذا كان التبويب موجوداً
+            if milestone_created and hasattr(self, 'notifications_tree'):
+                self.load_notifications()
             
             messagebox.showinfo("نجح", "تم تسجيل الحضور بنجاح")
             self.attendance_notes.delete(0, tk.END)
@@ -3697,81 +6322,181 @@ $Shortcut.Description = "Student Manager App"
             messagebox.showerror("خطأ", f"فشل تسجيل الحضور: {str(e)}")
     
     def check_attendance_milestone(self, student_id, group_id):
-        """فحص عدد الحضور وإنشاء إشعار عند الوصول لعدد محدد من الحصص"""
+        """فحص عدد الحضور وإنشاء إشعار عند الوصول لعدد محدد من الحصص
+
+        يعيد True إذا تم إنشاء إشعار جديد
+        """
         # التحقق من تفعيل الميزة
-        enabled = self.db.fetch_one(
-            "SELECT setting_value FROM notification_settings WHERE setting_key='attendance_milestone_enabled'"
-        )
+        if not self.settings.get_bool('attendance_milestone_enabled'):
+            return False
         
-        if not enabled or enabled[0] != '1':
-            return
+        # عدد الحصص المطلوب للإشعار
+        milestone_count = self.settings.get_int('attendance_milestone_count')
         
-        # جلب عدد الحصص المطلوب للإشعار
-        milestone_setting = self.db.fetch_one(
-            "SELECT setting_value FROM notification_settings WHERE setting_key='attendance_milestone_count'"
-        )
-        milestone_count = int(milestone_setting[0]) if milestone_setting else 4
-        
-        # جلب تاريخ آخر دفعة للطالب في هذه المجموعة
-        last_payment = self.db.fetch_one("""
-            SELECT MAX(payment_date) 
-            FROM payments 
-            WHERE student_id=? AND group_id=?
-        """, (student_id, group_id))
-        
-        last_payment_date = last_payment[0] if last_payment and last_payment[0] else None
-        
-        # حساب عدد الحضور بعد آخر دفعة فقط (أو كل الحضور إذا لم يكن هناك دفعات)
-        if last_payment_date:
-            attendance_count = self.db.fetch_one("""
-                SELECT COUNT(*) 
-                FROM attendance 
-                WHERE student_id=? AND group_id=? AND status='حاضر'
-                AND attendance_date > ?
-            """, (student_id, group_id, last_payment_date))
-        else:
-            attendance_count = self.db.fetch_one("""
-                SELECT COUNT(*) 
-                FROM attendance 
-                WHERE student_id=? AND group_id=? AND status='حاضر'
-            """, (student_id, group_id))
+        # عدد الحضور بعد آخر دفعة - عداد تحدثه المشغلات (attendance_counters)
+        counter = self.db.fetch_one(SQL['attendance.counter'], (student_id, group_id))
+        if not counter:
+            return False
+        
+        total_attendance, last_milestone = counter
+        
+        # إذا وصل عدد الحضور إلى العدد المطلوب أو مضاعفاته ولم يُرسل له إشعار في دورة الدفع هذه
+        if total_attendance <= last_milestone or total_attendance % milestone_count:
+            return False
+        
+        self.db.execute_query(SQL['attendance.claim_milestone'],
+                              (total_attendance, student_id, group_id, total_attendance))
+        if self.db.cursor.rowcount != 1:
+            return False
+        
+        self.db.execute_query(SQL['notifications.insert_milestone'],
+                              (total_attendance, student_id, group_id))
+        return self.db.cursor.rowcount == 1
+    
+    # ========== كشف حضور المجموعة ==========
+    
+    @staticmethod
+    def fetch_roll_call(db, group_id, attendance_date):
+        """طلاب المجموعة مع الحالة المسجلة في التاريخ - الطالب غير المسجل يظهر حاضراً
+
+        يعيد [(student_id, name, status, notes)]
+        """
+        return [(student_id, name, status or 'حاضر', notes or '')
+                for student_id, name, status, notes
+                in db.fetch_all(SQL['attendance.roll_call'], (attendance_date, group_id))]
+    
+    def save_roll_call(self, group_id, attendance_date, records):
+        """حفظ حالات كل طلاب الجلسة في معاملة واحدة ثم فحص الإنجازات دفعة واحدة
+
+        records: [(student_id, status, notes)] - يعيد عدد إشعارات الإنجاز المنشأة
+        """
+        with self.db.transaction():
+            self.db.execute_many(SQL['attendance.upsert'], [
+                (student_id, group_id, attendance_date, status, notes)
+                for student_id, status, notes in records
+            ])
+            
+            if not self.settings.get_bool('attendance_milestone_enabled'):
+                return 0
+            milestone_count = self.settings.get_int('attendance_milestone_count')
+            
+            # نفس شرط check_attendance_milestone لكل الحاضرين معاً: الإشعارات أولاً ثم حجز الإنجاز
+            self.db.execute_query(SQL['notifications.insert_session_milestones'],
+                                  (attendance_date, group_id, milestone_count))
+            created = self.db.cursor.rowcount
+            self.db.execute_query(SQL['attendance.claim_session_milestones'],
+                                  (attendance_date, group_id, group_id, milestone_count))
+            return created
+    
+    def show_roll_call(self):
+        """كشف حضور جلسة: كل طلاب المجموعة في تاريخ واحد وحفظهم دفعة واحدة"""
+        group_id = self.get_id_from_combo(self.attendance_group_combo.get())
+        attendance_date = self.attendance_date.get().strip()
+        if not group_id:
+            messagebox.showerror("خطأ", "يرجى اختيار مجموعة صحيحة من القائمة")
+            return
+        if not attendance_date:
+            messagebox.showerror("خطأ", "يرجى إدخال تاريخ الجلسة")
+            return
         
-        if not attendance_count:
+        students = self.fetch_roll_call(self.db, group_id, attendance_date)
+        if not students:
+            messagebox.showinfo("تنبيه", "لا يوجد طلاب مسجلين في هذه المجموعة")
             return
         
-        total_attendance = attendance_count[0]
+        group_name = self.attendance_group_combo.get().split(' - ', 1)[-1]
+        statuses = ("حاضر", "غائب", "غياب بعذر")
+        notes = {student_id: student_notes for student_id, _, _, student_notes in students}
         
-        # إذا وصل عدد الحضور إلى العدد المطلوب أو مضاعفاته
-        if total_attendance > 0 and total_attendance % milestone_count == 0:
-            # جلب معلومات الطالب والمجموعة
-            student = self.db.fetch_one("SELECT name FROM students WHERE id=?", (student_id,))
-            group = self.db.fetch_one("SELECT name FROM groups WHERE id=?", (group_id,))
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"كشف الحضور: {group_name}")
+        dialog.geometry("700x650")
+        dialog.configure(bg=self.colors['bg'])
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        # Header
+        header = tk.Frame(dialog, bg=self.colors['primary'], height=80)
+        header.pack(fill=tk.X)
+        header.pack_propagate(False)
+        
+        tk.Label(header, text=f"{self.icons['attendance']} كشف الحضور: {group_name} - {attendance_date}",
+                bg=self.colors['primary'], fg='white',
+                font=('Segoe UI', 18, 'bold')).pack(pady=20)
+        
+        content = tk.Frame(dialog, bg=self.colors['bg'])
+        content.pack(fill=tk.BOTH, expand=True, padx=30, pady=(20, 0))
+        
+        tk.Label(content, text="نقرة مزدوجة أو مسافة لتغيير الحالة",
+                bg=self.colors['bg'], fg=self.colors['text_secondary'],
+                font=('Segoe UI', 11)).pack(anchor='e', pady=(0, 10))
+        
+        tree_outer = tk.Frame(content, bg=self.colors['border'])
+        tree_outer.pack(fill=tk.BOTH, expand=True)
+        
+        tree_frame = tk.Frame(tree_outer, bg='#FFFFFF')
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=2, pady=2)
+        
+        columns = ("الحالة", "الطالب")
+        tree = ttk.Treeview(tree_frame, columns=columns, show="headings", height=15)
+        tree.column("الحالة", width=140, anchor='center')
+        tree.column("الطالب", width=360, anchor='e')
+        for col in columns:
+            tree.heading(col, text=col)
+        
+        # المعرف (iid) هو رقم الطالب
+        for idx, (student_id, name, status, _) in enumerate(students):
+            tree.insert("", tk.END, iid=str(student_id), values=(status, name),
+                        tags=('evenrow' if idx % 2 == 0 else 'oddrow',))
+        
+        vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=vsb.set)
+        tree.grid(row=0, column=0, sticky='nsew')
+        vsb.grid(row=0, column=1, sticky='ns')
+        tree_frame.grid_rowconfigure(0, weight=1)
+        tree_frame.grid_columnconfigure(0, weight=1)
+        
+        def set_status(items, status):
+            for item in items:
+                tree.set(item, "الحالة", status)
+        
+        def cycle_status(event=None):
+            for item in tree.selection():
+                current = tree.set(item, "الحالة")
+                tree.set(item, "الحالة", statuses[(statuses.index(current) + 1) % len(statuses)])
+            return "break"
+        
+        tree.bind("<Double-1>", cycle_status)
+        tree.bind("<space>", cycle_status)
+        
+        def save():
+            records = [(int(item), tree.set(item, "الحالة"), notes[int(item)])
+                       for item in tree.get_children()]
+            try:
+                created = self.save_roll_call(group_id, attendance_date, records)
+            except Exception as e:
+                messagebox.showerror("خطأ", f"فشل حفظ كشف الحضور: {str(e)}", parent=dialog)
+                return
             
-            if student and group:
-                student_name = student[0]
-                group_name = group[0]
-                
-                # التحقق من عدم وجود إشعار مماثل لنفس العدد
-                existing = self.db.fetch_one("""
-                    SELECT id FROM notifications 
-                    WHERE student_id=? AND group_id=? AND type='attendance_milestone'
-                    AND message LIKE ?
-                """, (student_id, group_id, f"%{total_attendance} حصة%"))
-                
-                if not existing:
-                    # إنشاء إشعار جديد
-                    title = f"إنجاز حضور - {group_name}"
-                    message = f"تهانينا! الطالب {student_name} أكمل {total_attendance} حصة في مجموعة {group_name}"
-                    
-                    self.db.execute_query("""
-                        INSERT INTO notifications 
-                        (student_id, group_id, type, title, message, priority)
-                        VALUES (?, ?, 'attendance_milestone', ?, ?, 'normal')
-                    """, (student_id, group_id, title, message))
-                    
-                    # تحديث عرض الإشعارات إذا كان التبويب موجوداً
-                    if hasattr(self, 'notifications_tree'):
-                        self.load_notifications()
+            dialog.destroy()
+            if created and hasattr(self, 'notifications_tree'):
+                self.load_notifications()
+            self.load_attendance()
+            messagebox.showinfo("نجح", f"تم تسجيل حضور {len(records)} طالب بنجاح")
+        
+        btn_frame = tk.Frame(dialog, bg=self.colors['bg'])
+        btn_frame.pack(pady=20)
+        
+        self.create_modern_button(btn_frame, "إلغاء", dialog.destroy,
+                                  'secondary', self.icons['cancel']).pack(side=tk.LEFT, padx=5)
+        self.create_modern_button(btn_frame, "الكل غائب",
+                                  lambda: set_status(tree.get_children(), "غائب"),
+                                  'danger', self.icons['absent']).pack(side=tk.LEFT, padx=5)
+        self.create_modern_button(btn_frame, "الكل حاضر",
+                                  lambda: set_status(tree.get_children(), "حاضر"),
+                                  'info', self.icons['attendance']).pack(side=tk.LEFT, padx=5)
+        self.create_modern_button(btn_frame, "حفظ", save,
+                                  'success', self.icons['save']).pack(side=tk.LEFT, padx=5)
     
     def delete_attendance(self):
         """حذف تسجيل حضور"""
@@ -3785,36 +6510,62 @@ $Shortcut.Description = "Student Manager App"
         
         if messagebox.askyesno("تأكيد", "هل تريد حذف هذا التسجيل؟"):
             try:
-                self.db.execute_query("DELETE FROM attendance WHERE id=?", (attendance_id,))
+                self.db.execute_query(SQL['attendance.delete'], (attendance_id,))
                 messagebox.showinfo("نجح", "تم حذف التسجيل")
                 self.load_attendance()
             except Exception as e:
                 messagebox.showerror("خطأ", f"فشل الحذف: {str(e)}")
     
     def load_attendance(self):
-        """تحميل قائمة الحضور مع التلوين المتناوب"""
-        for item in self.attendance_tree.get_children():
-            self.attendance_tree.delete(item)
-        
-        query = """
-            SELECT a.id, s.name, g.name, a.status, a.attendance_date, a.notes
-            FROM attendance a
-            JOIN students s ON a.student_id = s.id
-            JOIN groups g ON a.group_id = g.id
-            ORDER BY a.attendance_date DESC
-        """
-        attendance_records = self.db.fetch_all(query)
-        for idx, record in enumerate(attendance_records):
-            # الترتيب RTL: ملاحظات، التاريخ، الحالة، المجموعة، الطالب، ID
-            values = [record[5] or "", record[4], record[3], record[2], record[1], record[0]]
-            tag = 'evenrow' if idx % 2 == 0 else 'oddrow'
-            self.attendance_tree.insert("", tk.END, values=values, tags=(tag,))
+        """تحميل سجل الحضور في الخلفية - الصفحة الظاهرة فقط"""
+        view = self.attendance_view
+        self.load_async('attendance', self.attendance_tree, view.fetch_snapshot, view.reset, view.offset)
     
     # ========== التقارير ==========
     
+    def show_report(self, report, fetch, format_report, *params, background=False):
+        """عرض تقرير من report_cache، أو حسابه بـ fetch(db, *params) إذا تغيرت جداوله
+
+        يُحفظ نص التقرير الجاهز (format_report(data)) فيكون العرض المتكرر بلا أي حساب.
+        background: الحساب في خيط قاعدة البيانات بدلاً من خيط Tk
+        """
+        # تقرير خلفية سابق لم ينته لا يكتب فوق هذا التقرير
+        self.cancel_load('report')
+        token = self._load_tokens['report']
+        text = self.report_cache.get(report, *params)
+        if text is not None:
+            self.show_report_text(text)
+            return
+        
+        # الأرقام قبل الحساب: أي كتابة أثناءه تجعل النتيجة المحفوظة قديمة فتُعاد
+        snapshot = self.report_cache.snapshot(report)
+        
+        def store(data):
+            text = format_report(data)
+            self.report_cache.put(report, params, snapshot, text)
+            if self._load_tokens.get('report') == token:
+                self.show_report_text(text)
+        
+        if background:
+            self.show_report_text("جاري إعداد التقرير...")
+            self._load_futures['report'] = (self.run_db_async(fetch, store, *params), None)
+        else:
+            store(fetch(self.db, *params))
+    
+    def show_report_text(self, text):
+        """استبدال نص منطقة التقارير"""
+        self.report_text.delete("1.0", tk.END)
+        self.report_text.insert("1.0", text)
+    
     def show_students_report(self):
         """عرض تقرير الطلبة"""
+        self.cancel_load('report')
+        cached = self.report_cache.get('students')
+        if cached is not None:
+            self.show_report_text(cached)
+            return
         self.report_text.delete("1.0", tk.END)
+        snapshot = self.report_cache.snapshot('students')
         
         report = "=" * 60 + "\n"
         report += "تقرير الطلبة\n"
@@ -3823,44 +6574,34 @@ $Shortcut.Description = "Student Manager App"
         # إحصائيات عامة
         total = self.db.fetch_one("SELECT COUNT(*) FROM students")[0]
         report += f"إجمالي عدد الطلبة: {total}\n\n"
-        
-        # قائمة الطلبة مع مجموعاتهم
-        query = """
-            SELECT s.name, s.phone, 
-                   GROUP_CONCAT(g.name, ', ') as groups,
-                   COUNT(DISTINCT sg.group_id) as group_count
-            FROM students s
-            LEFT JOIN student_groups sg ON s.id = sg.student_id
-            LEFT JOIN groups g ON sg.group_id = g.id
-            GROUP BY s.id
-        """
-        students = self.db.fetch_all(query)
-        
         report += "-" * 60 + "\n"
-        for student in students:
-            name, phone, groups, count = student
-            groups = groups if groups else "لا يوجد"
-            report += f"الاسم: {name}\n"
-            report += f"الهاتف: {phone}\n"
-            report += f"عدد المجموعات: {count}\n"
-            report += f"المجموعات: {groups}\n"
-            report += "-" * 60 + "\n"
-        
         self.report_text.insert("1.0", report)
+        parts = [report]
+        
+        # قائمة الطلبة مع مجموعاتهم - صفحة بصفحة بالمعرف بدلاً من تحميل كل الطلبة
+        for students in self.db.iter_pages(SQL['reports.students'], None, 's.id', (0,),
+                                           descending=False):
+            report = ""
+            for student_id, name, phone, groups, count in students:
+                groups = groups if groups else "لا يوجد"
+                report += f"الاسم: {name}\n"
+                report += f"الهاتف: {phone}\n"
+                report += f"عدد المجموعات: {count}\n"
+                report += f"المجموعات: {groups}\n"
+                report += "-" * 60 + "\n"
+            self.report_text.insert(tk.END, report)
+            parts.append(report)
+        
+        self.report_cache.put('students', (), snapshot, "".join(parts))
     
     def show_groups_report(self):
         """عرض تقرير المجموعات"""
-        self.report_text.delete("1.0", tk.END)
-        
-        report = "=" * 60 + "\n"
-        report += "تقرير المجموعات\n"
-        report += "=" * 60 + "\n\n"
-        
-        # إحصائيات عامة
-        total = self.db.fetch_one("SELECT COUNT(*) FROM groups")[0]
-        report += f"إجمالي عدد المجموعات: {total}\n\n"
-        
-        # تفاصيل المجموعات
+        self.show_report('groups', self.fetch_groups_report, self.format_groups_report)
+    
+    @staticmethod
+    def fetch_groups_report(db):
+        """عدد المجموعات وتفاصيل كل مجموعة مع عدد طلبتها"""
+        total = db.fetch_one("SELECT COUNT(*) FROM groups")[0]
         query = """
             SELECT g.name, g.subject, g.teacher, g.fee,
                    COUNT(DISTINCT sg.student_id) as student_count
@@ -3868,8 +6609,20 @@ $Shortcut.Description = "Student Manager App"
             LEFT JOIN student_groups sg ON g.id = sg.group_id
             GROUP BY g.id
         """
-        groups = self.db.fetch_all(query)
+        return total, db.fetch_all(query)
+    
+    @staticmethod
+    def format_groups_report(data):
+        """نص تقرير المجموعات من نتيجة fetch_groups_report"""
+        total, groups = data
+        report = "=" * 60 + "\n"
+        report += "تقرير المجموعات\n"
+        report += "=" * 60 + "\n\n"
         
+        # إحصائيات عامة
+        report += f"إجمالي عدد المجموعات: {total}\n\n"
+        
+        # تفاصيل المجموعات
         report += "-" * 60 + "\n"
         for group in groups:
             name, subject, teacher, fee, count = group
@@ -3880,34 +6633,75 @@ $Shortcut.Description = "Student Manager App"
             report += f"عدد الطلبة: {count}\n"
             report += "-" * 60 + "\n"
         
-        self.report_text.insert("1.0", report)
+        return report
     
-    def show_payments_report(self):
-        """عرض تقرير الدفعات"""
+    def show_sql_diagnostics_report(self, limit=20):
+        """أكثر أوامر SQL استهلاكاً للوقت منذ تشغيل البرنامج"""
+        self.cancel_load('report')
         self.report_text.delete("1.0", tk.END)
+        stats = self.db.stats
         
         report = "=" * 60 + "\n"
-        report += "تقرير الدفعات\n"
+        report += "تشخيص أوامر SQL\n"
         report += "=" * 60 + "\n\n"
         
-        # إجمالي الدفعات
-        total = self.db.fetch_one("SELECT COALESCE(SUM(amount), 0) FROM payments")[0]
-        count = self.db.fetch_one("SELECT COUNT(*) FROM payments")[0]
+        if not stats.enabled:
+            stats.enabled = True
+            report += "تم تفعيل قياس أوامر SQL الآن.\n"
+            report += "استخدم البرنامج ثم افتح هذا التقرير مرة أخرى.\n"
+            report += f"(للتفعيل من البداية: {QueryStats.FLAG} أو {QueryStats.ENV_VAR}=1)\n"
+            self.report_text.insert("1.0", report)
+            return
         
-        report += f"إجمالي المبالغ المحصلة: {total} \n"
-        report += f"عدد الدفعات: {count}\n\n"
+        top = stats.top(limit)
+        report += f"حد الأوامر البطيئة: {stats.slow_query_ms:g} ms\n"
+        report += f"أعلى {len(top)} أمر حسب الوقت الكلي:\n\n"
         
-        # الدفعات حسب المجموعات
-        report += "الدفعات حسب المجموعات:\n"
         report += "-" * 60 + "\n"
+        for sql, entry in top:
+            sites = ", ".join(f"{site} ×{count}" for site, count in
+                              sorted(entry['sites'].items(), key=lambda item: -item[1])[:3])
+            report += f"الوقت الكلي: {entry['total_ms']:.1f} ms | المرات: {entry['calls']} | "
+            report += f"المتوسط: {entry['total_ms'] / entry['calls']:.2f} ms | الأقصى: {entry['max_ms']:.1f} ms\n"
+            report += f"الصفوف: {entry['rows']}\n"
+            report += f"من: {sites}\n"
+            report += f"{sql[:300]}\n"
+            report += "-" * 60 + "\n"
         
+        self.report_text.insert("1.0", report)
+    
+    def show_payments_report(self):
+        """عرض تقرير الدفعات"""
+        self.show_report('payments', self.fetch_payments_report, self.format_payments_report)
+    
+    @staticmethod
+    def fetch_payments_report(db):
+        """إجمالي الدفعات وعددها والدفعات حسب المجموعات"""
+        total = db.fetch_one("SELECT COALESCE(SUM(amount), 0) FROM payments")[0]
+        count = db.fetch_one("SELECT COUNT(*) FROM payments")[0]
         query = """
             SELECT g.name, COUNT(*) as payment_count, SUM(p.amount) as total_amount
             FROM payments p
             JOIN groups g ON p.group_id = g.id
             GROUP BY g.id
         """
-        group_payments = self.db.fetch_all(query)
+        return total, count, db.fetch_all(query)
+    
+    @staticmethod
+    def format_payments_report(data):
+        """نص تقرير الدفعات من نتيجة fetch_payments_report"""
+        total, count, group_payments = data
+        report = "=" * 60 + "\n"
+        report += "تقرير الدفعات\n"
+        report += "=" * 60 + "\n\n"
+        
+        # إجمالي الدفعات
+        report += f"إجمالي المبالغ المحصلة: {total} \n"
+        report += f"عدد الدفعات: {count}\n\n"
+        
+        # الدفعات حسب المجموعات
+        report += "الدفعات حسب المجموعات:\n"
+        report += "-" * 60 + "\n"
         
         for gp in group_payments:
             group_name, payment_count, total_amount = gp
@@ -3916,57 +6710,238 @@ $Shortcut.Description = "Student Manager App"
             report += f"المبلغ الإجمالي: {total_amount}\n"
             report += "-" * 60 + "\n"
         
-        self.report_text.insert("1.0", report)
+        return report
     
     def show_attendance_report(self):
-        """عرض تقرير الحضور"""
-        self.report_text.delete("1.0", tk.END)
+        """عرض تقرير الحضور - يُحسب في الخلفية إذا تغيرت جداوله"""
+        self.show_report('attendance', self.fetch_attendance_report, self.format_attendance_report,
+                         background=True)
+    
+    @staticmethod
+    def fetch_attendance_report(db):
+        """إحصائيات الحضور: إجمالي، لكل طالب، لكل مجموعة، لكل شهر (يعمل في خيط قاعدة البيانات)
+
+        الإجمالي والطلبة والمجموعات من تجميع واحد بالفهرس (طالب، مجموعة، حالة)،
+        والأشهر من تجميع بالفهرس (تاريخ، حالة). كل عدّاد Counter بمفتاح الحالة.
+        """
+        totals = Counter()
+        by_student = defaultdict(Counter)
+        by_group = defaultdict(Counter)
+        for student_id, group_id, status, count in db.fetch_all(SQL['reports.attendance_by_enrollment']):
+            totals[status] += count
+            by_student[student_id][status] += count
+            by_group[group_id][status] += count
+        
+        by_month = defaultdict(Counter)
+        for attendance_date, status, count in db.fetch_all(SQL['reports.attendance_by_date']):
+            by_month[attendance_date[:7]][status] += count
+        
+        student_names = dict(db.fetch_all(SQL['entities.students']))
+        group_names = dict(db.fetch_all(SQL['entities.groups']))
+        return {
+            'totals': totals,
+            # نفس ترتيب التقرير السابق: الطلبة بالرقم، المجموعات بالاسم
+            'students': [(student_names.get(student_id, student_id), by_student[student_id])
+                         for student_id in sorted(by_student)],
+            'groups': sorted(((group_names.get(group_id, group_id), counts)
+                              for group_id, counts in by_group.items()), key=lambda item: str(item[0])),
+            'months': sorted(by_month.items()),
+        }
+    
+    @staticmethod
+    def format_attendance_report(data):
+        """نص تقرير الحضور من نتيجة fetch_attendance_report"""
+        totals = data['totals']
+        total = sum(totals.values())
+        present = totals['حاضر']
         
         report = "=" * 60 + "\n"
         report += "تقرير الحضور والغياب\n"
         report += "=" * 60 + "\n\n"
         
         # إحصائيات عامة
-        total = self.db.fetch_one("SELECT COUNT(*) FROM attendance")[0]
-        present = self.db.fetch_one("SELECT COUNT(*) FROM attendance WHERE status='حاضر'")[0]
-        absent = self.db.fetch_one("SELECT COUNT(*) FROM attendance WHERE status='غائب'")[0]
-        excused = self.db.fetch_one("SELECT COUNT(*) FROM attendance WHERE status='غياب بعذر'")[0]
-        
         report += f"إجمالي السجلات: {total}\n"
         report += f"الحضور: {present}\n"
-        report += f"الغياب: {absent}\n"
-        report += f"الغياب بعذر: {excused}\n\n"
+        report += f"الغياب: {totals['غائب']}\n"
+        report += f"الغياب بعذر: {totals['غياب بعذر']}\n\n"
         
         # نسب الحضور
         if total > 0:
             present_pct = (present / total) * 100
             report += f"نسبة الحضور: {present_pct:.2f}%\n\n"
         
-        # الحضور حسب الطلبة
-        report += "الحضور حسب الطلبة:\n"
-        report += "-" * 60 + "\n"
-        
-        query = """
-            SELECT s.name,
-                   SUM(CASE WHEN a.status='حاضر' THEN 1 ELSE 0 END) as present_count,
-                   SUM(CASE WHEN a.status='غائب' THEN 1 ELSE 0 END) as absent_count,
-                   COUNT(*) as total_count
-            FROM students s
-            LEFT JOIN attendance a ON s.id = a.student_id
-            GROUP BY s.id
-            HAVING total_count > 0
-        """
-        student_attendance = self.db.fetch_all(query)
-        
-        for sa in student_attendance:
-            name, present_c, absent_c, total_c = sa
-            attendance_rate = (present_c / total_c * 100) if total_c > 0 else 0
-            report += f"الطالب: {name}\n"
-            report += f"الحضور: {present_c} | الغياب: {absent_c} | المجموع: {total_c}\n"
-            report += f"نسبة الحضور: {attendance_rate:.2f}%\n"
+        for title, label, rows in (("الحضور حسب الطلبة", "الطالب", data['students']),
+                                   ("الحضور حسب المجموعات", "المجموعة", data['groups']),
+                                   ("الحضور حسب الشهر", "الشهر", data['months'])):
+            report += f"{title}:\n"
             report += "-" * 60 + "\n"
+            for name, counts in rows:
+                present_c = counts['حاضر']
+                total_c = sum(counts.values())
+                attendance_rate = (present_c / total_c * 100) if total_c > 0 else 0
+                report += f"{label}: {name}\n"
+                report += f"الحضور: {present_c} | الغياب: {counts['غائب']} | "
+                report += f"بعذر: {counts['غياب بعذر']} | المجموع: {total_c}\n"
+                report += f"نسبة الحضور: {attendance_rate:.2f}%\n"
+                report += "-" * 60 + "\n"
+            report += "\n"
+        
+        return report
+    
+    # ========== التصدير ==========
+    
+    @staticmethod
+    def export_ledger(db, ledger, fmt, path, date_from, date_to, group_id, progress, cancelled):
+        """تصدير سجل الدفعات/الحضور (يعمل في خيط قاعدة بيانات خاص بالتصدير)"""
+        return LedgerExporter(db, ledger, fmt, progress, cancelled).run(path, date_from, date_to, group_id)
+    
+    def show_export_dialog(self):
+        """تصدير سجل الدفعات أو الحضور كاملاً لملف في الخلفية"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("تصدير السجلات")
+        dialog.geometry("700x520")
+        dialog.configure(bg=self.colors['bg'])
+        dialog.transient(self.root)
+        dialog.grab_set()
         
-        self.report_text.insert("1.0", report)
+        # Header
+        header = tk.Frame(dialog, bg=self.colors['primary'], height=80)
+        header.pack(fill=tk.X)
+        header.pack_propagate(False)
+        
+        tk.Label(header, text=f"{self.icons['export']} تصدير سجل الدفعات / الحضور",
+                bg=self.colors['primary'], fg='white',
+                font=('Segoe UI', 20, 'bold')).pack(pady=20)
+        
+        content = tk.Frame(dialog, bg=self.colors['bg'])
+        content.pack(fill=tk.BOTH, expand=True, padx=30, pady=20)
+        
+        def option_row(label, choices, default):
+            frame = tk.Frame(content, bg=self.colors['bg'])
+            frame.pack(fill=tk.X, pady=5)
+            tk.Label(frame, text=label, bg=self.colors['bg'], fg=self.colors['text'],
+                    font=('Segoe UI', 13, 'bold'), width=10, anchor='e').pack(side=tk.RIGHT)
+            var = tk.StringVar(value=default)
+            for value, text in choices:
+                tk.Radiobutton(frame, text=text, value=value, variable=var,
+                               bg=self.colors['bg'], font=('Segoe UI', 12)).pack(side=tk.RIGHT, padx=10)
+            return var
+        
+        ledger_var = option_row("السجل:", (('payments', "الدفعات"), ('attendance', "الحضور")), 'payments')
+        format_var = option_row("الصيغة:", (('xlsx', "Excel"), ('csv', "CSV"), ('jsonl', "JSON Lines")), 'xlsx')
+        
+        # الفلاتر: الفترة والمجموعة
+        filters = tk.Frame(content, bg=self.colors['bg'])
+        filters.pack(fill=tk.X, pady=5)
+        tk.Label(filters, text="من:", bg=self.colors['bg'], fg=self.colors['text'],
+                font=('Segoe UI', 13, 'bold'), width=10, anchor='e').pack(side=tk.RIGHT)
+        date_from = tk.Entry(filters, width=12, font=('Segoe UI', 12), justify='center')
+        date_from.pack(side=tk.RIGHT, padx=10, ipady=4)
+        tk.Label(filters, text="إلى:", bg=self.colors['bg'], fg=self.colors['text'],
+                font=('Segoe UI', 13, 'bold')).pack(side=tk.RIGHT)
+        date_to = tk.Entry(filters, width=12, font=('Segoe UI', 12), justify='center')
+        date_to.pack(side=tk.RIGHT, padx=10, ipady=4)
+        tk.Label(filters, text="(YYYY-MM-DD، فارغ = الكل)", bg=self.colors['bg'],
+                fg=self.colors['text_secondary'], font=('Segoe UI', 10)).pack(side=tk.RIGHT)
+        
+        group_frame = tk.Frame(content, bg=self.colors['bg'])
+        group_frame.pack(fill=tk.X, pady=5)
+        tk.Label(group_frame, text="المجموعة:", bg=self.colors['bg'], fg=self.colors['text'],
+                font=('Segoe UI', 13, 'bold'), width=10, anchor='e').pack(side=tk.RIGHT)
+        all_groups = "كل المجموعات"
+        group_combo = ttk.Combobox(group_frame, width=35, font=('Segoe UI', 12),
+                                   values=(all_groups,) + self.entities.get('groups'))
+        group_combo.set(all_groups)
+        group_combo.pack(side=tk.RIGHT, padx=10)
+        
+        progress_bar = ttk.Progressbar(content, maximum=1.0, mode='determinate')
+        progress_bar.pack(fill=tk.X, pady=(20, 5))
+        status_label = tk.Label(content, text="", bg=self.colors['bg'], fg=self.colors['text'],
+                                font=('Segoe UI', 12), anchor='e')
+        status_label.pack(fill=tk.X)
+        
+        btn_frame = tk.Frame(dialog, bg=self.colors['bg'])
+        btn_frame.pack(pady=(0, 20))
+        
+        # التقدم من خيط التصدير عبر queue - نفس أسلوب نافذة الاستيراد
+        progress = queue.Queue()
+        cancel = threading.Event()
+        running = []
+        
+        def poll_progress():
+            update = None
+            while not progress.empty():
+                update = progress.get_nowait()
+            if update and running:
+                rows, fraction = update
+                progress_bar['value'] = fraction
+                status_label.config(text=f"جاري التصدير... {rows:,} صف")
+            if running:
+                self.root.after(100, poll_progress)
+        
+        def finished(worker, path, rows=None):
+            worker.stop()
+            running.clear()
+            if not dialog.winfo_exists():
+                return
+            start_btn.config(state=tk.NORMAL)
+            if rows is None:
+                status_label.config(text="لم يكتمل التصدير")
+                return
+            progress_bar['value'] = 1.0
+            status_label.config(text=f"تم تصدير {rows:,} صف إلى {os.path.basename(path)}")
+        
+        def start():
+            ledger, fmt = ledger_var.get(), format_var.get()
+            first, last = date_from.get().strip() or None, date_to.get().strip() or None
+            for value in (first, last):
+                if value and not re.fullmatch(r"\d{4}-\d{2}-\d{2}", value):
+                    messagebox.showerror("خطأ", f"تاريخ غير صالح: {value}", parent=dialog)
+                    return
+            group_id = None
+            if group_combo.get() != all_groups:
+                group_id = self.get_id_from_combo(group_combo.get())
+                if not group_id:
+                    messagebox.showerror("خطأ", "يرجى اختيار مجموعة من القائمة", parent=dialog)
+                    return
+            
+            path = filedialog.asksaveasfilename(
+                parent=dialog, defaultextension=f".{fmt}",
+                initialfile=f"{ledger}_{date.today():%Y-%m-%d}.{fmt}",
+                filetypes=[(fmt.upper(), f"*.{fmt}")]
+            )
+            if not path:
+                return
+            
+            # اتصال وخيط خاصان بالتصدير: التصدير الطويل لا يؤخر تحميل الصفحات
+            worker = DatabaseWorker(self.db.db_name, profile=self.db.profile,
+                                    tracer=self.tracer, stats=self.db.stats,
+                                    versions=self.db.versions)
+            cancel.clear()
+            running.append(True)
+            start_btn.config(state=tk.DISABLED)
+            progress_bar['value'] = 0
+            status_label.config(text="جاري التصدير...")
+            future = self.run_db_async(self.export_ledger, lambda rows: finished(worker, path, rows),
+                                       ledger, fmt, path, first, last, group_id,
+                                       lambda rows, fraction: progress.put((rows, fraction)), cancel.is_set,
+                                       on_error=lambda: finished(worker, path), worker=worker)
+            self.track_job(cancel, future)
+            poll_progress()
+        
+        def close():
+            cancel.set()
+            running.clear()
+            dialog.destroy()
+        
+        dialog.protocol("WM_DELETE_WINDOW", close)
+        self.create_modern_button(btn_frame, "إغلاق", close,
+                                  'secondary', self.icons['close']).pack(side=tk.LEFT, padx=5)
+        self.create_modern_button(btn_frame, "إيقاف", cancel.set,
+                                  'danger', self.icons['cancel']).pack(side=tk.LEFT, padx=5)
+        start_btn = self.create_modern_button(btn_frame, "تصدير", start,
+                                              'success', self.icons['export'])
+        start_btn.pack(side=tk.LEFT, padx=5)
     
     def show_about(self):
         """عرض معلومات عن البرنامج"""
@@ -3983,19 +6958,18 @@ $Shortcut.Description = "Student Manager App"
     # ========== الإشعارات ==========
     
     def load_notifications(self):
-        """تحميل قائمة الإشعارات"""
-        for item in self.notifications_tree.get_children():
-            self.notifications_tree.delete(item)
-        
-        query = """
-            SELECT n.id, n.is_read, n.priority, n.title, n.message, s.name, 
-                   datetime(n.created_at, 'localtime') as created_at
-            FROM notifications n
-            JOIN students s ON n.student_id = s.id
-            ORDER BY n.is_read ASC, n.created_at DESC
-        """
-        notifications = self.db.fetch_all(query)
-        
+        """تحميل قائمة الإشعارات في الخلفية"""
+        self.load_async('notifications', self.notifications_tree,
+                        self.fetch_notifications, self.render_notifications)
+    
+    @staticmethod
+    def fetch_notifications(db):
+        """جلب الإشعارات (يعمل في خيط قاعدة البيانات)"""
+        return db.fetch_all(SQL['notifications.list'])
+    
+    def render_notifications(self, notifications):
+        """عرض الإشعارات في الجدول"""
+        rows = []
         unread_count = 0
         for notif in notifications:
             n_id, is_read, priority, title, message, student, created = notif
@@ -4018,11 +6992,10 @@ $Shortcut.Description = "Student Manager App"
             created_date = created[:16] if created else ""
             
             # الترتيب RTL: التاريخ، الطالب، الرسالة، العنوان، الأولوية، الحالة، ID
-            self.notifications_tree.insert("", tk.END, 
-                                          values=(created_date, student,
-                                                 message[:50] + "..." if len(message) > 50 else message,
-                                                 title, priority_text, status, n_id),
-                                          tags=(tag,))
+            rows.append((n_id, (created_date, student,
+                                message[:50] + "..." if len(message) > 50 else message,
+                                title, priority_text, status, n_id), tag))
+        self.tree_rows(self.notifications_tree).sync(rows)
         
         # تحديث العدادات
         self.unread_count_label.config(text=str(unread_count))
@@ -4030,125 +7003,72 @@ $Shortcut.Description = "Student Manager App"
     
     def check_notifications_on_startup(self):
         """فحص الإشعارات عند بدء التشغيل"""
-        # جلب الإعدادات
-        show_on_startup = self.db.fetch_one(
-            "SELECT setting_value FROM notification_settings WHERE setting_key='show_notifications_on_startup'"
-        )
+        unread = 0
+        with self.tracer.span('check_notifications_on_startup'):
+            # جلب الإعدادات
+            if self.settings.get_bool('show_notifications_on_startup'):
+                with self.db.transaction():
+                    # تنظيف الإشعارات القديمة للطلاب الذين دفعوا بالفعل
+                    self.cleanup_stale_payment_notifications()
+                    
+                    # توليد إشعارات الدفعات
+                    self.generate_payment_notifications()
+                
+                if hasattr(self, 'notifications_tree'):
+                    self.load_notifications()
+                
+                # عرض الإشعارات غير المقروءة
+                unread = self.db.fetch_one(SQL['notifications.unread_count'])[0]
         
-        if show_on_startup and show_on_startup[0] == '1':
-            # تنظيف الإشعارات القديمة للطلاب الذين دفعوا بالفعل
-            self.cleanup_stale_payment_notifications()
-            
-            # توليد إشعارات الدفعات
-            self.generate_payment_notifications()
-            
-            # عرض الإشعارات غير المقروءة
-            unread = self.db.fetch_one(
-                "SELECT COUNT(*) FROM notifications WHERE is_read=0"
-            )[0]
-            
-            if unread > 0:
-                response = messagebox.askyesno(
-                    "إشعارات جديدة",
-                    f"لديك {unread} إشعار جديد!\n\nهل تريد عرض الإشعارات الآن؟",
-                    icon='info'
-                )
-                if response:
-                    # الانتقال لتبويب الإشعارات
-                    self.show_notifications_page()
+        # آخر مراحل بدء التشغيل - قبل انتظار المستخدم
+        self.tracer.finish()
+        
+        if unread > 0:
+            response = messagebox.askyesno(
+                "إشعارات جديدة",
+                f"لديك {unread} إشعار جديد!\n\nهل تريد عرض الإشعارات الآن؟",
+                icon='info'
+            )
+            if response:
+                # الانتقال لتبويب الإشعارات
+                self.show_notifications_page()
     
     def cleanup_stale_payment_notifications(self):
         """حذف إشعارات الدفع القديمة للطلاب الذين دفعوا بالفعل"""
         # جلب فترة التذكير
-        reminder_days = self.db.fetch_one(
-            "SELECT setting_value FROM notification_settings WHERE setting_key='payment_reminder_days'"
-        )
-        days = int(reminder_days[0]) if reminder_days else 7
+        days = self.settings.get_int('payment_reminder_days')
         
         # حذف إشعارات الدفع للطلاب الذين دفعوا خلال الفترة المحددة
         cutoff_date = (date.today() - timedelta(days=days)).strftime("%Y-%m-%d")
         
         # حذف الإشعارات القديمة التي لم تعد صالحة (الطالب دفع بالفعل)
-        self.db.execute_query("""
-            DELETE FROM notifications 
-            WHERE type='payment' AND id IN (
-                SELECT n.id FROM notifications n
-                WHERE n.type='payment'
-                AND EXISTS (
-                    SELECT 1 FROM payments p
-                    WHERE p.student_id = n.student_id 
-                    AND p.group_id = n.group_id
-                    AND p.payment_date >= ?
-                )
-            )
-        """, (cutoff_date,))
+        self.db.execute_query(SQL['notifications.cleanup_paid'], (cutoff_date,))
     
     def generate_payment_notifications(self):
-        """توليد إشعارات الدفعات المتأخرة"""
+        """توليد إشعارات الدفعات المتأخرة - يعيد عدد الإشعارات الجديدة"""
         # جلب الإعدادات
-        enabled = self.db.fetch_one(
-            "SELECT setting_value FROM notification_settings WHERE setting_key='payment_alert_enabled'"
-        )
-        
-        if not enabled or enabled[0] != '1':
-            return
+        if not self.settings.get_bool('payment_alert_enabled'):
+            return 0
         
-        reminder_days = self.db.fetch_one(
-            "SELECT setting_value FROM notification_settings WHERE setting_key='payment_reminder_days'"
-        )
-        days = int(reminder_days[0]) if reminder_days else 7
+        days = self.settings.get_int('payment_reminder_days')
         
         # البحث عن الطلبة الذين لم يدفعوا خلال الفترة المحددة
         cutoff_date = (date.today() - timedelta(days=days)).strftime("%Y-%m-%d")
         
-        query = """
-            SELECT DISTINCT s.id, s.name, g.id, g.name, g.fee
-            FROM student_groups sg
-            JOIN students s ON sg.student_id = s.id
-            JOIN groups g ON sg.group_id = g.id
-            WHERE NOT EXISTS (
-                SELECT 1 FROM payments p
-                WHERE p.student_id = s.id 
-                AND p.group_id = g.id
-                AND p.payment_date >= ?
-            )
-        """
-        
-        overdue_students = self.db.fetch_all(query, (cutoff_date,))
-        
-        for student in overdue_students:
-            student_id, student_name, group_id, group_name, fee = student
-            
-            # تحقق إذا كان الإشعار موجود مسبقاً
-            existing = self.db.fetch_one("""
-                SELECT id FROM notifications 
-                WHERE student_id=? AND group_id=? AND type='payment' AND is_read=0
-            """, (student_id, group_id))
-            
-            if not existing:
-                # إنشاء إشعار جديد
-                title = f"تذكير دفعة - {group_name}"
-                message = f"الطالب {student_name} لم يدفع رسوم {group_name} ({fee} ج.م) منذ أكثر من {days} يوم"
-                
-                self.db.execute_query("""
-                    INSERT INTO notifications 
-                    (student_id, group_id, type, title, message, priority)
-                    VALUES (?, ?, 'payment', ?, ?, 'high')
-                """, (student_id, group_id, title, message))
-        
-        # تحديث عرض الإشعارات
-        if hasattr(self, 'notifications_tree'):
-            self.load_notifications()
+        # أمر واحد لكل التسجيلات - يضمن عدم تكرار إشعار الدفع المفتوح
+        self.db.execute_query(SQL['notifications.generate_payment'], (days, cutoff_date))
+        return self.db.cursor.rowcount
     
     def refresh_notifications(self):
         """تحديث الإشعارات"""
-        self.generate_payment_notifications()
+        created = self.generate_payment_notifications()
         self.load_notifications()
-        messagebox.showinfo("تم التحديث", "تم تحديث الإشعارات بنجاح!")
+        messagebox.showinfo("تم التحديث",
+                            f"تم تحديث الإشعارات بنجاح!\n\nإشعارات دفع جديدة: {created}")
     
     def mark_all_read(self):
         """تعليم جميع الإشعارات كمقروءة"""
-        self.db.execute_query("UPDATE notifications SET is_read=1")
+        self.db.execute_query(SQL['notifications.mark_all_read'])
         self.load_notifications()
         messagebox.showinfo("تم", "تم تعليم جميع الإشعارات كمقروءة")
     
@@ -4162,19 +7082,13 @@ $Shortcut.Description = "Student Manager App"
         notif_id = self.notifications_tree.item(selected[0])["values"][6]
         
         # جلب تفاصيل الإشعار
-        notif = self.db.fetch_one("""
-            SELECT n.*, s.name as student_name, g.name as group_name
-            FROM notifications n
-            JOIN students s ON n.student_id = s.id
-            LEFT JOIN groups g ON n.group_id = g.id
-            WHERE n.id=?
-        """, (notif_id,))
+        notif = self.db.fetch_one(SQL['notifications.details'], (notif_id,))
         
         if not notif:
             return
         
         # تعليم كمقروء
-        self.db.execute_query("UPDATE notifications SET is_read=1 WHERE id=?", (notif_id,))
+        self.db.execute_query(SQL['notifications.mark_read'], (notif_id,))
         
         # نافذة التفاصيل
         details_window = tk.Toplevel(self.root)
@@ -4253,14 +7167,14 @@ $Shortcut.Description = "Student Manager App"
     
     def delete_notification(self, notif_id, window):
         """حذف إشعار"""
-        self.db.execute_query("DELETE FROM notifications WHERE id=?", (notif_id,))
+        self.db.execute_query(SQL['notifications.delete'], (notif_id,))
         window.destroy()
         self.load_notifications()
         messagebox.showinfo("تم الحذف", "تم حذف الإشعار بنجاح")
     
     def mark_notification_as_paid(self, notif_id, window):
         """تعليم الإشعار كمدفوع - يحذف الإشعار بالكامل بدلاً من تعليمه كمقروء فقط"""
-        self.db.execute_query("DELETE FROM notifications WHERE id=?", (notif_id,))
+        self.db.execute_query(SQL['notifications.delete'], (notif_id,))
         window.destroy()
         self.load_notifications()
         messagebox.showinfo("تم السداد", "تم تسجيل السداد وحذف الإشعار بنجاح")
@@ -4293,13 +7207,7 @@ $Shortcut.Description = "Student Manager App"
         content_inner.pack(padx=30, pady=20, fill=tk.BOTH)
         
         # جلب الإعدادات الحالية
-        current_settings = {}
-        for key in ['payment_reminder_days', 'show_notifications_on_startup', 'payment_alert_enabled', 
-                    'attendance_milestone_enabled', 'attendance_milestone_count']:
-            val = self.db.fetch_one(
-                "SELECT setting_value FROM notification_settings WHERE setting_key=?", (key,)
-            )
-            current_settings[key] = val[0] if val else '0'
+        current_settings = {key: self.settings.get(key) for key in NotificationSettings.DEFAULTS}
         
         # إعداد 1: عرض عند التشغيل
         tk.Label(content_inner, text="🔔 الإشعارات عند التشغيل", 
@@ -4390,26 +7298,14 @@ $Shortcut.Description = "Student Manager App"
             if not confirm:
                 return
             
-            # حفظ الإعدادات
-            self.db.execute_query("""
-                UPDATE notification_settings SET setting_value=? WHERE setting_key='show_notifications_on_startup'
-            """, ('1' if show_startup_var.get() else '0',))
-            
-            self.db.execute_query("""
-                UPDATE notification_settings SET setting_value=? WHERE setting_key='payment_alert_enabled'
-            """, ('1' if payment_enabled_var.get() else '0',))
-            
-            self.db.execute_query("""
-                UPDATE notification_settings SET setting_value=? WHERE setting_key='payment_reminder_days'
-            """, (days_var.get(),))
-            
-            self.db.execute_query("""
-                UPDATE notification_settings SET setting_value=? WHERE setting_key='attendance_milestone_enabled'
-            """, ('1' if attendance_enabled_var.get() else '0',))
-            
-            self.db.execute_query("""
-                UPDATE notification_settings SET setting_value=? WHERE setting_key='attendance_milestone_count'
-            """, (milestone_var.get(),))
+            # حفظ الإعدادات وإلغاء النسخة المحفوظة في الذاكرة
+            self.settings.save({
+                'show_notifications_on_startup': '1' if show_startup_var.get() else '0',
+                'payment_alert_enabled': '1' if payment_enabled_var.get() else '0',
+                'payment_reminder_days': days_var.get(),
+                'attendance_milestone_enabled': '1' if attendance_enabled_var.get() else '0',
+                'attendance_milestone_count': milestone_var.get(),
+            })
             
             messagebox.showinfo("تم الحفظ", "تم حفظ الإعدادات بنجاح!")
             settings_window.destroy()
@@ -4426,8 +7322,18 @@ $Shortcut.Description = "Student Manager App"
 
 def main():
     """نقطة دخول البرنامج"""
-    root = tk.Tk()
-    app = StudentManagementApp(root)
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    tracer = StartupTracer.from_environment()
+    with tracer.span('tk.Tk()'):
+        root = tk.Tk()
+    try:
+        app = StudentManagementApp(root, tracer=tracer)
+    except DatabaseSupportError as e:
+        root.withdraw()
+        messagebox.showerror("خطأ", str(e))
+        root.destroy()
+        return
     root.mainloop()
 
 